@@ -0,0 +1,1593 @@
+"""Micro-benchmarks for the dashboard pipeline.
+
+Usage:
+  ./.venv/bin/python benchmarks.py categorize --rows 200000
+
+Each benchmark uses synthetic data only (no network, no real statements) and
+prints timings plus a correctness check against the straightforward implementation;
+the exit status is 1 if any correctness check failed.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from categorization import KeywordMatcher
+import fx_cache
+from fx_providers import FrankfurterProvider, FxStandInServer, RecordedFxProvider, SyntheticFxProvider, record_fx_rates
+import fx_store
+import invest_processing
+import ledger
+import statement_cache
+from watcher import InputWatcher
+
+import processing as proc
+
+
+_failed_checks: list[str] = []
+
+
+def _check(name: str, ok: object) -> bool:
+    """Record a correctness check (main() exits non-zero if any failed); returns it for printing."""
+
+    ok = bool(ok)
+    if not ok:
+        _failed_checks.append(name)
+    return ok
+
+
+def _timed(fn: Callable[[], object], repeat: int = 1) -> tuple[float, object]:
+    best = float("inf")
+    result: object = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _synthetic_descriptions(rows: int, seed: int = 7) -> list[str]:
+    """Merchant-like strings: mostly rule keywords with noise, some unknown merchants."""
+
+    rng = random.Random(seed)
+    keywords = [kw.strip() for kw, _cat in proc.load_expense_category_map()]
+    noise = ["aps", "cph", "dk", "*", "1234", "store", "online", "k/s", "ltd"]
+    out: list[str] = []
+    for _ in range(rows):
+        if rng.random() < 0.8 and keywords:
+            kw = rng.choice(keywords)
+            kw = kw.upper() if rng.random() < 0.5 else kw.title()
+            if rng.random() < 0.2:
+                kw = kw.replace(" ", "")
+        else:
+            kw = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(rng.randint(4, 18)))
+        out.append(f"{rng.choice(noise)} {kw} {rng.choice(noise)}".strip())
+    return out
+
+
+def _write_synthetic_statement(path: Path, rows: int, distinct: int = 3_000, seed: int = 3) -> Path:
+    """Write a Revolut-shaped account statement CSV with `rows` transactions."""
+
+    rng = np.random.default_rng(seed)
+    pool = np.asarray(_synthetic_descriptions(distinct, seed=seed), dtype=object)
+    end = pd.Timestamp.today().normalize()
+    started = end - pd.to_timedelta(rng.integers(0, 3 * 365 * 86400, rows), unit="s")
+    started = started.sort_values()
+    completed = started + pd.to_timedelta(rng.integers(0, 3 * 86400, rows), unit="s")
+    kinds = rng.choice(["Card Payment", "Transfer", "Exchange", "Topup"], rows, p=[0.8, 0.1, 0.05, 0.05])
+    currency = rng.choice(["DKK", "EUR", "USD", "GBP"], rows, p=[0.85, 0.1, 0.03, 0.02])
+    amount = -np.round(rng.gamma(2.0, 60.0, rows), 2)
+    amount[kinds == "Topup"] *= -1
+
+    df = pd.DataFrame(
+        {
+            "Type": kinds,
+            "Product": "Current",
+            "Started Date": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "Completed Date": completed.strftime("%Y-%m-%d %H:%M:%S"),
+            "Description": pool[rng.integers(0, len(pool), rows)],
+            "Amount": amount,
+            "Fee": np.where(rng.random(rows) < 0.02, 1.0, 0.0),
+            "Currency": currency,
+            "State": np.where(rng.random(rows) < 0.995, "COMPLETED", "PENDING"),
+            "Balance": np.round(10_000 + np.cumsum(amount), 2),
+        }
+    )
+    df.loc[rng.random(rows) < 0.005, "Description"] = "Refund from Netto"
+    df.loc[df["State"].eq("PENDING"), ["Completed Date", "Balance"]] = np.nan
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def _write_synthetic_fx_cache(data_dir: Path, start: str = "2020-01-01") -> None:
+    """Daily-filled FX cache files so convert_to_dkk never touches the network."""
+
+    days = pd.date_range(start, pd.Timestamp.today().normalize(), freq="D")
+    for i, ccy in enumerate(fx_cache.FX_CACHE_CURRENCIES):
+        rates = pd.Series(6.0 + i + 0.1 * np.sin(np.arange(len(days)) / 30.0), index=days)
+        fx_store.write_store(fx_cache._fx_cache_path(data_dir, ccy), rates)
+
+
+class _MockFxServer(FxStandInServer):
+    """FxStandInServer over SyntheticFxProvider: EUR-quoted weekday rates, no network.
+
+    Sleeps `latency` seconds per request and counts requests, so FX code can be
+    benchmarked offline. While `fail_status` is set every request gets that status
+    instead (an outage).
+    """
+
+    def __init__(self, latency: float = 0.0, fail_status: int | None = None) -> None:
+        super().__init__(SyntheticFxProvider(), latency=latency, fail_status=fail_status)
+
+
+def bench_categorize(rows: int) -> None:
+    descriptions = _synthetic_descriptions(rows)
+    compiled = proc.load_expense_category_map()
+    texts = [proc.normalize_text(d) for d in descriptions]
+
+    def legacy_loop() -> list[str | None]:
+        out: list[str | None] = []
+        for text in texts:
+            text_compact = text.replace(" ", "")
+            hit = None
+            for keyword, _category in compiled:
+                if proc._matches_keyword(keyword, text, text_compact):
+                    hit = keyword
+                    break
+            out.append(hit)
+        return out
+
+    def automaton() -> list[str | None]:
+        matcher = proc.load_expense_category_matcher()
+        out: list[str | None] = []
+        for text in texts:
+            rule = matcher.match(text)
+            out.append(rule[0] if rule is not None else None)
+        return out
+
+    build_s, _ = _timed(lambda: KeywordMatcher(compiled))
+    legacy_s, legacy = _timed(legacy_loop)
+    fast_s, fast = _timed(automaton, repeat=3)
+
+    print(f"rules={len(compiled)} rows={rows} automaton_build={build_s * 1000:.1f}ms")
+    print(f"  loop over rules:  {legacy_s:.3f}s")
+    print(f"  keyword automaton: {fast_s:.3f}s ({legacy_s / max(fast_s, 1e-9):.1f}x)")
+    print(f"  identical results: {_check('categorize', legacy == fast)}")
+
+
+def bench_dedup(rows: int, distinct: int) -> None:
+    pool = _synthetic_descriptions(distinct)
+    rng = random.Random(11)
+    df = pd.DataFrame({"type": "expense", "description": [rng.choice(pool) for _ in range(rows)]})
+
+    def per_row() -> pd.Series:
+        matcher = proc.load_expense_category_matcher()
+
+        def category(description: object) -> str:
+            rule = matcher.match(proc.normalize_text(description))
+            return rule[1] if rule is not None else proc.DEFAULT_EXPENSE_CATEGORY
+
+        return df["description"].apply(category)
+
+    row_s, expected = _timed(per_row)
+
+    cache_dir = Path(tempfile.mkdtemp(prefix="bench-dedup-"))
+    try:
+        proc._description_category_lru.clear()
+        cold_s, cold = _timed(lambda: proc.categorize_expenses(df, cache_dir=cache_dir))
+        cold_stats = proc.last_categorization_stats()
+        warm_s, _ = _timed(lambda: proc.categorize_expenses(df, cache_dir=cache_dir))
+        warm_stats = proc.last_categorization_stats()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"rows={rows} distinct={distinct}")
+    print(f"  per-row matching:        {row_s:.3f}s")
+    print(f"  distinct values (cold):  {cold_s:.3f}s  {cold_stats}")
+    print(f"  distinct values (warm):  {warm_s:.3f}s  {warm_stats}")
+    print(f"  dedup ratio: {cold_stats.dedup_ratio:.1f}x")
+    print(f"  identical results: {_check('dedup', cold['category'].astype(str).equals(expected.astype(str)))}")
+
+
+def bench_recategorize(rows: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-recat-"))
+    cwd = os.getcwd()
+    rules_path = proc.EXPENSE_CATEGORY_MAP_PATH
+    try:
+        csv_path = _write_synthetic_statement(workdir / "account-statement.csv", rows)
+        data_dir = workdir / "data"
+        _write_synthetic_fx_cache(data_dir)
+        rules_copy = workdir / "expense_categories.yml"
+        shutil.copy(rules_path, rules_copy)
+        proc.EXPENSE_CATEGORY_MAP_PATH = rules_copy
+        os.chdir(workdir)
+
+        full_s, prepared = _timed(lambda: proc.prepare_data_for_plotting(str(csv_path), data_dir))
+
+        def edit_rules(extra: str) -> None:
+            rules_copy.write_text(rules_copy.read_text(encoding="utf-8") + extra, encoding="utf-8")
+            bump = time.time() + random.random() + 5
+            os.utime(rules_copy, (bump, bump))
+            proc.load_expense_category_matcher()  # YAML parse is not part of the patch
+
+        # 1) Add one merchant rule that steals some "Other" rows.
+        target = prepared.other_expenses["description"].dropna().astype(str).iloc[0]
+        edit_rules(f'\n"{proc.normalize_text(target)}": "Bench"\n')
+        add_s, patched = _timed(lambda: proc.recategorize_prepared(prepared, cache_dir=data_dir))
+
+        # 2) Retarget a frequent keyword (touches every month).
+        edit_rules('\n"netto": "Supermarket"\n')
+        retarget_s, patched = _timed(lambda: proc.recategorize_prepared(patched, cache_dir=data_dir))
+        rebuild_s, rebuilt = _timed(lambda: proc.prepare_data_for_plotting(str(csv_path), data_dir))
+
+        same_categories = patched.df["category"].astype(str).equals(rebuilt.df["category"].astype(str))
+        a = patched.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+        b = rebuilt.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+        same_aggregates = a.index.equals(b.index) and bool(np.allclose(a.to_numpy(), b.to_numpy()))
+        same_other = set(patched.other_expenses.index) == set(rebuilt.other_expenses.index)
+
+        print(f"rows={rows}")
+        print(f"  full prepare_data_for_plotting: {full_s:.3f}s")
+        print(f"  recategorize, one rule added:   {add_s * 1000:.1f}ms")
+        print(f"  recategorize, netto retargeted: {retarget_s * 1000:.1f}ms")
+        print(f"  full rebuild after rules edit:  {rebuild_s:.3f}s")
+        _check("recategorize", same_categories and same_aggregates and same_other)
+        print(f"  identical categories/aggregates/other: {same_categories}/{same_aggregates}/{same_other}")
+    finally:
+        os.chdir(cwd)
+        proc.EXPENSE_CATEGORY_MAP_PATH = rules_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _random_text(rng: random.Random) -> object:
+    """Strings mixing ASCII with the unicode cases normalize_text has to handle."""
+
+    specials = [
+        " ", "  ", "\t", "\n", "\x1c", "\xa0", "\u2003", "\u2013", "\u2212", "\u2011",
+        "Ａ", "ß", "ﬁ", "İ", "Σ", "é", "e\u0301", "Æ", "ø", "Å", "①", "™", "😀",
+    ]
+    if rng.random() < 0.05:
+        return rng.choice([None, float("nan"), pd.NA, 5, 3.25, pd.NaT])
+    ascii_only = rng.random() < 0.7
+    parts = []
+    for _ in range(rng.randint(0, 24)):
+        if not ascii_only and rng.random() < 0.3:
+            parts.append(rng.choice(specials))
+        else:
+            parts.append(rng.choice("abcXYZ 019-*/&  "))
+    return "".join(parts)
+
+
+def bench_normalize(rows: int, checks: int) -> None:
+    rng = random.Random(5)
+    sample = pd.Series([_random_text(rng) for _ in range(checks)], dtype="object")
+    expected = [proc.normalize_text(v) for v in sample]
+    got = proc.normalize_text_series(sample).tolist()
+    mismatches = [(v, e, g) for v, e, g in zip(sample, expected, got) if e != g]
+    _check("normalize property", not mismatches)
+    print(f"property check: {checks} random values, {len(mismatches)} mismatches")
+    for v, e, g in mismatches[:5]:
+        print(f"  {v!r}: scalar={e!r} series={g!r}")
+
+    pool = _synthetic_descriptions(5_000)
+    pool += ["Café Ørsted\u2013Øst", "ＮＥＴＴＯ  København", "7\u2011Eleven  Nørreport"]
+    descriptions = pd.Series([pool[i % len(pool)] for i in range(rows)], dtype="object")
+
+    scalar_s, scalar = _timed(lambda: descriptions.map(proc.normalize_text))
+    series_s, series = _timed(lambda: proc.normalize_text_series(descriptions))
+    print(f"rows={rows}")
+    print(f"  normalize_text per value:  {scalar_s:.3f}s")
+    print(f"  normalize_text_series:     {series_s:.3f}s ({scalar_s / max(series_s, 1e-9):.1f}x)")
+    print(f"  identical results: {_check('normalize', scalar.tolist() == series.tolist())}")
+
+
+def _classify_type_whole_frame(frame: pd.DataFrame) -> pd.Series:
+    """The previous classify_type: stringifies every column to look for 'refund'."""
+
+    out = pd.Series(pd.NA, index=frame.index, dtype="object")
+    sub_type = frame.get("sub_type", pd.Series("", index=frame.index)).astype(str).str.strip()
+    desc = frame.get("description", pd.Series("", index=frame.index)).astype(str)
+    out.loc[sub_type.eq("Card Payment")] = "expense"
+    is_income = desc.str.contains("BETTERAI LLC", case=False, na=False) | desc.str.contains(
+        "paypal", case=False, na=False
+    )
+    out.loc[is_income] = "income"
+    has_refund = frame.astype(str).apply(lambda col: col.str.contains("refund", case=False, na=False))
+    out.loc[has_refund.any(axis=1)] = "refund"
+    return out
+
+
+def _timed_peak(fn: Callable[[], object]) -> tuple[float, float, object]:
+    """(seconds, peak MiB allocated during the call, result)."""
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, result
+
+
+def bench_classify(rows: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-classify-"))
+    try:
+        csv_path = _write_synthetic_statement(workdir / "account-statement.csv", rows)
+        df = proc.normalize_revolut_df(proc.load_revolut_csv(str(csv_path)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    old_s, old_mib, old = _timed_peak(lambda: _classify_type_whole_frame(df))
+    new_s, new_mib, new = _timed_peak(lambda: proc.classify_type(df))
+
+    print(f"rows={rows} columns={len(df.columns)} frame={df.memory_usage(deep=True).sum() / 2**20:.0f}MiB")
+    print(f"  whole-frame astype(str): {old_s:.3f}s peak +{old_mib:.0f}MiB")
+    print(f"  text columns, distinct:  {new_s:.3f}s peak +{new_mib:.0f}MiB")
+    print(f"  identical results: {_check('classify', old.astype(str).equals(new.astype(str)))}")
+
+
+def bench_statement_cache(rows: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-stmt-"))
+    try:
+        csv_path = str(_write_synthetic_statement(workdir / "account-statement.csv", rows))
+        cache_dir = workdir / "data"
+
+        parse_s, parsed = _timed(lambda: proc.load_normalized_statement(csv_path, cache_dir=None))
+        cold_s, _ = _timed(lambda: proc.load_normalized_statement(csv_path, cache_dir=cache_dir))
+        warm_s, cached = _timed(lambda: proc.load_normalized_statement(csv_path, cache_dir=cache_dir), repeat=3)
+        os.utime(csv_path)  # same content, new mtime -> content hash confirms the entry
+        touched_s, _ = _timed(lambda: proc.load_normalized_statement(csv_path, cache_dir=cache_dir))
+
+        size = sum(p.stat().st_size for p in (cache_dir / statement_cache.STATEMENT_CACHE_DIRNAME).glob("*"))
+        same = parsed.astype(str).reset_index(drop=True).equals(cached.astype(str).reset_index(drop=True))
+        print(f"rows={rows} csv={Path(csv_path).stat().st_size / 2**20:.0f}MiB cache={size / 2**20:.0f}MiB")
+        print(f"  parse CSV (no cache):           {parse_s:.3f}s")
+        print(f"  first load (parse + write):     {cold_s:.3f}s")
+        print(f"  cached load (size+mtime hit):   {warm_s:.3f}s ({parse_s / max(warm_s, 1e-9):.1f}x)")
+        print(f"  touched file (content hash hit): {touched_s:.3f}s")
+        print(f"  identical frames: {_check('statement-cache', same)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_csv_reader(rows: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-csv-"))
+    try:
+        csv_path = str(_write_synthetic_statement(workdir / "account-statement.csv", rows))
+        variants: list[tuple[str, Callable[[], pd.DataFrame]]] = [
+            ("pd.read_csv + coercion", lambda: proc.normalize_revolut_df(pd.read_csv(csv_path))),
+            (
+                "schema reader (C engine)",
+                lambda: proc.normalize_revolut_df(proc.load_revolut_csv(csv_path, engine="c")),
+            ),
+        ]
+        if proc._pyarrow_csv_available():
+            variants.append(
+                (
+                    "schema reader (pyarrow)",
+                    lambda: proc.normalize_revolut_df(proc.load_revolut_csv(csv_path, engine="pyarrow")),
+                )
+            )
+
+        print(f"rows={rows} csv={Path(csv_path).stat().st_size / 2**20:.0f}MiB")
+        frames: list[pd.DataFrame] = []
+        for name, fn in variants:
+            seconds, df = _timed(fn)
+            _s, peak_mib, _df = _timed_peak(fn)
+            frames.append(df)
+            print(
+                f"  {name:<26} {seconds:.3f}s  peak +{peak_mib:.0f}MiB  "
+                f"frame {df.memory_usage(deep=True).sum() / 2**20:.0f}MiB"
+            )
+
+        old = frames[0]
+        shared = [c for c in old.columns if c in frames[-1].columns]
+        same = all(old[shared].astype(str).equals(f[shared].astype(str)) for f in frames[1:])
+        print(f"  identical normalized values: {_check('csv-reader', same)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_ledger(rows: int, exports: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-ledger-"))
+    try:
+        history = _write_synthetic_statement(workdir / "history.csv", rows)
+        lines = history.read_text(encoding="utf-8").splitlines(keepends=True)
+        header, body = lines[0], lines[1:]
+
+        # Overlapping exports: each covers two "steps" of history, the last one ends today.
+        step = max(1, len(body) // (exports + 1))
+        paths: list[Path] = []
+        for i in range(exports):
+            end = len(body) if i == exports - 1 else (i + 2) * step
+            p = workdir / f"account-statement-{i:03d}.csv"
+            p.write_text(header + "".join(body[i * step : end]), encoding="utf-8")
+            paths.append(p)
+
+        ledger_dir = workdir / "ledger"
+        parse = lambda p: proc.load_normalized_statement(p, cache_dir=None)  # noqa: E731
+
+        backfill_s, _ = _timed(lambda: [ledger.ingest_statement(p, ledger_dir, parse) for p in paths[:-1]])
+        latest_s, added = _timed(lambda: ledger.ingest_statement(paths[-1], ledger_dir, parse))
+        noop_s, _ = _timed(lambda: [ledger.ingest_statement(p, ledger_dir, parse) for p in paths], repeat=3)
+        read_s, merged = _timed(lambda: ledger.read_ledger(ledger_dir), repeat=3)
+
+        def rebuild() -> pd.DataFrame:
+            frames = [parse(str(p)) for p in paths]
+            return pd.concat(frames, ignore_index=True).drop_duplicates(list(ledger.FINGERPRINT_COLUMNS))
+
+        rebuild_s, _ = _timed(rebuild)
+
+        full = parse(str(history))
+        full_pending = full["state"].astype(str).eq("PENDING")
+        last = parse(str(paths[-1]))
+        expected = pd.concat([full[~full_pending], last[last["state"].astype(str).eq("PENDING")]])
+        exp_fp, exp_occ = ledger.row_fingerprints(expected.reset_index(drop=True))
+        got = sorted(zip(merged["row_fingerprint"].tolist(), merged["row_occurrence"].tolist()))
+        same = got == sorted(zip(exp_fp.tolist(), exp_occ.tolist()))
+
+        print(f"history rows={rows} exports={exports} ledger rows={len(merged)}")
+        print(f"  {f'ingest {exports - 1} older exports:':<32}{backfill_s:.3f}s")
+        print(f"  ingest newest export:           {latest_s:.3f}s ({added} new rows)")
+        print(f"  re-ingest all (already seen):   {noop_s:.4f}s")
+        print(f"  read ledger:                    {read_s:.3f}s")
+        print(f"  parse all exports + dedup:      {rebuild_s:.3f}s")
+        print(f"  ledger == settled history + newest pending rows: {_check('ledger', same)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_incremental(rows: int, new_rows: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-incr-"))
+    cwd = os.getcwd()
+    try:
+        history = _write_synthetic_statement(workdir / "history.csv", rows + new_rows)
+        lines = history.read_text(encoding="utf-8").splitlines(keepends=True)
+        old_csv = workdir / "account-statement-old.csv"
+        old_csv.write_text("".join(lines[: rows + 1]), encoding="utf-8")
+        new_csv = workdir / "account-statement-new.csv"
+        new_csv.write_text("".join(lines), encoding="utf-8")
+
+        data_dir = workdir / "data"
+        _write_synthetic_fx_cache(data_dir)
+        os.chdir(workdir)
+        for i in range(3):
+            proc.append_manual_expense(
+                data_dir=data_dir,
+                completed_date=pd.Timestamp.today().date() - pd.Timedelta(days=40 * i),
+                description=f"Cash {i}",
+                amount_dkk=100.0 + i,
+            )
+        # Parsing is cached separately (statement-cache); warm it so only the pipeline is timed.
+        proc.load_normalized_statement(str(new_csv), cache_dir=data_dir)
+
+        proc._last_prepared.clear()
+        prime_s, _ = _timed(lambda: proc.prepare_data_for_plotting(str(old_csv), data_dir, incremental=True))
+        incr_s, incr = _timed(lambda: proc.prepare_data_for_plotting(str(new_csv), data_dir, incremental=True))
+        full_s, full = _timed(lambda: proc.prepare_data_for_plotting(str(new_csv), data_dir))
+
+        cols = [c for c in full.df.columns if c in incr.df.columns]
+        same_df = incr.df[cols].astype(str).equals(full.df[cols].astype(str))
+        a, b = incr.totals_by_month, full.totals_by_month[incr.totals_by_month.columns]
+        same_totals = a.index.equals(b.index) and bool(np.allclose(a.to_numpy(float), b.to_numpy(float)))
+        a = incr.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+        b = full.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+        same_cat = a.index.equals(b.index) and bool(np.allclose(a.to_numpy(), b.to_numpy()))
+        same_other = incr.other_expenses.sort_index().astype(str).equals(full.other_expenses.sort_index().astype(str))
+
+        print(f"history rows={rows} new rows={new_rows}")
+        print(f"  first build (old export):     {prime_s:.3f}s")
+        print(f"  incremental (new export):     {incr_s:.3f}s")
+        print(f"  full build (new export):      {full_s:.3f}s ({full_s / max(incr_s, 1e-9):.1f}x)")
+        _check("incremental", same_df and same_totals and same_cat and same_other)
+        print(f"  identical df/totals/by-category/other: {same_df}/{same_totals}/{same_cat}/{same_other}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_startup(rows: int, latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-start-"))
+    cwd = os.getcwd()
+    base_url = fx_cache.FX_API_BASE_URL
+    try:
+        csv_path = str(_write_synthetic_statement(workdir / "account-statement.csv", rows))
+        data_dir = workdir / "data"
+        os.chdir(workdir)
+        proc.load_normalized_statement(csv_path, cache_dir=data_dir)
+
+        def clear_fx() -> None:
+            for p in data_dir.glob(f"fx_*{fx_store.STORE_SUFFIX}"):
+                p.unlink()
+            fx_cache._fx_snapshot = {}
+            proc._last_prepared.clear()
+
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+
+            # Old startup: ensure_fx_cache_files blocks before anything renders.
+            clear_fx()
+            blocking_s, blocking = _timed(lambda: proc.prepare_data_for_plotting(csv_path, data_dir, incremental=True))
+
+            clear_fx()
+            t0 = time.perf_counter()
+            updater = fx_cache.FxCacheBackgroundUpdater(data_dir=data_dir, initialize=True).start()
+            first = proc.prepare_data_for_plotting(csv_path, data_dir, incremental=True, fx_offline=True)
+            first_s = time.perf_counter() - t0
+            updater.done.wait()
+            landed_s = time.perf_counter() - t0
+            refreshed = proc.prepare_data_for_plotting(csv_path, data_dir, incremental=True)
+            refreshed_s = time.perf_counter() - t0
+
+        amounts = first.df["amount_dkk"].notna()
+        dkk = first.df["currency"].astype(str).eq("DKK")
+        same = refreshed.df["amount_dkk"].astype(str).equals(blocking.df["amount_dkk"].astype(str))
+        print(f"rows={rows} mock FX latency={latency:.1f}s, cold FX cache")
+        print(f"  blocking startup, first render:     {blocking_s:.3f}s")
+        print(
+            f"  background init, first render:      {first_s:.3f}s "
+            f"({int((amounts & dkk).sum())}/{int(dkk.sum())} DKK rows, {int((amounts & ~dkk).sum())} foreign converted)"
+        )
+        print(f"  rates landed / refreshed render:    {landed_s:.3f}s / {refreshed_s:.3f}s")
+        print(f"  refreshed amounts identical to blocking: {_check('startup', same)} (updater error: {updater.error})")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_backfill(rows: int, sample: int, latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-backfill-"))
+    base_url = fx_cache.FX_API_BASE_URL
+    try:
+        csv_path = str(_write_synthetic_statement(workdir / "account-statement.csv", rows))
+        data_dir = workdir / "data"
+        df = proc.categorize_expenses(proc.load_normalized_statement(csv_path, cache_dir=data_dir), cache_dir=data_dir)
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+            fx_cache.ensure_fx_cache_files(data_dir=data_dir)
+
+            # Rows before FX_CACHE_START_DATE in cached currencies: what per-date lookups would cover.
+            ccy = df["currency"].astype(str).str.upper()
+            day = pd.to_datetime(df["completed_date"], errors="coerce").dt.normalize()
+            old = (
+                df["type"].isin(["income", "expense", "refund"])
+                & ccy.isin(fx_cache.FX_CACHE_CURRENCIES)
+                & ccy.ne(fx_cache.FX_CACHE_TO_CCY)
+                & (day < pd.Timestamp(fx_cache.FX_CACHE_START_DATE))
+            )
+            pairs = pd.DataFrame({"day": day[old], "ccy": ccy[old]}).drop_duplicates()
+            probe = list(zip(pairs["day"], pairs["ccy"]))[:sample]
+            fx_cache._fx_rate_cache.clear()
+            server.requests = 0
+            per_date_s, per_date = _timed(lambda: fx_cache.fx_rates_on_dates(probe, data_dir=None))
+            per_date_req = server.requests
+
+            server.requests = 0
+            first_s, first = _timed(lambda: proc.convert_to_dkk(df, fx_data_dir=data_dir))
+            first_req = server.requests
+            server.requests = 0
+            again_s, _ = _timed(lambda: proc.convert_to_dkk(df, fx_data_dir=data_dir))
+            again_req = server.requests
+
+        rate = pd.to_numeric(first["conversion_rate"], errors="coerce")
+        backfilled = rate[old].groupby([day[old], ccy[old]]).first()
+        match = all(math.isclose(backfilled[(d, c)], per_date[(d.date(), c)]) for d, c in probe)
+        est = per_date_s / max(1, len(probe)) * len(pairs)
+        print(f"rows={rows} older than {fx_cache.FX_CACHE_START_DATE}: {int(old.sum())} rows, {len(pairs)} (date, currency) pairs")
+        print(f"  per-date lookups:        ~{est:.1f}s est. ({per_date_req / max(1, len(probe)):.1f} requests/pair, {len(probe)} sampled)")
+        print(f"  backfill, first convert: {first_s:.3f}s ({first_req} requests)")
+        print(f"  backfill, next convert:  {again_s:.3f}s ({again_req} requests)")
+        print(f"  converted {int(rate[old].notna().sum())}/{int(old.sum())} old rows; sampled rates match per-date lookups: {_check('fx-backfill', match)}")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        fx_cache._fx_rate_cache.clear()
+        fx_cache._fx_snapshot = {}
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_invest_fx(exchanges: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-invfx-"))
+    try:
+        data_dir = workdir / "data"
+        _write_synthetic_fx_cache(data_dir)
+        rng = np.random.default_rng(5)
+        today = pd.Timestamp.today().normalize()
+        fx_detail = pd.DataFrame(
+            {
+                "completed_day": today - pd.to_timedelta(rng.integers(0, 5 * 365, exchanges), unit="D"),
+                "currency": rng.choice(["USD", "GBP"], exchanges),
+            }
+        )
+        fx_detail.loc[rng.random(exchanges) < 0.01, "completed_day"] = pd.NaT
+
+        def per_row() -> tuple[list[float | None], list[float | None]]:
+            # The previous load_investment_summary loop.
+            def rate_on(day: pd.Timestamp, from_ccy: str) -> float | None:
+                s = fx_cache.load_fx_cache_series(from_ccy, data_dir=data_dir)
+                if s.empty or pd.isna(day):
+                    return None
+                v = s.get(pd.Timestamp(day).normalize())
+                try:
+                    return float(v) if v is not None and not pd.isna(v) else None
+                except Exception:
+                    return None
+
+            today_rates = {c: rate_on(today, c) for c in sorted(set(fx_detail["currency"].dropna().unique().tolist()))}
+            at_exchange: list[float | None] = []
+            at_today: list[float | None] = []
+            for _idx, row in fx_detail.iterrows():
+                ccy = str(row.get("currency") or "").upper().strip()
+                day = row.get("completed_day")
+                at_exchange.append(rate_on(pd.Timestamp(day) if day is not None else pd.NaT, ccy))
+                at_today.append(today_rates.get(ccy))
+            return at_exchange, at_today
+
+        def vectorized() -> tuple[np.ndarray, np.ndarray]:
+            currencies = fx_detail["currency"].to_numpy()
+            return (
+                fx_cache.rates_for_pairs(fx_detail["completed_day"], currencies, data_dir=data_dir),
+                fx_cache.rates_for_pairs(pd.Series(today, index=fx_detail.index), currencies, data_dir=data_dir),
+            )
+
+        loop_s, loop = _timed(per_row)
+        vec_s, vec = _timed(vectorized, repeat=3)
+        same = all(
+            np.allclose(pd.to_numeric(pd.Series(a), errors="coerce").to_numpy(float), b, equal_nan=True)
+            for a, b in zip(loop, vec)
+        )
+        print(f"exchanges={exchanges}")
+        print(f"  iterrows + rate_on per row: {loop_s:.3f}s")
+        print(f"  rates_for_pairs:            {vec_s * 1000:.2f}ms ({loop_s / max(vec_s, 1e-9):.0f}x)")
+        print(f"  identical rates: {_check('invest-fx', same)}")
+    finally:
+        fx_cache._fx_snapshot = {}
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_updater(on_demand: list[str], latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxupd-"))
+    base_url = fx_cache.FX_API_BASE_URL
+    seed_dir = workdir / "seed"
+    stale_end = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+
+    def fresh_copy(name: str) -> Path:
+        target = workdir / name
+        shutil.copytree(seed_dir, target)
+        fx_cache._fx_snapshot = {}
+        return target
+
+    def store_bytes(data_dir: Path) -> dict[str, bytes]:
+        return {p.name: p.read_bytes() for p in sorted(data_dir.glob(f"*{fx_store.STORE_SUFFIX}"))}
+
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+            # Seed: configured + on-demand files that stopped 30 days ago, no refresh record.
+            for ccy in fx_cache.FX_CACHE_CURRENCIES:
+                s = fx_cache._fetch_fx_timeseries(ccy, fx_cache.FX_CACHE_TO_CCY, fx_cache.FX_CACHE_START_DATE, stale_end.date())
+                fx_store.write_store(
+                    fx_cache._fx_cache_path(seed_dir, ccy),
+                    fx_cache._daily_series(s, fx_cache.FX_CACHE_START_DATE, stale_end.date()),
+                )
+            for ccy in on_demand:
+                dates = pd.Series(pd.date_range(end=stale_end, periods=200, freq="D"))
+                fx_cache.fx_rates_for_range(dates, ccy, data_dir=seed_dir, persist=True)
+            (seed_dir / fx_cache.FX_REFRESH_STATE_FILENAME).unlink(missing_ok=True)
+
+            # Sequential: one update per request group, one after another.
+            seq_dir = fresh_copy("sequential")
+            server.requests = 0
+            t0 = time.perf_counter()
+            fx_cache._update_fx_cache_files(seq_dir, fx_cache.FX_CACHE_CURRENCIES, fx_cache.FX_CACHE_START_DATE, fx_cache.FX_CACHE_TO_CCY)
+            for ccy in on_demand:
+                covered = fx_cache.load_fx_rates(ccy, data_dir=seq_dir).covered_dates()
+                fx_cache._update_fx_cache_files(seq_dir, [ccy], covered[0].date(), fx_cache.FX_CACHE_TO_CCY)
+            seq_s, seq_req = time.perf_counter() - t0, server.requests
+
+            par_dir = fresh_copy("parallel")
+            server.requests = 0
+            updater = fx_cache.FxCacheBackgroundUpdater(data_dir=par_dir)
+            par_s, _ = _timed(lambda: updater.start().done.wait())
+            par_req = server.requests
+
+            server.requests = 0
+            again = fx_cache.FxCacheBackgroundUpdater(data_dir=par_dir)
+            again_s, _ = _timed(lambda: again.start().done.wait())
+            again_req = server.requests
+
+            periodic = fx_cache.FxCacheBackgroundUpdater(data_dir=par_dir, interval_seconds=0.2).start()
+            time.sleep(1.0)
+            periodic.stop()
+            periodic_runs, periodic_req = periodic.runs, server.requests - again_req
+
+        groups = 1 + len(on_demand)
+        print(f"pairs: {len(fx_cache.FX_CACHE_CURRENCIES)} configured + {len(on_demand)} on-demand, latency={latency * 1000:.0f}ms, 30 days stale")
+        print(f"  sequential updates:     {seq_s:.3f}s ({seq_req} requests for {groups} groups)")
+        print(f"  parallel updater run:   {par_s:.3f}s ({par_req} requests)")
+        print(f"  rerun, skip-if-fresh:   {again_s * 1000:.1f}ms ({again_req} requests)")
+        print(f"  periodic (0.2s, 1s):    {periodic_runs} runs, {periodic_req} requests")
+        print(f"  identical files: {_check('fx-updater', store_bytes(seq_dir) == store_bytes(par_dir))}")
+        for st_ in sorted(updater.status(), key=lambda x: x.from_ccy):
+            print(
+                f"    {st_.from_ccy}/{st_.to_ccy}: {st_.state:<8} latency={st_.latency_seconds * 1000:.0f}ms "
+                f"bytes={st_.bytes_transferred}"
+            )
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        fx_cache._fx_snapshot = {}
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class _GlobalLockFxSeries:
+    """The previous scheme: one module lock around file opens and writes, plus a
+    mtime-keyed dict mutated in place."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.cache: dict[Path, tuple[float, pd.Series]] = {}
+
+    def load(self, path: Path) -> pd.Series:
+        mtime = path.stat().st_mtime
+        cached = self.cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self.lock:
+            s = fx_store.open_store(path).to_series()
+        self.cache[path] = (mtime, s)
+        return s
+
+    def write(self, path: Path, series: pd.Series) -> None:
+        with self.lock:
+            fx_store.write_store(path, series)
+
+
+def bench_fx_readers(readers: int, seconds: float, years: int, write_ms: float, pause_ms: float) -> None:
+    """`write_ms` models storage latency per file write (0: page cache only);
+    readers pause `pause_ms` between lookups like rendering sessions (0: spin)."""
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxrd-"))
+    real_write_store = fx_store.write_store
+
+    def slow_write_store(path: str | Path, rates: object) -> None:
+        time.sleep(write_ms / 1000)
+        real_write_store(path, rates)  # type: ignore[arg-type]
+
+    currencies = list(fx_cache.FX_CACHE_CURRENCIES)
+    days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=365 * years, freq="D")
+    probe = days[len(days) // 2]
+
+    def run(load: Callable[[str], pd.Series], write: Callable[[str, pd.Series], None]) -> tuple[np.ndarray, int, int]:
+        stop = threading.Event()
+        latencies: list[list[float]] = [[] for _ in range(readers)]
+        torn = [0]
+        writes = [0]
+
+        def reader(i: int) -> None:
+            rng = random.Random(i)
+            out = latencies[i]
+            while not stop.is_set():
+                ccy = rng.choice(currencies)
+                t0 = time.perf_counter()
+                s = load(ccy)
+                v0, v1 = s.iloc[0], s.get(probe)
+                out.append(time.perf_counter() - t0)
+                if v0 != v1:  # each write uses one value throughout: anything else is a torn read
+                    torn[0] += 1
+                if pause_ms:
+                    time.sleep(pause_ms / 1000)
+
+        def writer() -> None:
+            gen = 0
+            while not stop.is_set():
+                gen += 1
+                for ccy in currencies:
+                    write(ccy, pd.Series(float(gen), index=days))
+                writes[0] += len(currencies)
+
+        for ccy in currencies:
+            write(ccy, pd.Series(0.0, index=days))
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return np.concatenate([np.asarray(x) for x in latencies]), writes[0], torn[0]
+
+    try:
+        fx_store.write_store = slow_write_store  # both schemes write through fx_store
+        old_dir, new_dir = workdir / "old", workdir / "new"
+        old = _GlobalLockFxSeries()
+        old_lat, old_writes, old_torn = run(
+            lambda c: old.load(fx_cache._fx_cache_path(old_dir, c)),
+            lambda c, s: old.write(fx_cache._fx_cache_path(old_dir, c), s),
+        )
+        fx_cache._fx_snapshot = {}
+        new_lat, new_writes, new_torn = run(
+            lambda c: fx_cache.load_fx_cache_series(c, data_dir=new_dir),
+            lambda c, s: fx_cache._write_fx_cache_file(new_dir, c, fx_cache.FX_CACHE_TO_CCY, s),
+        )
+
+        print(
+            f"{readers} readers (pause {pause_ms:g}ms) + 1 writer rewriting {len(currencies)} pairs continuously "
+            f"for {seconds:.0f}s, {years}y files, {write_ms:g}ms per write"
+        )
+        for name, lat, writes, torn in (
+            ("global lock + mutable dict", old_lat, old_writes, old_torn),
+            ("snapshot swap, per-pair locks", new_lat, new_writes, new_torn),
+        ):
+            p50, p99, p999 = np.percentile(lat, [50, 99, 99.9]) * 1e6
+            print(
+                f"  {name:<30} lookups={len(lat):>8} p50={p50:6.1f}us p99={p99:6.1f}us p99.9={p999:8.1f}us "
+                f"max={lat.max() * 1e3:6.1f}ms writes={writes} torn={torn}"
+            )
+        _check("fx-readers torn snapshot reads", new_torn == 0)
+    finally:
+        fx_store.write_store = real_write_store
+        fx_cache._fx_snapshot = {}
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_rerun(files: int, statements: int, reruns: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-rerun-"))
+    try:
+        folder = workdir / "statements"
+        data_dir = workdir / "data"
+        folder.mkdir()
+        day = pd.Timestamp("2015-01-01")
+        for i in range(statements):
+            end = day + pd.Timedelta(days=i)
+            (folder / f"account-statement_{day:%Y-%m-%d}_{end:%Y-%m-%d}_en-us_{i:05d}.csv").write_text("Type\n")
+        for i in range(10):
+            (folder / f"consolidated_statement_{day:%Y-%m-%d}_{day + pd.Timedelta(days=i):%Y-%m-%d}.csv").write_text("x\n")
+        for i in range(max(files - statements - 10, 0)):
+            (folder / f"Spreadsheet {i}.numbers").write_bytes(b"")
+        for ccy in fx_cache.FX_CACHE_CURRENCIES:
+            fx_store.write_store(fx_cache._fx_cache_path(data_dir, ccy), pd.Series(7.0, index=pd.date_range(day, periods=30)))
+        (data_dir / "manual_expenses.csv").write_text("date,amount\n")
+        rules = workdir / "expense_categories.yml"
+        rules.write_text("rent: Housing\n")
+        ledger_dir = data_dir / ledger.LEDGER_DIRNAME
+
+        def mtime(path: str | Path) -> float:
+            return os.path.getmtime(path) if os.path.exists(path) else 0.0
+
+        # Old rerun: glob + sort the statement folder twice and stat every input.
+        def old_rerun() -> tuple:
+            csv_path = proc.find_latest_account_statement_csv(str(folder))
+            consolidated = invest_processing.find_latest_consolidated_statement_csv(folder)
+            versions = (
+                fx_cache.fx_cache_version(data_dir),
+                mtime(data_dir / "manual_expenses.csv"),
+                mtime(rules),
+                ledger.ledger_version(ledger_dir),
+                mtime(csv_path),
+                mtime(consolidated),
+            )
+            return csv_path, consolidated, versions
+
+        # New rerun: versions from memory; the latest statements are cached per folder
+        # version the way st.cache_data caches sync_account_statements.
+        def new_rerun(watcher: InputWatcher, latest: dict) -> tuple:
+            v = watcher.version("statements")
+            if v not in latest:
+                latest[v] = (
+                    proc.find_latest_account_statement_csv(str(folder)),
+                    invest_processing.find_latest_consolidated_statement_csv(folder),
+                )
+            csv_path, consolidated = latest[v]
+            return csv_path, consolidated, (watcher.version("fx"), watcher.version("manual"), watcher.version("rules"), v)
+
+        def make_watcher(use_inotify: bool) -> InputWatcher:
+            watcher = InputWatcher(poll_interval_seconds=0.5, use_inotify=use_inotify)
+            watcher.watch_dir("statements", folder, pattern="*.csv")
+            watcher.watch_dir("fx", data_dir, pattern=f"fx_*{fx_store.STORE_SUFFIX}")
+            watcher.watch_file("manual", data_dir / "manual_expenses.csv")
+            watcher.watch_file("rules", rules)
+            return watcher.start()
+
+        old_s, old = _timed(lambda: [old_rerun() for _ in range(reruns)][-1])
+        print(f"folder: {files} files ({statements} account statements), {reruns} reruns")
+        print(f"  stat polling per rerun:  {old_s / reruns * 1e3:9.3f} ms")
+
+        for use_inotify in (True, False):
+            watcher = make_watcher(use_inotify)
+            try:
+                latest: dict = {}
+                new_rerun(watcher, latest)  # first render fills the index
+                new_s, new = _timed(lambda: [new_rerun(watcher, latest) for _ in range(reruns)][-1])
+                check_s, _ = _timed(lambda: watcher.refresh("statements"))
+
+                end = day + pd.Timedelta(days=statements + 1)
+                newer = folder / f"account-statement_{day:%Y-%m-%d}_{end:%Y-%m-%d}_en-us_new.csv"
+                before = watcher.version("statements")
+                t0 = time.perf_counter()
+                newer.write_text("Type\n")
+                while watcher.version("statements") == before and time.perf_counter() - t0 < 10:
+                    time.sleep(0.001)
+                seen_s = time.perf_counter() - t0
+                picked = new_rerun(watcher, latest)[0] == newer.as_posix()
+                newer.unlink()
+                watcher.refresh("statements")
+            finally:
+                watcher.stop()
+            print(
+                f"  watcher ({watcher.backend:8s}) per rerun: {new_s / reruns * 1e6:9.3f} µs  "
+                f"({old_s / max(new_s, 1e-12):,.0f}x), same latest: {new[:2] == old[:2]}"
+            )
+            print(
+                f"    new export noticed after {seen_s * 1e3:.0f} ms and picked: {picked}; "
+                f"one background folder check: {check_s * 1e3:.2f} ms"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_providers(rows: int, latency: float, error_rate: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxprov-"))
+    today = pd.Timestamp.today().normalize()
+    rng = np.random.default_rng(17)
+    df = pd.DataFrame(
+        {
+            "type": "expense",
+            "amount_net": -np.round(rng.gamma(2.0, 60.0, rows), 2),
+            "currency": rng.choice(["DKK", "EUR", "USD", "GBP", "SEK", "NOK", "CHF"], rows),
+            "completed_date": today - pd.to_timedelta(rng.integers(0, 2 * 365, rows), unit="D"),
+        }
+    )
+    recording = record_fx_rates(
+        SyntheticFxProvider(),
+        workdir / "recorded" / "eur.json",
+        currencies=["DKK", "USD", "GBP", "SEK", "NOK", "CHF"],
+        start=(today - pd.Timedelta(days=3 * 365)).date(),
+        end=today.date(),
+    )
+
+    def run(provider: object, name: str) -> tuple[float, float, float, np.ndarray]:
+        data_dir = workdir / name
+        fx_cache.set_fx_provider(provider)  # type: ignore[arg-type]
+        fx_cache._fx_snapshot = {}
+        fx_cache._fx_rate_cache.clear()
+        fx_cache._fx_failed_lookups.clear()
+        fx_cache._fx_breaker.reset()
+        ensure_s, _ = _timed(lambda: fx_cache.ensure_fx_cache_files(data_dir))
+        convert_s, out = _timed(lambda: proc.convert_to_dkk(df, fx_data_dir=data_dir))
+        (data_dir / fx_cache.FX_REFRESH_STATE_FILENAME).unlink(missing_ok=True)  # make the updater fetch
+        update_s, _ = _timed(lambda: fx_cache.FxCacheBackgroundUpdater(data_dir).start().done.wait())
+        return ensure_s, convert_s, update_s, pd.to_numeric(out["amount_dkk"], errors="coerce").to_numpy()
+
+    try:
+        results: dict[str, tuple[float, float, float, np.ndarray]] = {}
+        requests: dict[str, str] = {}
+        for run_no in (1, 2):
+            results[f"synthetic, run {run_no}"] = run(SyntheticFxProvider(), f"synthetic{run_no}")
+            results[f"recorded JSON, run {run_no}"] = run(RecordedFxProvider(recording), f"recorded{run_no}")
+            with FxStandInServer(RecordedFxProvider(recording), latency=latency, error_rate=error_rate, seed=run_no) as server:
+                name = f"stand-in HTTP, run {run_no}"
+                results[name] = run(FrankfurterProvider(server.url, get=fx_cache._fx_http_get), f"standin{run_no}")
+                requests[name] = f"{server.requests} requests, {server.injected_errors} injected errors"
+        fx_cache.set_fx_provider(None)
+
+        reference = results["synthetic, run 1"][3]
+        print(f"rows={rows} over 2 years; stand-in latency={latency * 1000:.0f}ms, injected errors={error_rate:.0%}")
+        print(f"  {'provider':26s} {'ensure':>8s} {'convert':>8s} {'updater':>8s}  identical")
+        for name, (ensure_s, convert_s, update_s, amounts) in results.items():
+            same = _check(f"fx-providers {name}", np.allclose(amounts, reference, equal_nan=True, rtol=1e-12, atol=0))
+            print(
+                f"  {name:26s} {ensure_s:7.3f}s {convert_s:7.3f}s {update_s:7.3f}s  {same}"
+                + (f"  ({requests[name]})" if name in requests else "")
+            )
+    finally:
+        fx_cache.set_fx_provider(None)
+        fx_cache._fx_rate_cache.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_store(lookups: int, years: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fx-"))
+    try:
+        days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=years * 365, freq="D")
+        series = pd.Series(6.0 + 0.1 * np.sin(np.arange(len(days)) / 30.0), index=days)
+        csv_path = workdir / "fx_USD_DKK.csv"
+        store_path = workdir / f"fx_USD_DKK{fx_store.STORE_SUFFIX}"
+        fx_cache._write_fx_cache_csv(csv_path, series)
+        fx_store.import_csv(csv_path, store_path)
+
+        rng = np.random.default_rng(5)
+        dates = pd.Series(days[rng.integers(0, len(days), lookups)])
+
+        csv_load_s, s = _timed(lambda: fx_cache._read_fx_cache_csv(csv_path), repeat=5)
+        store_load_s, arr = _timed(lambda: fx_store.open_store(store_path), repeat=5)
+        reindex_s, old = _timed(lambda: s.reindex(dates).to_numpy(dtype="float"), repeat=5)
+        lookup_s, new = _timed(lambda: arr.rates_for(dates), repeat=5)
+
+        print(f"days={len(days)} lookups={lookups}")
+        print(f"  load CSV (read_csv + to_datetime): {csv_load_s * 1000:.2f}ms")
+        print(f"  open memory-mapped store:          {store_load_s * 1000:.3f}ms")
+        print(f"  Series.reindex lookup:             {reindex_s * 1000:.2f}ms")
+        print(f"  rates_for (offset + index):        {lookup_s * 1000:.2f}ms")
+        print(f"  identical rates: {_check('fx-store', np.array_equal(old, new, equal_nan=True))}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_asof(lookups: int, years: int, updates: int) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxasof-"))
+    staleness = fx_cache.FX_MAX_STALENESS_DAYS
+    try:
+        rng = np.random.default_rng(11)
+        end = pd.Timestamp.today().normalize()
+        span = pd.date_range(end=end, periods=years * 365, freq="D")
+        published = pd.bdate_range(span[0] + pd.Timedelta(days=3), end)  # starts after a gap, like a cache start
+        published = published[rng.random(len(published)) > 0.02]  # holidays
+        series = pd.Series(6.5 + np.cumsum(rng.normal(0, 0.01, len(published))), index=published)
+
+        def filled(s: pd.Series, start: pd.Timestamp, stop: pd.Timestamp) -> pd.Series:
+            # The old cache content: every calendar day, forward- then back-filled.
+            return s.reindex(pd.date_range(start, stop, freq="D")).ffill().bfill()
+
+        old_path, new_path = workdir / "old.f64", workdir / "new.f64"
+        old_csv, new_csv = workdir / "old.csv", workdir / "new.csv"
+        fx_store.write_store(old_path, filled(series, span[0], end))
+        fx_store.write_store(new_path, fx_cache._daily_series(series, span[0].date(), end.date()))
+        fx_store.export_csv(old_path, old_csv)
+        fx_store.export_csv(new_path, new_csv)
+
+        # Daily refreshes: rewrite the filled file vs append the new day.
+        upd_old, upd_new = workdir / "upd_old.f64", workdir / "upd_new.f64"
+        shutil.copy(old_path, upd_old)
+        shutil.copy(new_path, upd_new)
+        days = pd.date_range(end + pd.Timedelta(days=1), periods=updates, freq="D")
+        rates = 6.5 + rng.normal(0, 0.01, updates)
+
+        def rewrite_all() -> None:
+            for day, rate in zip(days, rates):
+                s = pd.concat([fx_store.open_store(upd_old).to_series(), pd.Series([rate], index=[day])])
+                fx_store.write_store(upd_old, filled(s, span[0], day))
+
+        def append_all() -> None:
+            for day, rate in zip(days, rates):
+                fx_store.append_store(upd_new, pd.Series([rate], index=[day]))
+
+        rewrite_s, _ = _timed(rewrite_all)
+        append_s, _ = _timed(append_all)
+        same_after_updates = bool(
+            np.array_equal(
+                fx_store.open_store(upd_old).rates_for(days),
+                fx_store.open_store(upd_new).rates_asof(days, staleness),
+            )
+        )
+
+        dates = pd.Series(span[rng.integers(0, len(span), lookups)])
+        old_arr, new_arr = fx_store.open_store(old_path), fx_store.open_store(new_path)
+        old_s, old = _timed(lambda: old_arr.rates_for(dates), repeat=5)
+        new_s, new = _timed(lambda: new_arr.rates_asof(dates, staleness), repeat=5)
+
+        # Reference: pandas merge_asof (backward, with the staleness as tolerance).
+        probe = pd.DataFrame({"date": dates.sort_values().to_numpy()})
+        ref_s, ref = _timed(
+            lambda: pd.merge_asof(
+                probe,
+                series.rename("rate").rename_axis("date").reset_index(),
+                on="date",
+                direction="backward",
+                tolerance=pd.Timedelta(days=staleness),
+            )["rate"].to_numpy()
+        )
+        before_first = dates < published[0]
+        agree = np.array_equal(old[~before_first.to_numpy()], new[~before_first.to_numpy()], equal_nan=True)
+
+        print(f"{years} years, {len(published)} publication days, max staleness {staleness} days")
+        print(f"  stored: filled {old_path.stat().st_size:,} B ({old_csv.stat().st_size:,} B as CSV), "
+              f"publication days {new_path.stat().st_size:,} B ({new_csv.stat().st_size:,} B as CSV)")
+        print(f"  {updates} daily updates: rewrite filled file {rewrite_s * 1e3:.1f}ms, append {append_s * 1e3:.1f}ms "
+              f"({rewrite_s / append_s:.0f}x); same rates: {_check('fx-asof updates', same_after_updates)}")
+        print(f"  {lookups:,} lookups: filled offset lookup {old_s * 1e3:.2f}ms, as-of {new_s * 1e3:.2f}ms, "
+              f"merge_asof {ref_s * 1e3:.2f}ms")
+        print(f"  as-of matches merge_asof: {_check('fx-asof merge_asof', np.array_equal(new_arr.rates_asof(probe['date'], staleness), ref, equal_nan=True))}; "
+              f"matches filled from the first publication on: {_check('fx-asof filled', agree)}")
+        print(f"  dates before the first publication: {int(before_first.sum())}; "
+              f"filled gave them a later rate: {int(np.isfinite(old[before_first.to_numpy()]).sum())}, "
+              f"as-of: {int(np.isfinite(new[before_first.to_numpy()]).sum())}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_fetch(currencies: list[str], latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxfetch-"))
+    base_url = fx_cache.FX_API_BASE_URL
+    start = fx_cache.FX_CACHE_START_DATE
+    today = pd.Timestamp.today().date()
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+
+            def per_currency() -> dict[str, pd.Series]:
+                out = {}
+                for c in currencies:
+                    url = f"{server.url}/{start}..{today}?from={c}&to={fx_cache.FX_CACHE_TO_CCY}"
+                    rates = fx_cache.get_fx_session().get(url, timeout=12).json()["rates"]
+                    s = pd.Series({pd.Timestamp(d): v[fx_cache.FX_CACHE_TO_CCY] for d, v in rates.items()})
+                    out[c] = s.sort_index()
+                return out
+
+            server.requests = 0
+            old_s, old = _timed(per_currency)
+            old_requests = server.requests
+
+            server.requests = 0
+            new_s, _ = _timed(lambda: fx_cache.ensure_fx_cache_files(workdir, currencies=currencies))
+            new_requests = server.requests
+
+        same = all(
+            np.allclose(
+                fx_cache.load_fx_rates(c, data_dir=workdir).rates_for(old[c].index), old[c].to_numpy()
+            )
+            for c in currencies
+        )
+        print(f"currencies={len(currencies)} latency={latency * 1000:.0f}ms")
+        print(f"  one request per currency: {old_s:.3f}s ({old_requests} requests)")
+        print(f"  single multi-symbol fetch: {new_s:.3f}s ({new_requests} requests)")
+        print(f"  cross rates match per-currency rates: {_check('fx-fetch', same)}")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_fallback(
+    days: int, currencies: list[str], latency: float, workers: int, rps: float, burst: int
+) -> None:
+    base_url, limit, limit_burst = fx_cache.FX_API_BASE_URL, fx_cache.FX_MAX_REQUESTS_PER_SECOND, fx_cache.FX_REQUEST_BURST
+    end = pd.Timestamp.today().normalize()
+    pairs = [(d, c) for d in pd.date_range(end=end, periods=days, freq="D") for c in currencies]
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+            fx_cache.FX_MAX_REQUESTS_PER_SECOND, fx_cache.FX_REQUEST_BURST = rps, burst
+
+            def sequential() -> dict[tuple[object, str], float | None]:
+                cache: dict = {}
+                return {(d.date(), c): fx_cache.fx_rate_on_date(d, c, _cache=cache, data_dir=None)[0] for d, c in pairs}
+
+            server.requests = 0
+            seq_s, seq = _timed(sequential)
+            seq_requests = server.requests
+
+            fx_cache._fx_rate_cache.clear()
+            server.requests = 0
+            par_s, par = _timed(lambda: fx_cache.fx_rates_on_dates(pairs, max_workers=workers, data_dir=None))
+            par_requests = server.requests
+
+        print(f"pairs={len(pairs)} latency={latency * 1000:.0f}ms workers={workers} limit={rps:g}/s burst {burst} per host")
+        print(f"  sequential fx_rate_on_date: {seq_s:.3f}s ({seq_requests} requests)")
+        print(f"  fx_rates_on_dates (pool):   {par_s:.3f}s ({par_requests} requests, {seq_s / max(par_s, 1e-9):.1f}x)")
+        print(f"  identical rates: {_check('fx-fallback', seq == par)}")
+    finally:
+        fx_cache.FX_API_BASE_URL, fx_cache.FX_MAX_REQUESTS_PER_SECOND = base_url, limit
+        fx_cache.FX_REQUEST_BURST = limit_burst
+        fx_cache._fx_rate_cache.clear()
+
+
+def bench_fx_range(days: int, currencies: list[str], latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxrange-"))
+    base_url = fx_cache.FX_API_BASE_URL
+    end = pd.Timestamp.today().normalize()
+    dates = pd.Series(pd.date_range(end=end, periods=days, freq="D"))
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+
+            fx_cache._fx_rate_cache.clear()
+            server.requests = 0
+            pairs = [(d, c) for d in dates for c in currencies]
+            per_date_s, per_date = _timed(lambda: fx_cache.fx_rates_on_dates(pairs, data_dir=None))
+            per_date_requests = server.requests
+
+            server.requests = 0
+            range_s, ranged = _timed(
+                lambda: {c: fx_cache.fx_rates_for_range(dates, c, data_dir=workdir, persist=True) for c in currencies}
+            )
+            range_requests = server.requests
+
+            server.requests = 0
+            cached_s, _ = _timed(
+                lambda: {c: fx_cache.fx_rates_for_range(dates, c, data_dir=workdir, persist=True) for c in currencies}
+            )
+            cached_requests = server.requests
+
+        same = all(
+            np.allclose(ranged[c], [per_date[(d.date(), c)] for d in dates]) for c in currencies
+        )
+        print(f"dates={days} currencies={len(currencies)} latency={latency * 1000:.0f}ms")
+        print(f"  per-date lookups (pool):       {per_date_s:.3f}s ({per_date_requests} requests)")
+        print(f"  one range fetch per currency:  {range_s:.3f}s ({range_requests} requests)")
+        print(f"  on-demand cache file, rerun:   {cached_s * 1000:.1f}ms ({cached_requests} requests)")
+        print(f"  identical rates: {_check('fx-range', same)}")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        fx_cache._fx_rate_cache.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_rate_db(days: int, currencies: list[str], latency: float) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxdb-"))
+    base_url = fx_cache.FX_API_BASE_URL
+    end = pd.Timestamp.today().normalize() - pd.Timedelta(days=7)
+    # XXX is unknown to the server: it exercises negative entries.
+    pairs = [(d, c) for d in pd.date_range(end=end, periods=days, freq="D") for c in [*currencies, "XXX"]]
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+            runs: list[tuple[float, int, dict]] = []
+            for _run in range(2):
+                fx_cache._fx_rate_cache.clear()  # a restart: only the SQLite file survives
+                server.requests = 0
+                seconds, rates = _timed(lambda: fx_cache.fx_rates_on_dates(pairs, data_dir=workdir))
+                runs.append((seconds, server.requests, rates))
+
+        db = workdir / fx_cache.FX_RATE_DB_FILENAME
+        print(f"pairs={len(pairs)} latency={latency * 1000:.0f}ms db={db.stat().st_size / 1024:.0f}KiB")
+        print(f"  first run (network):        {runs[0][0]:.3f}s ({runs[0][1]} requests)")
+        print(f"  after restart (SQLite):     {runs[1][0] * 1000:.1f}ms ({runs[1][1]} requests)")
+        print(f"  identical rates: {_check('fx-rate-db', runs[0][2] == runs[1][2])}")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        fx_cache._fx_rate_cache.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_fx_breaker(days: int, currencies: list[str], baseline_pairs: int) -> None:
+    base_url = fx_cache.FX_API_BASE_URL
+    settings = (fx_cache.FX_BREAKER_FAILURE_THRESHOLD, fx_cache.FX_BREAKER_RESET_SECONDS, fx_cache.FX_FAILURE_TTL_SECONDS)
+    end = pd.Timestamp.today().normalize() - pd.Timedelta(days=7)
+    pairs = [(d, c) for d in pd.date_range(end=end, periods=days, freq="D") for c in currencies]
+
+    def run(batch: list[tuple[pd.Timestamp, str]]) -> tuple[float, int, dict]:
+        fx_cache._fx_rate_cache.clear()
+        server.requests = 0
+        seconds, rates = _timed(lambda: fx_cache.fx_rates_on_dates(batch, data_dir=None))
+        return seconds, server.requests, rates
+
+    try:
+        with _MockFxServer(fail_status=503) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+
+            # Old behaviour: every lookup retries and backtracks through every date.
+            fx_cache.FX_BREAKER_FAILURE_THRESHOLD = 0
+            fx_cache.FX_FAILURE_TTL_SECONDS = 0.0
+            fx_cache._fx_failed_lookups.clear()
+            base_s, base_req, _ = run(pairs[:baseline_pairs])
+            per_pair = base_s / max(1, baseline_pairs)
+
+            fx_cache.FX_BREAKER_FAILURE_THRESHOLD = settings[0]
+            fx_cache.FX_FAILURE_TTL_SECONDS = settings[2]
+            fx_cache._fx_breaker.reset()
+            fx_cache._fx_failed_lookups.clear()
+            first_s, first_req, first = run(pairs)
+            state = fx_cache.fx_breaker_state()
+            again_s, again_req, _ = run(pairs)
+
+            # Outage over: after the reset timeout one probe closes the breaker again.
+            server.fail_status = None
+            fx_cache.FX_BREAKER_RESET_SECONDS = 0.2
+            time.sleep(0.25)
+            fx_cache._fx_failed_lookups.clear()
+            probe_s, probe_req, _ = run(pairs)  # lookups racing the probe are rejected
+            rec_s, rec_req, recovered = run(pairs)
+
+        print(f"pairs={len(pairs)} (API answering 503)")
+        print(
+            f"  no breaker:        ~{per_pair * len(pairs):.1f}s est. "
+            f"({per_pair:.2f}s/pair, {base_req / max(1, baseline_pairs):.0f} requests/pair incl. retries)"
+        )
+        print(f"  breaker, 1st pass: {first_s:.2f}s ({first_req} requests) -> state={state.state}")
+        print(f"  breaker, 2nd pass: {again_s * 1000:.1f}ms ({again_req} requests, failure TTL)")
+        print(f"  half-open probe:   {probe_s * 1000:.1f}ms ({probe_req} requests)")
+        print(
+            f"  recovered:         {rec_s:.2f}s ({rec_req} requests) -> state={fx_cache.fx_breaker_state().state}, "
+            f"{sum(r is not None for r in recovered.values())}/{len(pairs)} rates"
+        )
+        print(f"  outage answers all empty: {_check('fx-breaker outage', all(r is None for r in first.values()))}")
+    finally:
+        fx_cache.FX_API_BASE_URL = base_url
+        (
+            fx_cache.FX_BREAKER_FAILURE_THRESHOLD,
+            fx_cache.FX_BREAKER_RESET_SECONDS,
+            fx_cache.FX_FAILURE_TTL_SECONDS,
+        ) = settings
+        fx_cache._fx_breaker.reset()
+        fx_cache._fx_failed_lookups.clear()
+        fx_cache._fx_rate_cache.clear()
+
+
+class _NoFlight:
+    """Stand-in for fx_cache's single-flight group: every caller runs its own call."""
+
+    def do(self, key: object, fn: Callable[[], object]) -> object:
+        return fn()
+
+
+@contextmanager
+def _no_file_lock(path: object) -> Iterator[None]:
+    yield
+
+
+def _set_fx_coalescing(enabled: bool) -> None:
+    fx_cache._fx_flights = fx_cache._SingleFlight() if enabled else _NoFlight()  # type: ignore[assignment]
+    fx_cache._fx_file_lock = _FX_FILE_LOCK if enabled else _no_file_lock  # type: ignore[assignment]
+
+
+_FX_FILE_LOCK = fx_cache._fx_file_lock
+
+
+def _ensure_fx_in_process(url: str, data_dir: str, coalesce: bool, barrier: object) -> None:
+    fx_cache.FX_API_BASE_URL = url
+    _set_fx_coalescing(coalesce)
+    barrier.wait()  # type: ignore[attr-defined]
+    fx_cache.ensure_fx_cache_files(data_dir=data_dir)
+
+
+def bench_fx_coalesce(threads: int, processes: int, latency: float) -> None:
+    base_url = fx_cache.FX_API_BASE_URL
+    workdir = Path(tempfile.mkdtemp(prefix="bench-fxsf-"))
+    day = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+
+    def hammer(fn: Callable[[int], object]) -> tuple[float, list[object]]:
+        barrier = threading.Barrier(threads)
+        results: list[object] = [None] * threads
+
+        def worker(i: int) -> None:
+            barrier.wait()
+            results[i] = fn(i)
+
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        t0 = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return time.perf_counter() - t0, results
+
+    def store_bytes(data_dir: Path) -> dict[str, bytes]:
+        return {p.name: p.read_bytes() for p in sorted(data_dir.glob(f"*{fx_store.STORE_SUFFIX}"))}
+
+    rows: list[tuple[str, bool, float, int, bool]] = []
+    try:
+        with _MockFxServer(latency=latency) as server:
+            fx_cache.FX_API_BASE_URL = server.url
+            for coalesce in (False, True):
+                _set_fx_coalescing(coalesce)
+
+                fx_cache._fx_rate_cache.clear()
+                server.requests = 0
+                seconds, rates = hammer(lambda _i: fx_cache.fx_rate_on_date(day, "SEK", data_dir=None))
+                rows.append((f"{threads} threads, same date", coalesce, seconds, server.requests, len(set(rates)) == 1))
+
+                target = workdir / f"threads-{coalesce}"
+                server.requests = 0
+                seconds, _ = hammer(lambda _i: fx_cache.ensure_fx_cache_files(data_dir=target))
+                files = store_bytes(target)
+                rows.append((f"{threads} threads, cold cache", coalesce, seconds, server.requests, len(files) == len(fx_cache.FX_CACHE_CURRENCIES)))
+
+                target = workdir / f"procs-{coalesce}"
+                ctx = multiprocessing.get_context("spawn")
+                barrier = ctx.Barrier(processes + 1)
+                procs = [
+                    ctx.Process(target=_ensure_fx_in_process, args=(server.url, str(target), coalesce, barrier))
+                    for _ in range(processes)
+                ]
+                for proc_ in procs:
+                    proc_.start()
+                server.requests = 0
+                barrier.wait()
+                t0 = time.perf_counter()
+                for proc_ in procs:
+                    proc_.join()
+                seconds = time.perf_counter() - t0
+                ok = all(p_.exitcode == 0 for p_ in procs) and store_bytes(target) == store_bytes(workdir / f"threads-{coalesce}")
+                rows.append((f"{processes} processes, cold cache", coalesce, seconds, server.requests, ok))
+
+        print(f"mock latency={latency * 1000:.0f}ms")
+        for name, coalesce, seconds, requests_, ok in rows:
+            label = "single-flight+lock" if coalesce else "uncoordinated     "
+            # Coordinated callers must share one fetch (one multi-symbol request per cold cache).
+            ok = _check(f"fx-coalesce {name} {label.strip()}", ok and (not coalesce or requests_ == 1))
+            print(f"  {name:<28} {label} {seconds:6.2f}s {requests_:4d} requests  consistent={ok}")
+    finally:
+        _set_fx_coalescing(True)
+        fx_cache.FX_API_BASE_URL = base_url
+        fx_cache._fx_rate_cache.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("categorize", help="Keyword automaton vs per-rule loop")
+    p.add_argument("--rows", type=int, default=200_000)
+
+    p = sub.add_parser("dedup", help="Categorize distinct descriptions once vs per row")
+    p.add_argument("--rows", type=int, default=500_000)
+    p.add_argument("--distinct", type=int, default=2_000)
+
+    p = sub.add_parser("recategorize", help="Patch a prepared frame after a rules edit vs full rebuild")
+    p.add_argument("--rows", type=int, default=200_000)
+
+    p = sub.add_parser("normalize", help="normalize_text_series vs per-value normalize_text")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--checks", type=int, default=50_000)
+
+    p = sub.add_parser("classify", help="classify_type vs whole-frame astype(str) refund scan")
+    p.add_argument("--rows", type=int, default=1_000_000)
+
+    p = sub.add_parser("statement-cache", help="Cached parsed statement vs CSV parsing")
+    p.add_argument("--rows", type=int, default=500_000)
+
+    p = sub.add_parser("csv-reader", help="Schema-aware load_revolut_csv vs untyped read_csv")
+    p.add_argument("--rows", type=int, default=1_000_000)
+
+    p = sub.add_parser("ledger", help="Incremental ledger ingest vs re-parsing every export")
+    p.add_argument("--rows", type=int, default=300_000)
+    p.add_argument("--exports", type=int, default=12)
+
+    p = sub.add_parser("incremental", help="Incremental prepare for a newer export vs full build")
+    p.add_argument("--rows", type=int, default=300_000)
+    p.add_argument("--new-rows", type=int, default=200)
+
+    p = sub.add_parser("startup", help="First render with background FX init vs blocking ensure_fx_cache_files")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--latency", type=float, default=3.0)
+
+    p = sub.add_parser("fx-backfill", help="Multi-year statement: cache backfill vs per-date lookups before the cache start")
+    p.add_argument("--rows", type=int, default=50_000)
+    p.add_argument("--sample", type=int, default=40)
+    p.add_argument("--latency", type=float, default=0.05)
+
+    p = sub.add_parser("invest-fx", help="Investment FX valuation: rates_for_pairs vs iterrows + per-row lookups")
+    p.add_argument("--exchanges", type=int, default=5_000)
+
+    p = sub.add_parser("fx-updater", help="Background updater: parallel refresh + skip-if-fresh vs sequential updates")
+    p.add_argument("--on-demand", default="SEK,NOK,PLN,CHF,JPY")
+    p.add_argument("--latency", type=float, default=0.3)
+
+    p = sub.add_parser("fx-readers", help="FX series lookups during continuous updates: snapshot swap vs global lock")
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.add_argument("--years", type=int, default=10)
+    p.add_argument("--write-ms", type=float, default=5.0)
+    p.add_argument("--pause-ms", type=float, default=1.0)
+
+    p = sub.add_parser("rerun", help="Per-rerun input versioning: watcher counters vs globbing/stat-ing every input")
+    p.add_argument("--files", type=int, default=5_000)
+    p.add_argument("--statements", type=int, default=1_000)
+    p.add_argument("--reruns", type=int, default=50)
+
+    p = sub.add_parser("fx-providers", help="ensure/convert/updater against synthetic, recorded-JSON and stand-in HTTP providers")
+    p.add_argument("--rows", type=int, default=20_000)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--error-rate", type=float, default=0.05)
+
+    p = sub.add_parser("fx-store", help="Memory-mapped FX rate arrays vs CSV + Series.reindex")
+    p.add_argument("--lookups", type=int, default=1_000_000)
+    p.add_argument("--years", type=int, default=10)
+
+    p = sub.add_parser("fx-asof", help="Publication-day FX files with as-of lookups vs calendar-day filled files")
+    p.add_argument("--lookups", type=int, default=1_000_000)
+    p.add_argument("--years", type=int, default=10)
+    p.add_argument("--updates", type=int, default=200)
+
+    p = sub.add_parser("fx-fetch", help="Cold FX cache: one multi-symbol request vs one per currency")
+    p.add_argument("--currencies", default="USD,EUR,GBP,SEK,NOK,CHF,JPY,PLN")
+    p.add_argument("--latency", type=float, default=0.15)
+
+    p = sub.add_parser("fx-fallback", help="Concurrent per-date FX lookups vs sequential, against a mock server")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--currencies", default="SEK,NOK,PLN")
+    p.add_argument("--latency", type=float, default=0.1)
+    p.add_argument("--workers", type=int, default=fx_cache.FX_FALLBACK_MAX_WORKERS)
+    p.add_argument("--rps", type=float, default=fx_cache.FX_MAX_REQUESTS_PER_SECOND)
+    p.add_argument("--burst", type=int, default=fx_cache.FX_REQUEST_BURST)
+
+    p = sub.add_parser("fx-range", help="One range fetch per non-cached currency vs per-date lookups")
+    p.add_argument("--days", type=int, default=120)
+    p.add_argument("--currencies", default="SEK,NOK,PLN")
+    p.add_argument("--latency", type=float, default=0.1)
+
+    p = sub.add_parser("fx-rate-db", help="Per-date FX lookups after a restart: SQLite cache vs network")
+    p.add_argument("--days", type=int, default=60)
+    p.add_argument("--currencies", default="SEK,NOK,PLN")
+    p.add_argument("--latency", type=float, default=0.05)
+
+    p = sub.add_parser("fx-breaker", help="FX lookups during an API outage: circuit breaker vs retrying every date")
+    p.add_argument("--days", type=int, default=60)
+    p.add_argument("--currencies", default="SEK,NOK,PLN")
+    p.add_argument("--baseline-pairs", type=int, default=2)
+
+    p = sub.add_parser("fx-coalesce", help="Concurrent FX misses: single-flight + file lock vs one request per caller")
+    p.add_argument("--threads", type=int, default=32)
+    p.add_argument("--processes", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.2)
+
+    args = parser.parse_args()
+
+    if args.bench == "categorize":
+        bench_categorize(args.rows)
+    elif args.bench == "dedup":
+        bench_dedup(args.rows, args.distinct)
+    elif args.bench == "recategorize":
+        bench_recategorize(args.rows)
+    elif args.bench == "normalize":
+        bench_normalize(args.rows, args.checks)
+    elif args.bench == "classify":
+        bench_classify(args.rows)
+    elif args.bench == "statement-cache":
+        bench_statement_cache(args.rows)
+    elif args.bench == "csv-reader":
+        bench_csv_reader(args.rows)
+    elif args.bench == "ledger":
+        bench_ledger(args.rows, args.exports)
+    elif args.bench == "incremental":
+        bench_incremental(args.rows, args.new_rows)
+    elif args.bench == "startup":
+        bench_startup(args.rows, args.latency)
+    elif args.bench == "fx-backfill":
+        bench_fx_backfill(args.rows, args.sample, args.latency)
+    elif args.bench == "invest-fx":
+        bench_invest_fx(args.exchanges)
+    elif args.bench == "fx-updater":
+        bench_fx_updater([c.strip().upper() for c in args.on_demand.split(",") if c.strip()], args.latency)
+    elif args.bench == "fx-readers":
+        bench_fx_readers(args.readers, args.seconds, args.years, args.write_ms, args.pause_ms)
+    elif args.bench == "rerun":
+        bench_rerun(args.files, args.statements, args.reruns)
+    elif args.bench == "fx-providers":
+        bench_fx_providers(args.rows, args.latency, args.error_rate)
+    elif args.bench == "fx-store":
+        bench_fx_store(args.lookups, args.years)
+    elif args.bench == "fx-asof":
+        bench_fx_asof(args.lookups, args.years, args.updates)
+    elif args.bench == "fx-fallback":
+        currencies = [c.strip().upper() for c in args.currencies.split(",") if c.strip()]
+        bench_fx_fallback(args.days, currencies, args.latency, args.workers, args.rps, args.burst)
+    elif args.bench == "fx-range":
+        currencies = [c.strip().upper() for c in args.currencies.split(",") if c.strip()]
+        bench_fx_range(args.days, currencies, args.latency)
+    elif args.bench == "fx-rate-db":
+        currencies = [c.strip().upper() for c in args.currencies.split(",") if c.strip()]
+        bench_fx_rate_db(args.days, currencies, args.latency)
+    elif args.bench == "fx-breaker":
+        currencies = [c.strip().upper() for c in args.currencies.split(",") if c.strip()]
+        bench_fx_breaker(args.days, currencies, args.baseline_pairs)
+    elif args.bench == "fx-coalesce":
+        bench_fx_coalesce(args.threads, args.processes, args.latency)
+    elif args.bench == "fx-fetch":
+        bench_fx_fetch([c.strip().upper() for c in args.currencies.split(",") if c.strip()], args.latency)
+
+    if _failed_checks:
+        print(f"FAILED correctness checks: {', '.join(_failed_checks)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
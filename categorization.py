@@ -0,0 +1,348 @@
+"""Expense categorization matching helpers.
+
+The rules themselves are loaded and normalized in processing.py
+(`load_expense_category_map`); this module only holds the data structures used
+to evaluate them quickly against many descriptions.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Hashable, Iterable, Optional, Sequence
+
+from disk_store import SqliteStore, chunks, placeholders
+
+logger = logging.getLogger(__name__)
+
+_NO_MATCH = 1 << 62
+
+
+class _Automaton:
+    """Aho-Corasick automaton reporting the best (lowest) rule priority found in a text."""
+
+    def __init__(self, patterns: Sequence[tuple[str, int]]) -> None:
+        goto: list[dict[str, int]] = [{}]
+        best: list[int] = [_NO_MATCH]
+
+        for pattern, priority in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    best.append(_NO_MATCH)
+                state = nxt
+            if priority < best[state]:
+                best[state] = priority
+
+        # Breadth-first so every failure target is final before it is used.
+        fail = [0] * len(goto)
+        queue: deque[int] = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(ch, 0)
+                if best[fail[t]] < best[t]:
+                    best[t] = best[fail[t]]
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def best(self, text: str) -> int:
+        goto = self._goto
+        fail = self._fail
+        best = self._best
+
+        state = 0
+        result = _NO_MATCH
+        for ch in text:
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            b = best[state]
+            if b < result:
+                result = b
+        return result
+
+
+def rules_hash(rules: Sequence[tuple[str, str]]) -> str:
+    """Content hash of a compiled rule list (order-sensitive, like matching itself)."""
+
+    h = hashlib.sha256()
+    for keyword, category in rules:
+        h.update(keyword.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(category.encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+class KeywordMatcher:
+    """Multi-pattern matcher equivalent to looping over compiled category rules.
+
+    `rules` is the longest-key-first list returned by `load_expense_category_map`.
+    The winner is the first rule (in list order) that matches, where a rule matches if:
+    - its keyword is a substring of the normalized description, or
+    - the keyword has no intentional leading/trailing space and its space-stripped
+      form is a substring of the space-stripped description.
+
+    Both forms are scanned once each, regardless of how many rules there are. For a
+    handful of rules (e.g. the keywords added by a rules edit) plain substring checks
+    are cheaper than walking the automaton, so those are used instead.
+    """
+
+    _LINEAR_MAX_RULES = 8
+
+    def __init__(self, rules: Sequence[tuple[str, str]]) -> None:
+        self.rules: tuple[tuple[str, str], ...] = tuple(rules)
+        self.rules_hash = rules_hash(self.rules)
+
+        spaced: list[tuple[str, int]] = []
+        compact: list[tuple[str, int]] = []
+        for priority, (keyword, _category) in enumerate(self.rules):
+            if not keyword:
+                continue
+            spaced.append((keyword, priority))
+            if keyword.startswith(" ") or keyword.endswith(" "):
+                continue
+            kw_compact = keyword.replace(" ", "")
+            if kw_compact:
+                compact.append((kw_compact, priority))
+
+        self._linear: Optional[tuple[list[tuple[str, int]], list[tuple[str, int]]]] = None
+        if len(self.rules) <= self._LINEAR_MAX_RULES:
+            self._linear = (spaced, compact)
+        else:
+            self._spaced = _Automaton(spaced)
+            self._compact = _Automaton(compact)
+
+    def match_index(self, text_norm: str) -> Optional[int]:
+        """Return the index of the winning rule for a `normalize_text` description."""
+
+        if not text_norm:
+            return None
+        if self._linear is not None:
+            return self._match_index_linear(text_norm)
+        best = min(self._spaced.best(text_norm), self._compact.best(text_norm.replace(" ", "")))
+        return None if best == _NO_MATCH else best
+
+    def _match_index_linear(self, text_norm: str) -> Optional[int]:
+        spaced, compact = self._linear  # type: ignore[misc]
+        text_compact = text_norm.replace(" ", "")
+        best = _NO_MATCH
+        for keyword, priority in spaced:
+            if priority < best and keyword in text_norm:
+                best = priority
+        for kw_compact, priority in compact:
+            if priority < best and kw_compact in text_compact:
+                best = priority
+        return None if best == _NO_MATCH else best
+
+    def match(self, text_norm: str) -> Optional[tuple[str, str]]:
+        """Return the winning (keyword, category) rule, or None."""
+
+        idx = self.match_index(text_norm)
+        return None if idx is None else self.rules[idx]
+
+
+def _priority(keyword: str) -> tuple[int, str]:
+    # Same key load_expense_category_map sorts by (descending).
+    return (len(keyword), keyword)
+
+
+@dataclass(frozen=True)
+class RulesDiff:
+    """Keyword-level difference between two compiled rule lists.
+
+    Unchanged keywords keep their relative order, so a description's winning rule
+    can only change if its current winner was removed/retargeted, or if an added
+    keyword that outranks the current winner matches it.
+    """
+
+    added: tuple[tuple[str, str], ...]
+    removed: tuple[tuple[str, str], ...]
+    retargeted: tuple[tuple[str, str, str], ...]  # (keyword, old_category, new_category)
+    _added_matcher: KeywordMatcher = field(repr=False, compare=False)
+    _changed_keywords: frozenset[str] = field(repr=False, compare=False)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.retargeted)
+
+    def keyword_changed(self, current_keyword: Optional[str]) -> bool:
+        return current_keyword is not None and current_keyword in self._changed_keywords
+
+    def may_be_outranked(self, current_keyword: Optional[str]) -> bool:
+        if not self.added:
+            return False
+        if current_keyword is None:
+            return True
+        return _priority(self.added[0][0]) > _priority(current_keyword)
+
+    def added_matches(self, text_norm: str) -> bool:
+        return self._added_matcher.match_index(text_norm) is not None
+
+
+def diff_rules(
+    old: Sequence[tuple[str, str]],
+    new: Sequence[tuple[str, str]],
+) -> RulesDiff:
+    # The matcher applies the first rule of a keyword (two YAML keys can normalize alike).
+    old_map: dict[str, str] = {}
+    for k, c in old:
+        old_map.setdefault(k, c)
+    new_map: dict[str, str] = {}
+    for k, c in new:
+        new_map.setdefault(k, c)
+    added = tuple(
+        sorted(((k, c) for k, c in new_map.items() if k not in old_map), key=lambda kv: _priority(kv[0]), reverse=True)
+    )
+    removed = tuple((k, c) for k, c in old_map.items() if k not in new_map)
+    retargeted = tuple((k, old_map[k], c) for k, c in new_map.items() if k in old_map and old_map[k] != c)
+    return RulesDiff(
+        added=added,
+        removed=removed,
+        retargeted=retargeted,
+        _added_matcher=KeywordMatcher(added),
+        _changed_keywords=frozenset(k for k, _c in removed) | frozenset(k for k, _o, _n in retargeted),
+    )
+
+
+class DescriptionLRU:
+    """Bounded, thread-safe LRU used for description -> (category, keyword) results."""
+
+    def __init__(self, maxsize: int = 50_000) -> None:
+        self.maxsize = int(maxsize)
+        self._data: OrderedDict[Hashable, tuple[str, Optional[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[tuple[str, Optional[str]]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: tuple[str, Optional[str]]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+@dataclass(frozen=True)
+class CategorizationStats:
+    """What one categorization pass did, for logging/diagnostics."""
+
+    rows: int
+    unique_descriptions: int
+    cache_hits: int
+    matched: int
+    disk_hits: int = 0
+    elapsed_seconds: float = 0.0
+    estimated_saved_seconds: float = 0.0
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Rows per distinct description (1.0 means no repetition)."""
+
+        return self.rows / self.unique_descriptions if self.unique_descriptions else 1.0
+
+
+CATEGORY_CACHE_FILENAME = "category_cache.sqlite"
+
+
+class CategoryDiskCache(SqliteStore):
+    """Persistent normalized description -> (category, keyword) cache.
+
+    The stored rows are stamped with the rules content hash; writing with a new hash
+    drops everything first, and reads with a different hash see an empty cache.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS categories ("
+        "description TEXT PRIMARY KEY, category TEXT NOT NULL, keyword TEXT)",
+    )
+
+    @staticmethod
+    def _stored_hash(conn: sqlite3.Connection) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'rules_hash'").fetchone()
+        return row[0] if row else None
+
+    def get_many(
+        self, rules_hash: str, descriptions: Iterable[str]
+    ) -> dict[str, tuple[str, Optional[str]]]:
+        wanted = list(dict.fromkeys(descriptions))
+        if not wanted:
+            return {}
+
+        out: dict[str, tuple[str, Optional[str]]] = {}
+        try:
+            conn = self._connect()
+            try:
+                if self._stored_hash(conn) != rules_hash:
+                    return {}
+                for chunk in chunks(wanted):
+                    rows = conn.execute(
+                        "SELECT description, category, keyword FROM categories "
+                        f"WHERE description IN ({placeholders(len(chunk))})",
+                        chunk,
+                    )
+                    for description, category, keyword in rows:
+                        out[description] = (category, keyword)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Category cache read failed ({self.path}): {e}")
+            return {}
+        return out
+
+    def put_many(self, rules_hash: str, items: dict[str, tuple[str, Optional[str]]]) -> None:
+        if not items:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if self._stored_hash(conn) != rules_hash:
+                    conn.execute("DELETE FROM categories")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('rules_hash', ?)", (rules_hash,)
+                    )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO categories (description, category, keyword) VALUES (?, ?, ?)",
+                    [(d, c, k) for d, (c, k) in items.items()],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Category cache write failed ({self.path}): {e}")
@@ -0,0 +1,109 @@
+"""Small on-disk persistence helpers shared by the caches.
+
+- atomic_path / write_json: write to a per-process, per-thread tmp file, then
+  replace the target, so readers never see a partial file
+- read_json: a JSON object from disk, {} when missing or unreadable
+- SqliteStore: a SQLite file in WAL mode (sessions can read while another one
+  writes) whose schema is created on first connect, one instance per path
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Iterator, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+_S = TypeVar("_S", bound="SqliteStore")
+
+
+@contextmanager
+def atomic_path(path: str | Path) -> Iterator[Path]:
+    """Yield a tmp path next to `path`; it replaces `path` if the block succeeds."""
+
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        tmp.replace(p)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def write_json(path: str | Path, data: object, indent: int | None = 1) -> None:
+    """Atomically write `data` as JSON (sorted keys)."""
+
+    with atomic_path(path) as tmp:
+        tmp.write_text(json.dumps(data, indent=indent, sort_keys=True), encoding="utf-8")
+
+
+def read_json(path: str | Path, what: str) -> dict:
+    """The JSON object stored at `path`; {} if missing, unreadable or not an object.
+
+    `what` names the file in the warning logged for unreadable content.
+    """
+
+    p = Path(path)
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable {what} {p}: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def chunks(values: Sequence[_T], size: int = 500) -> Iterator[Sequence[_T]]:
+    """Consecutive slices of at most `size` values (SQLite caps bound parameters)."""
+
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def placeholders(n: int) -> str:
+    return ",".join("?" * n)
+
+
+_stores: dict[tuple[type, Path], "SqliteStore"] = {}
+_stores_lock = threading.Lock()
+
+
+class SqliteStore:
+    """A SQLite file in WAL mode; subclasses list their CREATE statements in SCHEMA."""
+
+    SCHEMA: tuple[str, ...] = ()
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._initialized = False
+
+    @classmethod
+    def for_path(cls: type[_S], path: str | Path) -> _S:
+        """The shared instance of this store class for `path`."""
+
+        key = (cls, Path(path))
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = cls(path)
+        return store  # type: ignore[return-value]
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._initialized = True
+        return conn
@@ -1,27 +1,92 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from datetime import date as Date
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+from datetime import time as Time
 from pathlib import Path
+from urllib.parse import urlparse
 import logging
+import os
+import sqlite3
 import threading
 import time
-from typing import Dict, Iterable, Optional, Tuple
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
 
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+import numpy as np
 import pandas as pd
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from disk_store import SqliteStore, chunks, placeholders, read_json, write_json
+from fx_providers import (
+    FrankfurterProvider,
+    FxProvider,
+    FxProviderError,
+    FxProviderUnavailable,
+    RecordedFxProvider,
+    UnavailableFxProvider,
+)
+import fx_store
+
 logger = logging.getLogger(__name__)
 
 FX_CACHE_CURRENCIES: tuple[str, ...] = ("USD", "EUR", "GBP")
 FX_CACHE_TO_CCY = "DKK"
 FX_CACHE_START_DATE = Date(2025, 12, 1)
+# Frankfurter-compatible API; override (e.g. a local stand-in server) via FX_API_BASE_URL.
+FX_API_BASE_URL = os.environ.get("FX_API_BASE_URL", "https://api.frankfurter.app").rstrip("/")
+# Recorded rates (a Frankfurter range JSON file or a folder of them) to serve instead
+# of any API, e.g. for offline runs; see fx_providers.RecordedFxProvider.
+FX_RECORDED_RATES = os.environ.get("FX_RECORDED_RATES", "")
+# Range fetches are quoted in this currency; every X->to_ccy series is a cross rate.
+FX_FETCH_BASE_CCY = "EUR"
+# Per-date fallback lookups (currencies outside the local cache) run concurrently.
+# Each API host gets bursts of up to FX_REQUEST_BURST requests at once and
+# FX_MAX_REQUESTS_PER_SECOND sustained (a token bucket shared by all threads).
+FX_FALLBACK_MAX_WORKERS = 8
+FX_MAX_REQUESTS_PER_SECOND = 40.0
+FX_REQUEST_BURST = 16
+# Persistent per-date lookups (under data_dir), so restarts don't re-download history.
+FX_RATE_DB_FILENAME = "fx_rates.sqlite"
+# "No data" answers are re-checked after this long (the API may add a currency/date).
+FX_NO_DATA_TTL_SECONDS = 7 * 86400.0
+# Circuit breaker around API calls: open after this many consecutive failures, then
+# let one probe through after FX_BREAKER_RESET_SECONDS. Threshold <= 0 disables it.
+FX_BREAKER_FAILURE_THRESHOLD = 5
+FX_BREAKER_RESET_SECONDS = 60.0
+# Lookups that failed (API down, breaker open) aren't retried for this long.
+FX_FAILURE_TTL_SECONDS = 300.0
+# Cross-process lock (in data_dir) held while the shared cache files are downloaded/updated.
+FX_CACHE_LOCK_FILENAME = ".fx_cache.lock"
+# Background refresh: every FX_REFRESH_INTERVAL_SECONDS and right after the daily
+# reference-rate publication (ECB ~16:00 CET; the API picks it up shortly after).
+# A file refreshed since the last publication is skipped.
+FX_REFRESH_INTERVAL_SECONDS = 6 * 3600.0
+FX_PUBLICATION_TIME_UTC = Time(15, 30)
+# Last successful refresh per pair file (epoch seconds), under data_dir.
+FX_REFRESH_STATE_FILENAME = "fx_refresh.json"
+# Cache files hold publication days only; a date takes the latest rate at or before
+# it, if that is at most this many days old (like fx_rate_on_date's backtracking).
+FX_MAX_STALENESS_DAYS = 10
 
 _fx_session: Optional[requests.Session] = None
-_fx_cache_lock = threading.Lock()
-_fx_series_cache: dict[tuple[str, str, str], tuple[float, pd.Series]] = {}
+# Built on first use (FX_RECORDED_RATES is read then, not at import); see get_fx_provider.
+_fx_provider: Optional[FxProvider] = None
+_fx_provider_resolved = False
+_fx_provider_lock = threading.Lock()
+_fx_rate_cache: Dict[Tuple[str, str, str], Tuple[Optional[float], Optional[pd.Timestamp]]] = {}
+# (day, from, to) -> monotonic time until which a failed lookup isn't retried.
+_fx_failed_lookups: dict[Tuple[str, str, str], float] = {}
 
 
 def get_fx_session() -> requests.Session:
@@ -41,21 +106,387 @@ def get_fx_session() -> requests.Session:
         allowed_methods=("GET",),
         raise_on_status=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    pool_size = max(10, FX_FALLBACK_MAX_WORKERS)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
     _fx_session = session
     return session
 
 
+def set_fx_provider(provider: FxProvider | None) -> None:
+    """Fetch every FX rate from `provider` (None: the Frankfurter API at FX_API_BASE_URL)."""
+
+    global _fx_provider, _fx_provider_resolved
+    with _fx_provider_lock:
+        _fx_provider = provider
+        _fx_provider_resolved = True
+
+
+def get_fx_provider() -> FxProvider:
+    """The provider FX fetches go to (see set_fx_provider).
+
+    Unless one was set, FX_RECORDED_RATES is loaded on the first call. If it can't
+    be, the error is logged and every fetch fails as unavailable (like an outage)
+    instead of falling through to the live API.
+    """
+
+    global _fx_provider, _fx_provider_resolved
+    if not _fx_provider_resolved:
+        with _fx_provider_lock:
+            if not _fx_provider_resolved:
+                if FX_RECORDED_RATES:
+                    try:
+                        _fx_provider = RecordedFxProvider(FX_RECORDED_RATES)
+                    except Exception as e:
+                        logger.error(f"Can't load recorded FX rates from {FX_RECORDED_RATES}: {e}")
+                        _fx_provider = UnavailableFxProvider(f"recorded FX rates unreadable: {e}")
+                _fx_provider_resolved = True
+    if _fx_provider is not None:
+        return _fx_provider
+    return FrankfurterProvider(FX_API_BASE_URL, get=_fx_http_get)
+
+
+def _fx_http_get(url: str, timeout: float) -> requests.Response:
+    """GET through the shared session, honoring the per-host rate limit."""
+
+    _fx_rate_limiter.wait(url)
+    return get_fx_session().get(url, timeout=timeout)
+
+
+class _HostRateLimiter:
+    """Per-host token bucket: FX_REQUEST_BURST tokens, refilled at FX_MAX_REQUESTS_PER_SECOND.
+
+    A request takes a token, or reserves the next one and sleeps until it's due,
+    so waiting threads are released in order and never exceed the sustained rate.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}  # host -> (tokens, monotonic time)
+
+    def wait(self, url: str) -> None:
+        per_second = FX_MAX_REQUESTS_PER_SECOND
+        if not per_second or per_second <= 0:
+            return
+        burst = max(1.0, float(FX_REQUEST_BURST))
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            tokens, at = self._buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - at) * per_second) - 1.0
+            self._buckets[host] = (tokens, now)
+        if tokens < 0:
+            time.sleep(-tokens / per_second)
+
+
+_fx_rate_limiter = _HostRateLimiter()
+
+
+class FxCircuitOpenError(RuntimeError):
+    """Raised instead of calling the FX API while the circuit breaker is open."""
+
+
+@dataclass(frozen=True)
+class FxBreakerState:
+    state: str  # "closed" | "open" | "half_open"
+    consecutive_failures: int
+    last_error: str | None = None
+    retry_in_seconds: float = 0.0
+
+
+class _CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by all FX API calls.
+
+    closed -> open after FX_BREAKER_FAILURE_THRESHOLD failures in a row; open
+    rejects calls until FX_BREAKER_RESET_SECONDS have passed, then half_open lets
+    a single probe through: success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._last_error: str | None = None
+
+    def allow(self) -> bool:
+        if FX_BREAKER_FAILURE_THRESHOLD <= 0:
+            return True
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= FX_BREAKER_RESET_SECONDS:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            self._probe_in_flight = False
+            threshold = FX_BREAKER_FAILURE_THRESHOLD
+            if self._state == "half_open" or (threshold > 0 and self._failures >= threshold):
+                if self._state != "open":
+                    logger.warning(f"FX API circuit breaker opened after {self._failures} failures: {error}")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+            self._last_error = None
+
+    def snapshot(self) -> FxBreakerState:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == "open":
+                retry_in = max(0.0, self._opened_at + FX_BREAKER_RESET_SECONDS - time.monotonic())
+            return FxBreakerState(self._state, self._failures, self._last_error, retry_in)
+
+
+_fx_breaker = _CircuitBreaker()
+
+
+def fx_breaker_state() -> FxBreakerState:
+    """Current FX API circuit breaker state (for display)."""
+
+    return _fx_breaker.snapshot()
+
+
+_T = TypeVar("_T")
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: object = None
+        self.error: BaseException | None = None
+
+
+class _SingleFlight:
+    """Coalesces concurrent calls with the same key: one runs, the others wait for
+    its result (or exception) instead of repeating the work."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[object, _Flight] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: object, fn: Callable[[], _T]) -> _T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result  # type: ignore[return-value]
+
+        try:
+            flight.result = fn()
+            return flight.result  # type: ignore[return-value]
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+_fx_flights = _SingleFlight()
+_fx_thread_locks: dict[Path, threading.Lock] = {}
+_fx_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _fx_file_lock(path: str | Path) -> Iterator[None]:
+    """Exclusive lock on `path` shared by this process's threads and other processes.
+
+    Uses flock (msvcrt.locking on Windows) on a lock file, so a second server process
+    waits for an in-progress download instead of repeating it.
+    """
+
+    p = Path(path)
+    with _fx_thread_locks_guard:
+        thread_lock = _fx_thread_locks.setdefault(p.resolve(), threading.Lock())
+    with thread_lock:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with open(p, "a+b") as f:
+            if os.name == "nt":
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK gives up after ~10s; keep waiting
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _fx_call(key: tuple[object, ...], fn: Callable[[], _T]) -> _T:
+    """Run a provider call behind request coalescing and the circuit breaker.
+
+    Concurrent calls with the same key (sessions missing on the same date or range
+    at once) share one provider call. FxProviderUnavailable (connection errors, 429,
+    5xx) and unexpected errors count as failures; any other answer, FxProviderError
+    and "no data" included, means the provider is up.
+    """
+
+    return _fx_flights.do(key, lambda: _fx_call_uncoalesced(fn))
+
+
+def _fx_call_uncoalesced(fn: Callable[[], _T]) -> _T:
+    if not _fx_breaker.allow():
+        raise FxCircuitOpenError("FX API circuit breaker is open")
+    try:
+        result = fn()
+    except FxProviderUnavailable as e:
+        _fx_breaker.record_failure(str(e))
+        raise
+    except FxProviderError:
+        _fx_breaker.record_success()
+        raise
+    except Exception as e:
+        _fx_breaker.record_failure(str(e))
+        raise
+    _fx_breaker.record_success()
+    return result
+
+
+class FxRateDiskCache(SqliteStore):
+    """Persistent (date, from, to) -> (rate, used_date) cache for per-date lookups.
+
+    A NULL rate is a negative entry: the API answered but has no rate for that
+    date/currency; it expires after FX_NO_DATA_TTL_SECONDS.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS fx_rates ("
+        "day TEXT NOT NULL, from_ccy TEXT NOT NULL, to_ccy TEXT NOT NULL, "
+        "rate REAL, used_date TEXT, fetched_at REAL NOT NULL, "
+        "PRIMARY KEY (from_ccy, to_ccy, day)) WITHOUT ROWID",
+    )
+
+    def get_many(
+        self, keys: Iterable[Tuple[str, str, str]]
+    ) -> dict[Tuple[str, str, str], Tuple[Optional[float], Optional[Date]]]:
+        """Look up (day, from_ccy, to_ccy) keys; negative entries come back as (None, None)."""
+
+        by_pair: dict[tuple[str, str], list[str]] = {}
+        for day, from_ccy, to_ccy in dict.fromkeys(keys):
+            by_pair.setdefault((from_ccy, to_ccy), []).append(day)
+        if not by_pair:
+            return {}
+
+        out: dict[Tuple[str, str, str], Tuple[Optional[float], Optional[Date]]] = {}
+        no_data_since = time.time() - FX_NO_DATA_TTL_SECONDS
+        try:
+            conn = self._connect()
+            try:
+                for (from_ccy, to_ccy), days in by_pair.items():
+                    for chunk in chunks(days):
+                        rows = conn.execute(
+                            "SELECT day, rate, used_date FROM fx_rates "
+                            f"WHERE from_ccy = ? AND to_ccy = ? AND day IN ({placeholders(len(chunk))}) "
+                            "AND (rate IS NOT NULL OR fetched_at >= ?)",
+                            [from_ccy, to_ccy, *chunk, no_data_since],
+                        )
+                        for day, rate, used in rows:
+                            used_date = Date.fromisoformat(used) if used else None
+                            out[(day, from_ccy, to_ccy)] = (rate, used_date) if rate is not None else (None, None)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"FX rate cache read failed ({self.path}): {e}")
+            return {}
+        return out
+
+    def put_many(self, items: dict[Tuple[str, str, str], Tuple[Optional[float], Optional[Date]]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO fx_rates (day, from_ccy, to_ccy, rate, used_date, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (day, f, t, rate, str(used) if used is not None else None, now)
+                        for (day, f, t), (rate, used) in items.items()
+                    ],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"FX rate cache write failed ({self.path}): {e}")
+
+
+def _fx_rate_disk_cache(data_dir: str | Path) -> FxRateDiskCache:
+    return FxRateDiskCache.for_path(Path(data_dir) / FX_RATE_DB_FILENAME)
+
+
+def _is_final_rate(day: Date, used_date: Optional[Date]) -> bool:
+    """Whether a looked-up rate can be persisted: an exact hit, or a day old enough that
+    a later-published rate for it can't appear (weekends/holidays near today can)."""
+
+    if used_date == day:
+        return True
+    return day < pd.Timestamp.today().date() - timedelta(days=4)
+
+
 def fx_rate_on_date(
     date: pd.Timestamp,
     from_ccy: str,
     to_ccy: str = FX_CACHE_TO_CCY,
     max_backtrack_days: int = 10,
-    _cache: Dict[Tuple[str, str, str], Tuple[Optional[float], Optional[pd.Timestamp]]] = {},
+    _cache: Optional[Dict[Tuple[str, str, str], Tuple[Optional[float], Optional[pd.Timestamp]]]] = None,
+    data_dir: str | Path | None = "data",
 ) -> Tuple[Optional[float], Optional[pd.Timestamp]]:
-    """Returns (rate, used_date) using frankfurter.app with weekend/holiday backtracking."""
+    """Returns (rate, used_date) using frankfurter.app with weekend/holiday backtracking.
+
+    Answers are memoized in memory and, unless data_dir is None, persisted in
+    FX_RATE_DB_FILENAME under data_dir, including negative answers (the API has
+    no rate for the date/currency), which end the lookup without backtracking.
+    Lookups whose requests failed return (None, None) again without network calls
+    for FX_FAILURE_TTL_SECONDS; while the circuit breaker is open no request is made.
+    """
+
+    if _cache is None:
+        _cache = _fx_rate_cache
+    disk = _fx_rate_disk_cache(data_dir) if data_dir is not None else None
 
     from_ccy = str(from_ccy).upper().strip()
     to_ccy = str(to_ccy).upper().strip()
@@ -68,37 +499,325 @@ def fx_rate_on_date(
         return None, None
 
     d = pd.Timestamp(date).date()
+    failed_key = (str(d), from_ccy, to_ccy)
+    retry_at = _fx_failed_lookups.get(failed_key)
+    if retry_at is not None:
+        if time.monotonic() < retry_at:
+            return None, None
+        _fx_failed_lookups.pop(failed_key, None)
+
+    provider = get_fx_provider()
     last_error: Optional[Exception] = None
     for _attempt in range(max_backtrack_days + 1):
         key = (str(d), from_ccy, to_ccy)
         if key in _cache:
             return _cache[key]
+        if disk is not None:
+            stored = disk.get_many([key]).get(key)
+            if stored is not None:
+                _cache[key] = stored
+                return stored
 
-        url = f"https://api.frankfurter.app/{d}?from={from_ccy}&to={to_ccy}"
         try:
-            r = get_fx_session().get(url, timeout=8)
-            if r.status_code == 200:
-                data = r.json()
-                rate = float(data["rates"][to_ccy])
-                api_date_str = data.get("date")
-                used_date = pd.to_datetime(api_date_str).date() if api_date_str else d
-                _cache[key] = (rate, used_date)
-                return rate, used_date
+            quote = _fx_call(
+                ("day", provider.key, str(d), from_ccy, to_ccy),
+                lambda: provider.fetch_on_date(d, from_ccy, to_ccy, timeout=8),
+            )
+            if quote is None:
+                # The API has no data for this currency/date; backtracking won't change that.
+                _cache[key] = (None, None)
+                if disk is not None:
+                    disk.put_many({key: (None, None)})
+                return None, None
+            _cache[key] = (quote.rate, quote.day)
+            if disk is not None and _is_final_rate(d, quote.day):
+                disk.put_many({key: (quote.rate, quote.day)})
+            return quote.rate, quote.day
+        except FxCircuitOpenError:
+            # API considered down: don't walk back through more dates. Rejections are
+            # free, so they aren't remembered as failures of this lookup.
+            break
         except Exception as e:
             last_error = e
 
         d = (pd.Timestamp(d) - pd.Timedelta(days=1)).date()
-        time.sleep(0.05)
 
     if last_error is not None:
-        logger.warning(
-            f"Failed to fetch FX rate for {from_ccy}->{to_ccy} starting at {pd.Timestamp(date).date()} "
-            f"after {max_backtrack_days+1} attempts. Last error: {last_error}"
-        )
+        _fx_failed_lookups[failed_key] = time.monotonic() + FX_FAILURE_TTL_SECONDS
+        if _fx_breaker.snapshot().state == "closed":
+            logger.warning(
+                f"Failed to fetch FX rate for {from_ccy}->{to_ccy} starting at {pd.Timestamp(date).date()} "
+                f"after {max_backtrack_days+1} attempts. Last error: {last_error}"
+            )
     return None, None
 
 
+def fx_rates_on_dates(
+    pairs: Iterable[Tuple[object, str]],
+    to_ccy: str = FX_CACHE_TO_CCY,
+    max_workers: int | None = None,
+    data_dir: str | Path | None = "data",
+    offline: bool = False,
+) -> dict[Tuple[Date, str], Optional[float]]:
+    """Resolve many (date, from_ccy) pairs via fx_rate_on_date on a bounded thread pool.
+
+    Returns {(date, FROM_CCY): rate or None}. Pairs already in the persistent cache
+    are answered with one bulk read; the rest share the pooled session and the
+    per-host rate limit. `max_workers` defaults to FX_FALLBACK_MAX_WORKERS. With
+    `offline`, only already-known answers are returned (None for the rest).
+    """
+
+    to_ccy = str(to_ccy).upper().strip()
+    unique: dict[Tuple[Date, str], pd.Timestamp] = {}
+    for day, ccy in pairs:
+        if pd.isna(day):
+            continue
+        ts = pd.Timestamp(day).normalize()
+        unique.setdefault((ts.date(), str(ccy).upper().strip()), ts)
+    if not unique:
+        return {}
+
+    if data_dir is not None:
+        keys = [(str(day), ccy, to_ccy) for day, ccy in unique if ccy != to_ccy]
+        missing = [k for k in keys if k not in _fx_rate_cache]
+        _fx_rate_cache.update(_fx_rate_disk_cache(data_dir).get_many(missing))
+
+    if offline:
+        return {
+            (day, ccy): 1.0 if ccy == to_ccy else _fx_rate_cache.get((str(day), ccy, to_ccy), (None, None))[0]
+            for day, ccy in unique
+        }
+
+    def resolve(item: tuple[Tuple[Date, str], pd.Timestamp]) -> Optional[float]:
+        (_day, ccy), ts = item
+        rate, _used = fx_rate_on_date(ts, ccy, to_ccy, data_dir=data_dir)
+        return rate
+
+    workers = max(1, min(max_workers or FX_FALLBACK_MAX_WORKERS, len(unique)))
+    items = list(unique.items())
+    if workers == 1:
+        return {key: resolve((key, ts)) for key, ts in items}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fx-fallback") as pool:
+        return dict(zip(unique, pool.map(resolve, items)))
+
+
+def fx_rates_for_range(
+    dates: pd.Series,
+    from_ccy: str,
+    to_ccy: str = FX_CACHE_TO_CCY,
+    data_dir: str | Path = "data",
+    persist: bool = False,
+    max_backtrack_days: int = 10,
+    max_staleness_days: int = FX_MAX_STALENESS_DAYS,
+) -> np.ndarray | None:
+    """Rates for many dates of one currency from a single range request.
+
+    Fetches [min(dates) - max_backtrack_days, max(dates)] once and looks the dates
+    up as-of, so weekends/holidays get the previous published rate like
+    fx_rate_on_date's backtracking. With `persist`, the series is kept as an
+    on-demand cache file (same format as the USD/EUR/GBP ones) that is only
+    extended when later dates fall outside it. Returns None if the range fetch
+    fails, so the caller can fall back to per-date lookups.
+    """
+
+    from_ccy = str(from_ccy).upper().strip()
+    to_ccy = str(to_ccy).upper().strip()
+    days = pd.to_datetime(pd.Series(dates), errors="coerce").dt.normalize()
+    if days.notna().sum() == 0:
+        return np.full(len(days), np.nan)
+
+    start = (days.min() - pd.Timedelta(days=max_backtrack_days)).date()
+    end = days.max().date()
+
+    try:
+        if not persist:
+            fetched = _fetch_fx_timeseries(from_ccy, to_ccy, start, end)
+            if fetched.empty:
+                return None
+            return fx_store.from_series(_daily_series(fetched, start, end)).rates_asof(days, max_staleness_days)
+
+        rates = load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+        if not _fx_rates_cover(rates, start, end):
+            # Callers needing the same file wait here, then find it already extended.
+            path = _fx_cache_path(data_dir, from_ccy, to_ccy)
+            with _fx_file_lock(path.with_name(path.name + ".lock")):
+                rates = _extend_fx_range_file(from_ccy, to_ccy, data_dir, start, end)
+            if rates is None:
+                return None
+        return rates.rates_asof(days, max_staleness_days)
+    except Exception as e:
+        logger.warning(f"Range FX fetch for {from_ccy}->{to_ccy} {start}..{end} failed, using per-date lookups: {e}")
+        return None
+
+
+def _fx_rates_cover(rates: fx_store.RateArray, start: Date, end: Date) -> bool:
+    covered = rates.covered_dates()
+    return covered is not None and covered[0].date() <= start and end <= covered[1].date()
+
+
+def _extend_fx_range_file(
+    from_ccy: str,
+    to_ccy: str,
+    data_dir: str | Path,
+    start: Date,
+    end: Date,
+) -> fx_store.RateArray | None:
+    """Fetch what an on-demand cache file lacks for [start, end] and store it (caller holds its lock).
+
+    Later days are appended after the last publication; earlier ones (or a whole
+    FXR1 file, whose filled days can't be told apart from published ones) mean a
+    rewrite.
+    """
+
+    rates = load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+    if _fx_rates_cover(rates, start, end):
+        return rates
+    covered = rates.covered_dates()
+
+    if covered is None or rates.filled:
+        if covered is not None:
+            start, end = min(start, covered[0].date()), max(end, covered[1].date())
+        fetched = _fetch_fx_timeseries(from_ccy, to_ccy, start, end)
+        if fetched.empty:
+            return None
+        _write_fx_cache_file(data_dir, from_ccy, to_ccy, _daily_series(fetched, start, end))
+    elif start < covered[0].date():
+        last = max(end, covered[1].date())
+        fetch_end = end if end > covered[1].date() else covered[0].date() - timedelta(days=1)
+        fetched = _fetch_fx_timeseries(from_ccy, to_ccy, start, fetch_end)
+        combined = pd.concat([fetched, rates.to_series()]).sort_index()
+        combined = combined[~combined.index.duplicated(keep="last")]
+        _write_fx_cache_file(data_dir, from_ccy, to_ccy, _daily_series(combined, start, last))
+    else:
+        append_start = _fx_append_start(rates, end)
+        fetched = _fetch_fx_timeseries(from_ccy, to_ccy, append_start, end)
+        _write_fx_cache_file(data_dir, from_ccy, to_ccy, _daily_series(fetched, append_start, end), append=True)
+    return load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+
+
+def _fx_append_start(rates: fx_store.RateArray, end: Date) -> Date:
+    """First day a refresh through `end` must fetch: the day after the last
+    publication (later days in the file were fetched before anything was published)."""
+
+    published = rates.published_dates()
+    if published is None:
+        return rates.covered_dates()[0].date()  # type: ignore[index]
+    return min(published[1].date() + timedelta(days=1), end)
+
+
+@dataclass(frozen=True)
+class _FxEntry:
+    """Immutable in-memory view of one cache file.
+
+    Entries live in the `_fx_snapshot` dict, which is never mutated: a new entry is
+    published by swapping in a copied dict, so readers just read the current
+    reference without locking. `version` (mtime_ns, inode, size) of the mapped file
+    tells when another writer/process replaced or appended to it.
+    """
+
+    key: tuple[str, str, str]
+    version: tuple[int, int, int]
+    rates: fx_store.RateArray
+    series: pd.Series | None = None  # rates.to_series(), built on first use
+
+
+_FX_MISSING = _FxEntry(("", "", ""), (0, 0, 0), fx_store.RateArray(0, np.empty(0)), pd.Series(dtype="float"))
+_fx_snapshot: dict[tuple[str, str, str], _FxEntry] = {}
+_fx_publish_lock = threading.Lock()  # serializes snapshot swaps only, never held during I/O
+_fx_pair_locks: dict[Path, threading.Lock] = {}
+
+
+def _publish_fx_entry(key: tuple[str, str, str], entry: _FxEntry | None) -> _FxEntry:
+    """Swap in a snapshot with `entry` for key (None drops it); returns the entry in effect.
+
+    An entry for an older file version never replaces a newer one, and a parsed
+    series isn't dropped for the same version.
+    """
+
+    global _fx_snapshot
+    with _fx_publish_lock:
+        current = _fx_snapshot.get(key)
+        if entry is not None and current is not None:
+            if current.version > entry.version or (current.version == entry.version and current.series is not None):
+                return current
+        snapshot = dict(_fx_snapshot)
+        if entry is None:
+            snapshot.pop(key, None)
+        else:
+            snapshot[key] = entry
+        _fx_snapshot = snapshot
+    return entry if entry is not None else _FX_MISSING
+
+
+def _fx_entry(from_ccy: str, data_dir: str | Path, to_ccy: str) -> _FxEntry:
+    key = (str(Path(data_dir)), from_ccy, to_ccy)
+    path = _fx_cache_path(data_dir, from_ccy, to_ccy)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return _FX_MISSING
+    entry = _fx_snapshot.get(key)
+    if entry is not None:
+        if entry.version == _fx_file_version(st):
+            return entry
+        pair_lock = _fx_pair_locks.get(path)
+        if pair_lock is not None and pair_lock.locked():
+            # A writer in this process is about to publish the new version, series
+            # included; keep serving the current one rather than duplicating its work.
+            return entry
+    try:
+        rates, st = fx_store.open_store_stat(path)
+    except FileNotFoundError:
+        return _FX_MISSING
+    return _publish_fx_entry(key, _FxEntry(key, _fx_file_version(st), rates))
+
+
+def _fx_file_version(st: os.stat_result) -> tuple[int, int, int]:
+    return st.st_mtime_ns, st.st_ino, st.st_size
+
+
+def _write_fx_cache_file(
+    data_dir: str | Path, from_ccy: str, to_ccy: str, series: pd.Series, append: bool = False
+) -> None:
+    """Atomically replace a pair's cache file (or, with `append`, write `series`
+    into it in place from its first day on) and publish it to readers.
+
+    Only writers of the same pair wait for each other (cross-process exclusion is
+    up to the callers' file locks); readers keep using the previous snapshot
+    until the swap, and find the new one ready.
+    """
+
+    from_ccy, to_ccy = from_ccy.upper(), to_ccy.upper()
+    path = _fx_cache_path(data_dir, from_ccy, to_ccy)
+    with _fx_publish_lock:
+        pair_lock = _fx_pair_locks.setdefault(path, threading.Lock())
+    with pair_lock:
+        if append:
+            try:
+                fx_store.append_store(path, series)
+            except fx_store.PublishedRateConflict as e:
+                # A revised publication: mapped readers must keep seeing the old file.
+                logger.warning(f"{e}; rewriting it")
+                current = fx_store.open_store(path)
+                first, last = current.covered_dates()  # type: ignore[misc]
+                combined = series.dropna().combine_first(current.to_series())
+                fx_store.write_store(path, _daily_series(combined, first.date(), max(last, series.index.max()).date()))
+        else:
+            fx_store.write_store(path, series)
+        rates, st = fx_store.open_store_stat(path)
+        key = (str(Path(data_dir)), from_ccy, to_ccy)
+        # The series is built here once, not by every reader that sees the new version.
+        _publish_fx_entry(key, _FxEntry(key, _fx_file_version(st), rates, rates.to_series()))
+
+
 def _fx_cache_path(data_dir: str | Path, from_ccy: str, to_ccy: str = FX_CACHE_TO_CCY) -> Path:
+    base = Path(data_dir)
+    return base / f"fx_{from_ccy.upper()}_{to_ccy.upper()}{fx_store.STORE_SUFFIX}"
+
+
+def _fx_cache_csv_path(data_dir: str | Path, from_ccy: str, to_ccy: str = FX_CACHE_TO_CCY) -> Path:
+    """CSV form of a cache file: the pre-binary format, and the export format for inspection."""
+
     base = Path(data_dir)
     return base / f"fx_{from_ccy.upper()}_{to_ccy.upper()}.csv"
 
@@ -128,48 +847,88 @@ def _write_fx_cache_csv(path: Path, series: pd.Series) -> None:
     tmp.replace(path)
 
 
-def _fetch_fx_timeseries(from_ccy: str, to_ccy: str, start: Date, end: Date) -> pd.Series:
-    from_ccy = str(from_ccy).upper().strip()
+@dataclass
+class FxFetchStats:
+    """Counters a refresh fills in: HTTP requests, response bytes, time spent fetching."""
+
+    requests: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    updated: tuple[str, ...] = ()
+
+
+def _fetch_fx_timeseries_multi(
+    from_ccys: Iterable[str],
+    to_ccy: str,
+    start: Date,
+    end: Date,
+    provider: FxProvider | None = None,
+    stats: FxFetchStats | None = None,
+) -> dict[str, pd.Series]:
+    """Fetch X->to_ccy series for every X in one range request (to get_fx_provider()
+    unless `provider` is given).
+
+    The request is quoted in FX_FETCH_BASE_CCY with all needed symbols; each
+    series is the cross rate per_base[to_ccy] / per_base[X].
+    """
+
+    from_ccys = [c for c in dict.fromkeys(str(c).upper().strip() for c in from_ccys) if c]
     to_ccy = str(to_ccy).upper().strip()
+    base = FX_FETCH_BASE_CCY
+    symbols = sorted({*from_ccys, to_ccy} - {base})
+    source = provider or get_fx_provider()
     start_s = pd.Timestamp(start).strftime("%Y-%m-%d")
     end_s = pd.Timestamp(end).strftime("%Y-%m-%d")
-    url = f"https://api.frankfurter.app/{start_s}..{end_s}?from={from_ccy}&to={to_ccy}"
-
-    r = get_fx_session().get(url, timeout=12)
-    r.raise_for_status()
-    data = r.json()
-    rates = data.get("rates", {})
 
-    rows: list[tuple[pd.Timestamp, float]] = []
-    for day_str, obj in rates.items():
-        try:
-            v = obj.get(to_ccy)
-            if v is None:
-                continue
-            rows.append((pd.to_datetime(day_str).normalize(), float(v)))
-        except Exception:
+    t0 = time.perf_counter()
+    quote = _fx_call(
+        ("range", source.key, base, tuple(symbols), start_s, end_s),
+        lambda: source.fetch_range(base, symbols, start, end, timeout=12),
+    )
+    if stats is not None:
+        stats.requests += 1
+        stats.bytes += quote.size_bytes
+        stats.seconds += time.perf_counter() - t0
+    rates = quote.rates
+
+    per_base = pd.DataFrame.from_dict(rates, orient="index") if rates else pd.DataFrame()
+    if per_base.empty:
+        return {c: pd.Series(dtype="float") for c in from_ccys}
+
+    per_base.index = pd.to_datetime(per_base.index, errors="coerce").normalize()
+    per_base = per_base[per_base.index.notna()].apply(pd.to_numeric, errors="coerce").sort_index()
+    per_base = per_base[~per_base.index.duplicated(keep="last")]
+    per_base[base] = 1.0
+
+    out: dict[str, pd.Series] = {}
+    for c in from_ccys:
+        if c not in per_base.columns or to_ccy not in per_base.columns:
+            out[c] = pd.Series(dtype="float")
             continue
+        s = (per_base[to_ccy] / per_base[c]).dropna()
+        s.name = None
+        out[c] = s
+    return out
 
-    if not rows:
-        return pd.Series(dtype="float")
 
-    idx = [d for d, _ in rows]
-    vals = [v for _, v in rows]
-    s = pd.Series(vals, index=pd.DatetimeIndex(idx)).sort_index()
-    s = s[~s.index.duplicated(keep="last")]
-    return s
+def _fetch_fx_timeseries(from_ccy: str, to_ccy: str, start: Date, end: Date) -> pd.Series:
+    from_ccy = str(from_ccy).upper().strip()
+    return _fetch_fx_timeseries_multi([from_ccy], to_ccy, start, end)[from_ccy]
+
 
+def _daily_series(series: pd.Series, start: Date, end: Date) -> pd.Series:
+    """`series` on every day of [start, end], NaN where nothing was published.
 
-def _daily_filled_series(series: pd.Series, start: Date, end: Date) -> pd.Series:
-    if series.empty:
-        return series
+    Nothing is filled: the span records which days were fetched, and lookups pick
+    the latest publication as-of each date (see fx_store.RateArray.rates_asof).
+    """
 
     full_idx = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq="D")
     s = series.copy()
     s.index = pd.to_datetime(s.index, errors="coerce").normalize()
     s = s[s.index.notna()].sort_index()
-    s = s.reindex(full_idx)
-    return s.bfill().ffill()
+    s = s[~s.index.duplicated(keep="last")]
+    return s.reindex(full_idx).astype("float64")
 
 
 def ensure_fx_cache_files(
@@ -180,13 +939,31 @@ def ensure_fx_cache_files(
     max_wait_seconds: int = 180,
     retry_sleep_seconds: float = 5.0,
 ) -> None:
-    """Ensure local FX cache CSVs exist (first run blocks until downloaded).
+    """Ensure local FX cache files exist (first run blocks until downloaded).
 
     If the FX API is slow/down, this will keep retrying for up to max_wait_seconds
-    before raising.
+    before raising. Downloads hold FX_CACHE_LOCK_FILENAME, so concurrent sessions or
+    server processes wait for one download instead of each fetching the files.
     """
 
+    wanted = [c for c in (str(c).upper().strip() for c in currencies) if c]
+    if all(_fx_cache_path(data_dir, c, to_ccy).exists() for c in wanted):
+        return
+
+    with _fx_file_lock(Path(data_dir) / FX_CACHE_LOCK_FILENAME):
+        _ensure_fx_cache_files_locked(data_dir, wanted, start_date, to_ccy, max_wait_seconds, retry_sleep_seconds)
+
+
+def _ensure_fx_cache_files_locked(
+    data_dir: str | Path,
+    currencies: list[str],
+    start_date: Date,
+    to_ccy: str,
+    max_wait_seconds: int,
+    retry_sleep_seconds: float,
+) -> None:
     today = pd.Timestamp.today().date()
+    missing: list[str] = []
     for from_ccy in currencies:
         from_ccy = str(from_ccy).upper().strip()
         if not from_ccy:
@@ -196,66 +973,248 @@ def ensure_fx_cache_files(
         if path.exists():
             continue
 
-        deadline = time.monotonic() + max_wait_seconds
-        last_error: Exception | None = None
-        while True:
+        legacy_csv = _fx_cache_csv_path(data_dir, from_ccy, to_ccy)
+        if legacy_csv.exists():
             try:
-                fetched = _fetch_fx_timeseries(from_ccy, to_ccy, start_date, today)
-                filled = _daily_filled_series(fetched, start_date, today)
-                _write_fx_cache_csv(path, filled)
-                break
+                # Old cache CSVs are calendar-day filled; the updater replaces them.
+                fx_store.import_csv(legacy_csv, path, filled=True)
+                continue
             except Exception as e:
-                last_error = e
-                if time.monotonic() >= deadline:
-                    raise RuntimeError(
-                        f"Failed to initialize FX cache for {from_ccy}->{to_ccy} after waiting {max_wait_seconds}s: {e}"
-                    )
-                time.sleep(retry_sleep_seconds)
+                logger.warning(f"Failed to import {legacy_csv}, downloading instead: {e}")
+
+        missing.append(from_ccy)
+
+    if not missing:
+        return
+
+    # One request covers every missing currency (cross rates off FX_FETCH_BASE_CCY).
+    deadline = time.monotonic() + max_wait_seconds
+    while True:
+        try:
+            fetched = _fetch_fx_timeseries_multi(missing, to_ccy, start_date, today)
+            break
+        except Exception as e:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(
+                    f"Failed to initialize FX cache for {','.join(missing)}->{to_ccy} after waiting {max_wait_seconds}s: {e}"
+                )
+            time.sleep(retry_sleep_seconds)
+
+    for from_ccy in missing:
+        _write_fx_cache_file(data_dir, from_ccy, to_ccy, _daily_series(fetched[from_ccy], start_date, today))
+    _record_fx_refresh(data_dir, missing, to_ccy, time.time())
+
 
+def _fx_refresh_key(from_ccy: str, to_ccy: str) -> str:
+    return f"{from_ccy.upper()}_{to_ccy.upper()}"
 
-def _update_one_fx_cache_file(
+
+def _read_fx_refresh_state(data_dir: str | Path) -> dict[str, float]:
+    data = read_json(Path(data_dir) / FX_REFRESH_STATE_FILENAME, "FX refresh state")
+    return {str(k): float(v) for k, v in data.items()}
+
+
+def _record_fx_refresh(data_dir: str | Path, currencies: Iterable[str], to_ccy: str, when: float) -> None:
+    p = Path(data_dir) / FX_REFRESH_STATE_FILENAME
+    with _fx_file_lock(p.with_name(p.name + ".lock")):
+        state = _read_fx_refresh_state(data_dir)
+        state.update({_fx_refresh_key(c, to_ccy): when for c in currencies})
+        write_json(p, state)
+
+
+def _last_fx_publication(now: float) -> float:
+    """Epoch seconds of the latest FX_PUBLICATION_TIME_UTC at or before `now`."""
+
+    current = datetime.fromtimestamp(now, tz=timezone.utc)
+    published = datetime.combine(current.date(), FX_PUBLICATION_TIME_UTC, tzinfo=timezone.utc)
+    if published > current:
+        published -= timedelta(days=1)
+    return published.timestamp()
+
+
+def next_fx_refresh_at(now: float, interval_seconds: float = FX_REFRESH_INTERVAL_SECONDS) -> float:
+    """When a periodic refresh should next run: after `interval_seconds`, or right
+    after the next publication if that comes first."""
+
+    return min(now + interval_seconds, _last_fx_publication(now) + 86400.0 + 60.0)
+
+
+def _update_fx_cache_files(
     data_dir: str | Path,
-    from_ccy: str,
+    currencies: Iterable[str],
     start_date: Date,
     to_ccy: str,
+    stats: FxFetchStats | None = None,
+    lock_path: str | Path | None = None,
 ) -> bool:
-    path = _fx_cache_path(data_dir, from_ccy, to_ccy)
-    if not path.exists():
-        return False
+    """Bring existing cache files up to today with a single range request; True if any changed.
+
+    Each file gets the days after its last publication appended; FXR1 (filled)
+    files are refetched over their whole span and rewritten. Files covering today
+    and refreshed since the last rate publication are skipped. Runs under
+    `lock_path` (default FX_CACHE_LOCK_FILENAME): an updater that waited for another
+    one finds the files current and doesn't fetch again. `stats` receives request
+    counters and the currencies that were fetched.
+    """
 
+    with _fx_file_lock(lock_path or Path(data_dir) / FX_CACHE_LOCK_FILENAME):
+        return _update_fx_cache_files_locked(data_dir, currencies, start_date, to_ccy, stats)
+
+
+def _update_fx_cache_files_locked(
+    data_dir: str | Path,
+    currencies: Iterable[str],
+    start_date: Date,
+    to_ccy: str,
+    stats: FxFetchStats | None = None,
+) -> bool:
     today = pd.Timestamp.today().date()
+    last_published = _last_fx_publication(time.time())
+    refreshed = _read_fx_refresh_state(data_dir)
+    stale: dict[str, tuple[bool, Date]] = {}  # currency -> (append, first day to fetch)
+    for from_ccy in currencies:
+        from_ccy = str(from_ccy).upper().strip()
+        path = _fx_cache_path(data_dir, from_ccy, to_ccy)
+        if not from_ccy or not path.exists():
+            continue
 
-    with _fx_cache_lock:
-        existing = _read_fx_cache_csv(path)
+        rates = load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+        covered = rates.covered_dates()
 
-    if existing.empty:
-        fetched = _fetch_fx_timeseries(from_ccy, to_ccy, start_date, today)
-        filled = _daily_filled_series(fetched, start_date, today)
-        with _fx_cache_lock:
-            _write_fx_cache_csv(path, filled)
-        return True
+        if covered is None or rates.filled:
+            # Keep history a backfill added before start_date.
+            stale[from_ccy] = (False, min(start_date, covered[0].date()) if covered is not None else start_date)
+            continue
 
-    last = pd.Timestamp(existing.index.max()).date()
-    if last >= today:
+        if covered[1].date() >= today and refreshed.get(_fx_refresh_key(from_ccy, to_ccy), 0.0) >= last_published:
+            continue
+        stale[from_ccy] = (True, _fx_append_start(rates, today))
+
+    if not stale:
         return False
 
-    fetch_start = max(start_date, last - timedelta(days=2))
-    fetched = _fetch_fx_timeseries(from_ccy, to_ccy, fetch_start, today)
+    fetch_start = min(s for _append, s in stale.values())
+    fetched_at = time.time()
+    fetched = _fetch_fx_timeseries_multi(list(stale), to_ccy, fetch_start, today, stats=stats)
+
+    for from_ccy, (append, first) in stale.items():
+        series = _daily_series(fetched[from_ccy], first, today)
+        _write_fx_cache_file(data_dir, from_ccy, to_ccy, series, append=append)
+    _record_fx_refresh(data_dir, stale, to_ccy, fetched_at)
+    if stats is not None:
+        stats.updated = tuple(stale)
+    return True
 
-    combined = pd.concat([existing, fetched]).sort_index()
-    combined = combined[~combined.index.duplicated(keep="last")]
-    filled = _daily_filled_series(combined, start_date, today)
 
-    with _fx_cache_lock:
-        _write_fx_cache_csv(path, filled)
+def backfill_fx_cache_files(
+    earliest: dict[str, Date],
+    data_dir: str | Path = "data",
+    to_ccy: str = FX_CACHE_TO_CCY,
+    max_backtrack_days: int = 10,
+) -> bool:
+    """Extend cache files back in time so each currency covers its `earliest` date.
+
+    A file covers a date when it has a publication at or before it, or already
+    spans max_backtrack_days before it (nothing was published then). The others
+    are extended with one range request for all of them, from max_backtrack_days
+    before the earliest date (so that day gets a previously published rate, not a
+    later one) up to their old start; FXR1 (filled) files are refetched whole.
+    Returns True if any file changed; failures are logged.
+    """
 
-    key = (str(Path(data_dir)), from_ccy.upper(), to_ccy.upper())
-    _fx_series_cache.pop(key, None)
-    return True
+    to_ccy = str(to_ccy).upper().strip()
+    earliest = {str(c).upper().strip(): pd.Timestamp(d).date() for c, d in earliest.items() if not pd.isna(d)}
+
+    def uncovered() -> dict[str, fx_store.RateArray]:
+        out: dict[str, fx_store.RateArray] = {}
+        for from_ccy, day in earliest.items():
+            rates = load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+            covered = rates.covered_dates()
+            if covered is None:
+                continue
+            published = rates.published_dates()
+            before_first = published is None or day < published[0].date()
+            if before_first and day - timedelta(days=max_backtrack_days) < covered[0].date():
+                out[from_ccy] = rates
+        return out
+
+    if not uncovered():
+        return False
+
+    try:
+        with _fx_file_lock(Path(data_dir) / FX_CACHE_LOCK_FILENAME):
+            need = uncovered()  # another session/process may have backfilled meanwhile
+            if not need:
+                return False
+
+            start = min(earliest[c] for c in need) - timedelta(days=max_backtrack_days)
+            spans = {c: rates.covered_dates() for c, rates in need.items()}
+            fetch_end = max(
+                span[1].date() if need[c].filled else span[0].date() - timedelta(days=1)  # type: ignore[index]
+                for c, span in spans.items()
+            )
+            fetched = _fetch_fx_timeseries_multi(list(need), to_ccy, start, max(start, fetch_end))
+
+            changed = False
+            for from_ccy, rates in need.items():
+                first, last = spans[from_ccy]  # type: ignore[misc]
+                new = fetched[from_ccy]
+                if new.empty:
+                    logger.warning(f"FX backfill for {from_ccy}->{to_ccy} from {start} returned no rates")
+                    if rates.filled:
+                        continue
+                    # Otherwise the span still grows, so the same dates aren't fetched again.
+                if not rates.filled:
+                    new = pd.concat([new[new.index < first], rates.to_series()]).sort_index()
+                _write_fx_cache_file(data_dir, from_ccy, to_ccy, _daily_series(new, start, last.date()))
+                changed = True
+            return changed
+    except Exception as e:
+        logger.warning(f"FX backfill for {','.join(sorted(earliest))}->{to_ccy} failed: {e}")
+        return False
+
+
+def fx_cache_ready(
+    data_dir: str | Path = "data",
+    currencies: Iterable[str] = FX_CACHE_CURRENCIES,
+    to_ccy: str = FX_CACHE_TO_CCY,
+) -> bool:
+    """Whether every local FX cache file exists (no download needed)."""
+
+    return all(_fx_cache_path(data_dir, c, to_ccy).exists() for c in currencies if str(c).strip())
+
+
+@dataclass(frozen=True)
+class FxPairStatus:
+    """Refresh progress of one cache file, as reported by FxCacheBackgroundUpdater."""
+
+    from_ccy: str
+    to_ccy: str
+    state: str = "pending"  # pending | running | fresh | updated | failed
+    last_success: float | None = None  # epoch seconds of the last successful check
+    latency_seconds: float | None = None  # duration of the last fetch
+    bytes_transferred: int = 0  # response bytes, all runs
+    error: str | None = None
 
 
 class FxCacheBackgroundUpdater:
-    """Background updater that refreshes FX cache files to today's date."""
+    """Background updater that refreshes FX cache files to today's date.
+
+    With `initialize`, missing cache files are downloaded first (ensure_fx_cache_files)
+    on the same thread, so callers never block on the first download; `initialized`
+    is set once that step has finished, successfully or not.
+
+    Each run refreshes the configured currencies (one multi-symbol request) and,
+    with `include_on_demand`, every on-demand pair file in data_dir (see
+    fx_rates_for_range) in parallel; files refreshed since the last publication are
+    skipped. With `interval_seconds`, runs repeat on the next_fx_refresh_at schedule
+    until stop(). `done` is set after the first run; `generation` increases whenever
+    a run changed files; status() reports per-pair progress.
+
+    Between scheduled runs, the updater also fetches rates that readers queued with
+    request(), so callers that only convert from files on disk never touch the
+    network or wait on a cache lock themselves.
+    """
 
     def __init__(
         self,
@@ -263,63 +1222,269 @@ class FxCacheBackgroundUpdater:
         currencies: Iterable[str] = FX_CACHE_CURRENCIES,
         start_date: Date = FX_CACHE_START_DATE,
         to_ccy: str = FX_CACHE_TO_CCY,
+        initialize: bool = False,
+        interval_seconds: float | None = None,
+        include_on_demand: bool = True,
+        max_workers: int | None = None,
     ) -> None:
         self.data_dir = str(data_dir)
         self.currencies = tuple(str(c).upper().strip() for c in currencies)
         self.start_date = start_date
         self.to_ccy = str(to_ccy).upper().strip()
+        self.initialize = initialize
+        self.interval_seconds = interval_seconds
+        self.include_on_demand = include_on_demand
+        self.max_workers = max_workers
 
+        self.initialized = threading.Event()
         self.done = threading.Event()
         self.updated = False
         self.error: str | None = None
-
+        self.generation = 0
+        self.runs = 0
+        self.next_run_at: float | None = None
+
+        self._lock = threading.Lock()
+        self._status: dict[str, FxPairStatus] = {
+            c: FxPairStatus(c, self.to_ccy) for c in self.currencies if c and c != self.to_ccy
+        }
+        self._requested: set[tuple[str, Date]] = set()
+        self._pending: dict[str, set[Date]] = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
         self._thread = threading.Thread(target=self._run, daemon=True)
 
     def start(self) -> "FxCacheBackgroundUpdater":
         self._thread.start()
         return self
 
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def request(self, missing: dict[str, Iterable[Date]]) -> None:
+        """Queue rates a reader lacked (currency -> dates, see processing.missing_fx_rates).
+
+        Configured currencies are backfilled, others get an on-demand range file.
+        Each (currency, date) is fetched at most once per scheduled run, so rates
+        that don't exist aren't requested on every render. Only served while runs
+        repeat (`interval_seconds`).
+        """
+
+        with self._lock:
+            for from_ccy, days in missing.items():
+                from_ccy = str(from_ccy).upper().strip()
+                if not from_ccy or from_ccy == self.to_ccy:
+                    continue
+                new = {d for d in days if (from_ccy, d) not in self._requested}
+                if new:
+                    self._requested.update((from_ccy, d) for d in new)
+                    self._pending.setdefault(from_ccy, set()).update(new)
+            queued = bool(self._pending)
+        if queued:
+            self._wake.set()
+
+    def status(self) -> list[FxPairStatus]:
+        with self._lock:
+            return list(self._status.values())
+
+    def _set_status(self, from_ccy: str, **changes: object) -> None:
+        with self._lock:
+            current = self._status.get(from_ccy) or FxPairStatus(from_ccy, self.to_ccy)
+            self._status[from_ccy] = replace(current, **changes)  # type: ignore[arg-type]
+
     def _run(self) -> None:
         try:
-            any_updated = False
-            for c in self.currencies:
-                if not c:
-                    continue
-                try:
-                    any_updated |= _update_one_fx_cache_file(
-                        self.data_dir, c, self.start_date, self.to_ccy
-                    )
-                except Exception as e:
-                    self.error = str(e)
-            self.updated = any_updated
+            while not self._stop.is_set():
+                self._run_once()
+                self.done.set()
+                if self.interval_seconds is None:
+                    return
+                self.next_run_at = next_fx_refresh_at(time.time(), self.interval_seconds)
+                while not self._stop.is_set() and time.time() < self.next_run_at:
+                    self._wake.wait(max(0.0, self.next_run_at - time.time()))
+                    self._wake.clear()
+                    self._fetch_requested()
         finally:
+            self.initialized.set()
             self.done.set()
 
+    def _run_once(self) -> None:
+        with self._lock:
+            self._requested.clear()  # rates that weren't available get another chance
+        try:
+            if self.initialize and not fx_cache_ready(self.data_dir, self.currencies, self.to_ccy):
+                ensure_fx_cache_files(self.data_dir, self.currencies, self.start_date, self.to_ccy)
+                self.updated = True
+                with self._lock:
+                    self.generation += 1
+        except Exception as e:
+            self.error = str(e)
+            return
+        finally:
+            self.initialized.set()
+
+        # (currencies, start_date, lock file) per request; on-demand files have their own lock.
+        groups: list[tuple[tuple[str, ...], Date, Path | None]] = [(self.currencies, self.start_date, None)]
+        if self.include_on_demand:
+            configured = set(self.currencies)
+            for path in sorted(Path(self.data_dir).glob(f"fx_*_{self.to_ccy}{fx_store.STORE_SUFFIX}")):
+                from_ccy = path.name[len("fx_") : -len(f"_{self.to_ccy}{fx_store.STORE_SUFFIX}")]
+                covered = load_fx_rates(from_ccy, data_dir=self.data_dir, to_ccy=self.to_ccy).covered_dates()
+                if from_ccy in configured or covered is None:
+                    continue
+                groups.append(((from_ccy,), covered[0].date(), path.with_name(path.name + ".lock")))
+
+        workers = max(1, min(len(groups), self.max_workers or FX_FALLBACK_MAX_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fx-refresh") as pool:
+            results = list(pool.map(self._refresh_group, groups))
+
+        errors = [e for e in results if isinstance(e, str)]
+        self.error = "; ".join(errors) if errors else None
+        if any(r is True for r in results):
+            self.updated = True
+            with self._lock:
+                self.generation += 1
+        self.runs += 1
+
+    def _fetch_requested(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        errors: list[str] = []
+        changed = False
+        earliest = {c: min(days) for c, days in pending.items() if c in self.currencies}
+        if earliest:
+            try:
+                changed = backfill_fx_cache_files(earliest, data_dir=self.data_dir, to_ccy=self.to_ccy)
+            except Exception as e:
+                errors.append(f"backfill {','.join(sorted(earliest))}: {e}")
+        for from_ccy, days in sorted(pending.items()):
+            if from_ccy in earliest:
+                continue
+            found = fx_rates_for_range(
+                pd.Series(sorted(days)), from_ccy, self.to_ccy, data_dir=self.data_dir, persist=True
+            )
+            if found is None:
+                errors.append(f"{from_ccy}: range fetch failed")
+            else:
+                changed = True
+
+        self.error = "; ".join(errors) if errors else None
+        if changed:
+            self.updated = True
+            with self._lock:
+                self.generation += 1
+
+    def _refresh_group(self, group: tuple[tuple[str, ...], Date, Path | None]) -> bool | str:
+        """Refresh one request's worth of files; True if changed, an error message on failure."""
+
+        currencies, start_date, lock_path = group
+        for c in currencies:
+            self._set_status(c, state="running")
+        stats = FxFetchStats()
+        try:
+            changed = _update_fx_cache_files(
+                self.data_dir, currencies, start_date, self.to_ccy, stats=stats, lock_path=lock_path
+            )
+        except Exception as e:
+            for c in currencies:
+                self._set_status(c, state="failed", error=str(e))
+            return f"{','.join(currencies)}: {e}"
+
+        now = time.time()
+        for c in currencies:
+            with self._lock:
+                previous = self._status.get(c) or FxPairStatus(c, self.to_ccy)
+            self._set_status(
+                c,
+                state="updated" if c in stats.updated else "fresh",
+                last_success=now,
+                latency_seconds=stats.seconds if stats.requests else previous.latency_seconds,
+                # A shared multi-symbol response is split evenly between its currencies.
+                bytes_transferred=previous.bytes_transferred + stats.bytes // len(currencies),
+                error=None,
+            )
+        return changed
+
+
+def load_fx_rates(
+    from_ccy: str,
+    data_dir: str | Path = "data",
+    to_ccy: str = FX_CACHE_TO_CCY,
+) -> fx_store.RateArray:
+    """Memory-map a cached FX rate file, served from the in-memory snapshot while the
+    file is unchanged. Never waits for writers (see _FxEntry)."""
 
-def load_fx_cache_series(
+    return _fx_entry(str(from_ccy).upper().strip(), data_dir, str(to_ccy).upper().strip()).rates
+
+
+def rates_for(
+    dates: object,
     from_ccy: str,
     data_dir: str | Path = "data",
     to_ccy: str = FX_CACHE_TO_CCY,
-) -> pd.Series:
-    """Load a cached FX series from disk, with mtime-based in-memory caching."""
+    max_staleness_days: int = FX_MAX_STALENESS_DAYS,
+) -> np.ndarray:
+    """Vectorized cached rates (to_ccy per from_ccy) for each date, as-of the latest
+    publication at or before it; NaN where none is cached within max_staleness_days."""
 
-    from_ccy = str(from_ccy).upper().strip()
+    if str(from_ccy).upper().strip() == str(to_ccy).upper().strip():
+        return np.where(fx_store.day_numbers(dates) == fx_store.NAT_DAY, np.nan, 1.0)
+    return load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy).rates_asof(dates, max_staleness_days)
+
+
+def rates_for_pairs(
+    dates: object,
+    currencies: object,
+    data_dir: str | Path = "data",
+    to_ccy: str = FX_CACHE_TO_CCY,
+    max_staleness_days: int = FX_MAX_STALENESS_DAYS,
+) -> np.ndarray:
+    """Vectorized cached rates for aligned dates and currencies (as-of, like rates_for);
+    NaN where not cached.
+
+    Each distinct currency's file is opened once and looked up for all of its
+    dates, so the cost doesn't grow with per-row Python work.
+    """
+
+    days = fx_store.day_numbers(dates)
+    ccys = pd.Series(np.asarray(currencies, dtype=object)).fillna("").astype(str).str.upper().str.strip()
+    if len(ccys) != len(days):
+        raise ValueError(f"dates and currencies differ in length ({len(days)} vs {len(ccys)})")
     to_ccy = str(to_ccy).upper().strip()
-    path = _fx_cache_path(data_dir, from_ccy, to_ccy)
-    if not path.exists():
-        return pd.Series(dtype="float")
 
-    mtime = path.stat().st_mtime
-    key = (str(Path(data_dir)), from_ccy, to_ccy)
-    cached = _fx_series_cache.get(key)
-    if cached is not None and cached[0] == mtime:
-        return cached[1]
+    out = np.full(len(days), np.nan)
+    codes, uniques = pd.factorize(ccys)
+    for i, from_ccy in enumerate(uniques):
+        idx = np.flatnonzero(codes == i)
+        if not from_ccy:
+            continue
+        if from_ccy == to_ccy:
+            out[idx] = np.where(days[idx] == fx_store.NAT_DAY, np.nan, 1.0)
+            continue
+        rates = load_fx_rates(from_ccy, data_dir=data_dir, to_ccy=to_ccy)
+        out[idx] = rates.rates_asof_days(days[idx], max_staleness_days)
+    return out
 
-    with _fx_cache_lock:
-        s = _read_fx_cache_csv(path)
 
-    _fx_series_cache[key] = (mtime, s)
-    return s
+def load_fx_cache_series(
+    from_ccy: str,
+    data_dir: str | Path = "data",
+    to_ccy: str = FX_CACHE_TO_CCY,
+) -> pd.Series:
+    """Load a cached FX series from disk, with mtime-based in-memory caching."""
+
+    entry = _fx_entry(str(from_ccy).upper().strip(), data_dir, str(to_ccy).upper().strip())
+    if entry.series is not None:
+        return entry.series
+    # Built from the array we hold: the entry published meanwhile may be a newer
+    # version whose series isn't built yet.
+    series = entry.rates.to_series()
+    _publish_fx_entry(entry.key, replace(entry, series=series))
+    return series
 
 
 def fx_cache_version(
@@ -327,18 +1492,24 @@ def fx_cache_version(
     currencies: Iterable[str] = FX_CACHE_CURRENCIES,
     to_ccy: str = FX_CACHE_TO_CCY,
 ) -> float:
-    """Return a single float that changes whenever any FX cache file changes."""
+    """Return a single float that changes whenever any FX rate file changes.
+
+    Covers the files of `currencies` and every on-demand file for `to_ccy` in
+    data_dir (currencies fetched for a statement but not configured), including
+    files being added or removed.
+    """
 
     base = Path(data_dir)
-    mtimes: list[float] = []
-    for c in currencies:
-        c = str(c).upper().strip()
-        if not c:
+    to_ccy = str(to_ccy).upper().strip()
+    paths = {_fx_cache_path(base, c, to_ccy) for c in (str(c).upper().strip() for c in currencies) if c}
+    paths.update(base.glob(f"fx_*_{to_ccy}{fx_store.STORE_SUFFIX}"))
+    stamps: list[tuple[str, int, int]] = []
+    for p in sorted(paths):
+        try:
+            st = p.stat()
+        except OSError:
             continue
-        p = _fx_cache_path(base, c, to_ccy)
-        if p.exists():
-            try:
-                mtimes.append(p.stat().st_mtime)
-            except Exception:
-                continue
-    return max(mtimes) if mtimes else 0.0
+        stamps.append((p.name, st.st_mtime_ns, st.st_size))
+    if not stamps:
+        return 0.0
+    return float(zlib.crc32(repr(stamps).encode("utf-8")) + 1)
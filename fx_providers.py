@@ -0,0 +1,367 @@
+"""Sources of FX reference rates for fx_cache.
+
+fx_cache fetches through an FxProvider: a range fetch (many symbols and days in
+one call) and a single-date fetch (the latest publication at or before a day).
+Caching, request coalescing and the circuit breaker stay in fx_cache.
+
+- FrankfurterProvider: the Frankfurter HTTP API, or any mirror serving the same
+  endpoints (an internal rate mirror, FxStandInServer).
+- RecordedFxProvider: serves rates recorded earlier as Frankfurter range JSON
+  (see record_fx_rates); offline and deterministic.
+- SyntheticFxProvider: made-up but deterministic weekday rates, no files needed.
+- FxStandInServer: a local Frankfurter-shaped HTTP server over any provider, with
+  latency and error injection, to exercise the HTTP path without the network.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date as Date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import json
+import math
+import random
+import threading
+import time
+from typing import Callable, Mapping, Optional, Protocol, Sequence
+
+import pandas as pd
+import requests
+
+from disk_store import write_json
+
+
+class FxProviderError(RuntimeError):
+    """The provider answered, but not with rates (e.g. HTTP 400, an unknown currency in a range)."""
+
+
+class FxProviderUnavailable(FxProviderError):
+    """The provider is down or throttling (connection error, 429, 5xx); counts toward the circuit breaker."""
+
+
+@dataclass(frozen=True)
+class FxRangeQuote:
+    """Rates per publication day ("YYYY-MM-DD" -> symbol -> units per 1 `base`)."""
+
+    base: str
+    rates: dict[str, dict[str, float]]
+    size_bytes: int = 0  # response size, for transfer statistics
+
+
+@dataclass(frozen=True)
+class FxDayQuote:
+    """A to_ccy-per-from_ccy rate and the publication day it belongs to."""
+
+    day: Date
+    rate: float
+    size_bytes: int = 0
+
+
+class FxProvider(Protocol):
+    """Where fx_cache gets rates from.
+
+    `key` identifies the source: identical concurrent calls to the same key are
+    coalesced. fetch_on_date returns None when the provider has no rate for the
+    currency/date at all (a final answer, not retried); both methods raise
+    FxProviderUnavailable when the provider can't be reached.
+    """
+
+    @property
+    def key(self) -> str: ...
+
+    def fetch_range(self, base: str, symbols: Sequence[str], start: Date, end: Date, timeout: float) -> FxRangeQuote: ...
+
+    def fetch_on_date(self, day: Date, from_ccy: str, to_ccy: str, timeout: float) -> Optional[FxDayQuote]: ...
+
+
+class UnavailableFxProvider:
+    """Stands in for a provider that couldn't be set up: every fetch raises FxProviderUnavailable(`reason`)."""
+
+    def __init__(self, reason: str) -> None:
+        self.reason = reason
+
+    @property
+    def key(self) -> str:
+        return f"unavailable:{self.reason}"
+
+    def fetch_range(self, base: str, symbols: Sequence[str], start: Date, end: Date, timeout: float) -> FxRangeQuote:
+        raise FxProviderUnavailable(self.reason)
+
+    def fetch_on_date(self, day: Date, from_ccy: str, to_ccy: str, timeout: float) -> Optional[FxDayQuote]:
+        raise FxProviderUnavailable(self.reason)
+
+
+class FrankfurterProvider:
+    """The Frankfurter API (/<day> and /<start>..<end> with from/to) at `base_url`.
+
+    `get(url, timeout)` performs the GET; fx_cache passes one using its shared
+    retrying session and per-host rate limit. Defaults to requests.get.
+    """
+
+    def __init__(self, base_url: str, get: Callable[[str, float], requests.Response] | None = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self._get = get or (lambda url, timeout: requests.get(url, timeout=timeout))
+
+    @property
+    def key(self) -> str:
+        return self.base_url
+
+    def _request(self, url: str, timeout: float) -> requests.Response:
+        try:
+            r = self._get(url, timeout)
+        except requests.RequestException as e:
+            raise FxProviderUnavailable(str(e)) from e
+        if r.status_code == 429 or r.status_code >= 500:
+            raise FxProviderUnavailable(f"HTTP {r.status_code} from {urlparse(url).netloc}")
+        return r
+
+    def fetch_range(self, base: str, symbols: Sequence[str], start: Date, end: Date, timeout: float) -> FxRangeQuote:
+        start_s = pd.Timestamp(start).strftime("%Y-%m-%d")
+        end_s = pd.Timestamp(end).strftime("%Y-%m-%d")
+        url = f"{self.base_url}/{start_s}..{end_s}?from={base}&to={','.join(symbols)}"
+        r = self._request(url, timeout)
+        if r.status_code != 200:
+            raise FxProviderError(f"HTTP {r.status_code} from {urlparse(url).netloc}")
+        return FxRangeQuote(base, r.json().get("rates", {}), len(r.content))
+
+    def fetch_on_date(self, day: Date, from_ccy: str, to_ccy: str, timeout: float) -> Optional[FxDayQuote]:
+        r = self._request(f"{self.base_url}/{day}?from={from_ccy}&to={to_ccy}", timeout)
+        if r.status_code in (404, 422):
+            return None  # no data for this currency/date
+        if r.status_code != 200:
+            raise FxProviderError(f"HTTP {r.status_code}")
+        data = r.json()
+        used = data.get("date")
+        return FxDayQuote(pd.to_datetime(used).date() if used else day, float(data["rates"][to_ccy]), len(r.content))
+
+
+class RecordedFxProvider:
+    """Serves rates from recorded Frankfurter range JSON: a file, or every *.json in a folder.
+
+    All recordings must be quoted in the same base; any from/to pair is served as a
+    cross rate. A date outside the recording gets the latest recorded day before it
+    (like the API on a weekend), or no data when there is none.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        p = Path(path)
+        files = sorted(p.glob("*.json")) if p.is_dir() else [p]
+        base: str | None = None
+        frames = []
+        for f in files:
+            data = json.loads(f.read_text(encoding="utf-8"))
+            quoted_in = str(data.get("base", "EUR")).upper()
+            if base is not None and quoted_in != base:
+                raise ValueError(f"{f} is quoted in {quoted_in}, other recordings in {base}")
+            base = quoted_in
+            frames.append(pd.DataFrame.from_dict(data.get("rates", {}), orient="index", dtype="float64"))
+
+        table = pd.concat(frames) if frames else pd.DataFrame(dtype="float64")
+        table.index = pd.to_datetime(table.index, errors="coerce").normalize()
+        table = table[table.index.notna()]
+        table = table[~table.index.duplicated(keep="last")].sort_index()
+        self.base = base or "EUR"
+        table[self.base] = 1.0
+        self._path = p
+        self._table = table
+
+    @property
+    def key(self) -> str:
+        return f"recorded:{self._path}"
+
+    def fetch_range(self, base: str, symbols: Sequence[str], start: Date, end: Date, timeout: float) -> FxRangeQuote:
+        unknown = [c for c in (base, *symbols) if c not in self._table.columns]
+        if unknown:
+            raise FxProviderError(f"No recorded rates for {','.join(unknown)}")
+        symbols = [c for c in symbols if c != base]
+        rows = self._table.loc[pd.Timestamp(start) : pd.Timestamp(end)]
+        quoted = rows[symbols].div(rows[base], axis=0)
+        rates = {
+            day.strftime("%Y-%m-%d"): {c: float(v) for c, v in values.items() if not pd.isna(v)}
+            for day, values in quoted.iterrows()
+        }
+        rates = {day: values for day, values in rates.items() if values}
+        return FxRangeQuote(base, rates, len(json.dumps(rates)))
+
+    def fetch_on_date(self, day: Date, from_ccy: str, to_ccy: str, timeout: float) -> Optional[FxDayQuote]:
+        if from_ccy not in self._table.columns or to_ccy not in self._table.columns:
+            return None
+        known = self._table[[from_ccy, to_ccy]].dropna()
+        pos = known.index.searchsorted(pd.Timestamp(day), side="right") - 1
+        if pos < 0:
+            return None
+        row = known.iloc[pos]
+        return FxDayQuote(known.index[pos].date(), float(row[to_ccy] / row[from_ccy]), 64)
+
+
+# EUR-quoted levels for SyntheticFxProvider; rates wobble around these per day.
+SYNTHETIC_EUR_RATES: Mapping[str, float] = {
+    "DKK": 7.46, "USD": 1.08, "GBP": 0.85, "SEK": 11.2, "NOK": 11.6, "CHF": 0.95,
+    "JPY": 160.0, "PLN": 4.3, "CZK": 25.0, "HUF": 390.0, "THB": 38.0, "TRY": 35.0,
+}
+
+
+class SyntheticFxProvider:
+    """Deterministic made-up rates, published on weekdays, for benchmarks and offline runs."""
+
+    def __init__(self, eur_rates: Mapping[str, float] = SYNTHETIC_EUR_RATES) -> None:
+        self._eur_rates = {"EUR": 1.0, **{c.upper(): float(v) for c, v in eur_rates.items()}}
+
+    @property
+    def key(self) -> str:
+        return "synthetic"
+
+    def eur_rate(self, day: pd.Timestamp, ccy: str) -> float:
+        if ccy == "EUR":
+            return 1.0
+        phase = sum(ord(ch) for ch in ccy)
+        return self._eur_rates[ccy] * (1.0 + 0.02 * math.sin(day.toordinal() / 30.0 + phase))
+
+    def quote(self, day: pd.Timestamp, base: str, symbols: Sequence[str]) -> dict[str, float]:
+        per_base = self.eur_rate(day, base)
+        return {c: self.eur_rate(day, c) / per_base for c in symbols if c != base}
+
+    def fetch_range(self, base: str, symbols: Sequence[str], start: Date, end: Date, timeout: float) -> FxRangeQuote:
+        unknown = [c for c in (base, *symbols) if c not in self._eur_rates]
+        if unknown:
+            raise FxProviderError(f"No synthetic rates for {','.join(unknown)}")
+        days = pd.bdate_range(pd.Timestamp(start), pd.Timestamp(end))
+        rates = {d.strftime("%Y-%m-%d"): self.quote(d, base, symbols) for d in days}
+        return FxRangeQuote(base, rates, len(json.dumps(rates)))
+
+    def fetch_on_date(self, day: Date, from_ccy: str, to_ccy: str, timeout: float) -> Optional[FxDayQuote]:
+        if from_ccy not in self._eur_rates or to_ccy not in self._eur_rates:
+            return None
+        published = pd.Timestamp(day)
+        while published.weekday() >= 5:
+            published -= pd.Timedelta(days=1)
+        return FxDayQuote(published.date(), self.quote(published, from_ccy, [to_ccy])[to_ccy], 64)
+
+
+def record_fx_rates(
+    provider: FxProvider,
+    path: str | Path,
+    currencies: Sequence[str],
+    start: Date,
+    end: Date,
+    base: str = "EUR",
+) -> Path:
+    """Fetch [start, end] for `currencies` (quoted in `base`) once and save it for RecordedFxProvider."""
+
+    symbols = sorted({str(c).upper().strip() for c in currencies} - {base, ""})
+    quote = provider.fetch_range(base, symbols, start, end, timeout=30)
+    payload = {
+        "amount": 1.0,
+        "base": base,
+        "start_date": pd.Timestamp(start).strftime("%Y-%m-%d"),
+        "end_date": pd.Timestamp(end).strftime("%Y-%m-%d"),
+        "rates": quote.rates,
+    }
+    p = Path(path)
+    write_json(p, payload, indent=None)
+    return p
+
+
+class FxStandInServer:
+    """Local Frankfurter-shaped HTTP server answering from `provider`.
+
+    Serves /<day> and /<start>..<end> with from/to params on 127.0.0.1 (a free
+    port; see `url`) and counts `requests`. Every request sleeps `latency`
+    seconds; while `fail_status` is set every request gets that status (an
+    outage), otherwise a random `error_rate` share gets `error_status`
+    (reproducible via `seed`; counted in `injected_errors`). Use as a context
+    manager, or start()/stop().
+    """
+
+    def __init__(
+        self,
+        provider: FxProvider,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        fail_status: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        self.provider = provider
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_status = fail_status
+        self.requests = 0
+        self.injected_errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                with server._lock:
+                    server.requests += 1
+                    injected = server.error_rate > 0 and server._rng.random() < server.error_rate
+                    server.injected_errors += injected
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail_status is not None:
+                    status, body = server.fail_status, {"message": "unavailable"}
+                elif injected:
+                    status, body = server.error_status, {"message": "injected error"}
+                else:
+                    status, body = server.respond(self.path)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fx-stand-in", daemon=True)
+
+    def start(self) -> "FxStandInServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FxStandInServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def respond(self, raw_path: str) -> tuple[int, dict[str, object]]:
+        parsed = urlparse(raw_path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        base = params.get("from", "EUR").upper()
+        symbols = [c.upper() for c in params.get("to", "").split(",") if c]
+        if not symbols:
+            return 422, {"message": "'to' is required"}
+
+        path = parsed.path.strip("/")
+        try:
+            if ".." in path:
+                start_s, end_s = path.split("..", 1)
+                end = pd.Timestamp(end_s) if end_s else pd.Timestamp.today().normalize()
+                quote = self.provider.fetch_range(base, symbols, pd.Timestamp(start_s).date(), end.date(), timeout=30)
+                return 200, {"amount": 1.0, "base": base, "start_date": start_s, "end_date": end_s, "rates": quote.rates}
+
+            day = pd.Timestamp(path).date()
+            quotes = {c: self.provider.fetch_on_date(day, base, c, timeout=30) for c in symbols if c != base}
+        except FxProviderUnavailable as e:
+            return 503, {"message": str(e)}
+        except (FxProviderError, ValueError) as e:
+            return 404, {"message": str(e)}
+        if not quotes or any(q is None for q in quotes.values()):
+            return 404, {"message": "not found"}
+        used = min(q.day for q in quotes.values())  # type: ignore[union-attr]
+        rates = {c: q.rate for c, q in quotes.items()}  # type: ignore[union-attr]
+        return 200, {"amount": 1.0, "base": base, "date": used.strftime("%Y-%m-%d"), "rates": rates}
@@ -0,0 +1,292 @@
+"""Memory-mapped daily FX rate arrays.
+
+One file per currency pair (e.g. data/fx_USD_DKK.f64):
+- 24-byte header: magic b"FXR2", 4 pad bytes, base day (int64 days since
+  1970-01-01), number of days (int64)
+- float64 rates, one slot per day from the base day on: the published rate on
+  publication days, NaN on every other day
+
+The days span what was fetched, so a file also says which days are known to have
+no publication. Lookups are as-of: the latest publication at or before a date,
+within a maximum staleness (one index into a per-day as-of table). Updates
+append in place after the last publication instead of rewriting the file.
+
+Files with magic b"FXR1" are the older layout, filled forward (and back) to every
+calendar day; they still read fine but are marked `filled` so writers replace them.
+Opening a file maps it without copying. CSV import/export (date,rate) is kept for
+inspecting and migrating the old cache files.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from disk_store import atomic_path
+
+STORE_SUFFIX = ".f64"
+
+_MAGIC = b"FXR2"
+_FILLED_MAGIC = b"FXR1"
+_HEADER = struct.Struct("<4s4xqq")
+_COUNT = struct.Struct("<q")
+_COUNT_OFFSET = 16
+NAT_DAY = np.iinfo(np.int64).min
+
+
+_UNITS_PER_DAY = {"D": 1, "h": 24, "m": 1_440, "s": 86_400, "ms": 86_400_000, "us": 86_400_000_000, "ns": 86_400_000_000_000}
+
+
+def day_numbers(dates: object) -> np.ndarray:
+    """int64 days since 1970-01-01 for date-likes (NaT/unparseable -> NAT_DAY)."""
+
+    if isinstance(dates, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(dates.dtype):
+        values = dates
+    elif isinstance(dates, np.ndarray) and dates.dtype.kind == "M":
+        values = dates
+    else:
+        values = pd.to_datetime(pd.Series(np.asarray(dates, dtype=object)), errors="coerce")
+    if getattr(values.dtype, "tz", None) is not None:
+        values = values.dt.tz_localize(None) if isinstance(values, pd.Series) else values.tz_localize(None)
+
+    arr = np.asarray(values)
+    unit, count = np.datetime_data(arr.dtype)
+    ticks = arr.view(np.int64)
+    per_day = _UNITS_PER_DAY.get(unit) if count == 1 else None
+    if per_day is None:
+        ticks = arr.astype("datetime64[ns]").view(np.int64)
+        per_day = _UNITS_PER_DAY["ns"]
+    days = ticks // per_day if per_day != 1 else ticks.copy()
+    days[ticks == NAT_DAY] = NAT_DAY
+    return days
+
+
+@dataclass(frozen=True)
+class RateArray:
+    """Daily rates starting at `base_day` (days since epoch); `rates` may be a memmap.
+
+    NaN marks a day without a publication, unless `filled` (old FXR1 files, where
+    every day carries a rate and leading days hold a later one).
+    """
+
+    base_day: int
+    rates: np.ndarray
+    filled: bool = False
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.rates) == 0
+
+    def covered_dates(self) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """(first, last) day the array covers, or None when empty."""
+
+        if self.empty:
+            return None
+        first = pd.Timestamp(np.datetime64(self.base_day, "D"))
+        return first, first + pd.Timedelta(days=len(self.rates) - 1)
+
+    @cached_property
+    def published_offsets(self) -> np.ndarray:
+        """Sorted offsets (from base_day) of the days holding a rate."""
+
+        return np.flatnonzero(~np.isnan(self.rates))
+
+    @cached_property
+    def asof_offsets(self) -> np.ndarray:
+        """Per day, the offset of the latest day at or before it holding a rate (-1: none).
+
+        The days are contiguous, so this is the backward as-of join (searchsorted over
+        published_offsets) precomputed once per array; a lookup is then one index.
+        """
+
+        return np.maximum.accumulate(np.where(np.isnan(self.rates), -1, np.arange(len(self.rates))))
+
+    def published_dates(self) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """(first, last) day holding a rate, or None when there is none."""
+
+        pub = self.published_offsets
+        if len(pub) == 0:
+            return None
+        first = pd.Timestamp(np.datetime64(self.base_day, "D"))
+        return first + pd.Timedelta(days=int(pub[0])), first + pd.Timedelta(days=int(pub[-1]))
+
+    def rates_for(self, dates: object) -> np.ndarray:
+        """Vectorized lookup: float64 rate per date, NaN outside the stored range."""
+
+        return self.rates_for_days(day_numbers(dates))
+
+    def rates_for_days(self, days: np.ndarray) -> np.ndarray:
+        """Like rates_for, for int64 day numbers (see day_numbers)."""
+
+        if self.empty:
+            return np.full(len(days), np.nan)
+        # One unsigned compare covers both ends; NaT wraps around to an out-of-range offset.
+        offsets = (days - self.base_day).view(np.uint64)
+        valid = offsets < len(self.rates)
+        out = np.take(self.rates, np.where(valid, offsets, 0).view(np.int64))
+        out[~valid] = np.nan
+        return out
+
+    def rates_asof(self, dates: object, max_staleness_days: int) -> np.ndarray:
+        """Vectorized as-of lookup: the latest rate at or before each date, NaN when
+        that is more than `max_staleness_days` old or there is none."""
+
+        return self.rates_asof_days(day_numbers(dates), max_staleness_days)
+
+    def rates_asof_days(self, days: np.ndarray, max_staleness_days: int) -> np.ndarray:
+        """Like rates_asof, for int64 day numbers (see day_numbers)."""
+
+        out = np.full(len(days), np.nan)
+        pub = self.published_offsets
+        if len(pub) == 0:
+            return out
+        n = len(self.rates)
+        offsets = np.where(days != NAT_DAY, days - self.base_day, -1)
+        # Days past the end take the last publication; days before the start have none.
+        src = np.take(self.asof_offsets, np.clip(offsets, 0, n - 1))
+        src[offsets >= n] = pub[-1]
+        hit = (offsets >= 0) & (src >= 0) & (offsets - src <= max_staleness_days)
+        out[hit] = np.take(self.rates, src[hit])
+        return out
+
+    def to_series(self) -> pd.Series:
+        """The rates as a Series on a daily DatetimeIndex (known days only)."""
+
+        covered = self.covered_dates()
+        if covered is None:
+            return pd.Series(dtype="float")
+        start = covered[0]
+        s = pd.Series(np.asarray(self.rates), index=pd.date_range(start, periods=len(self.rates), freq="D"))
+        return s[s.notna()]
+
+
+def from_series(series: pd.Series) -> RateArray:
+    """Pack a date-indexed rate series into a dense daily array (gaps stay NaN)."""
+
+    if series.empty:
+        return RateArray(0, np.empty(0))
+    days = day_numbers(pd.Series(series.index))
+    values = pd.to_numeric(pd.Series(series.to_numpy()), errors="coerce").to_numpy(dtype="float64")
+    ok = days != NAT_DAY
+    days, values = days[ok], values[ok]
+    if len(days) == 0:
+        return RateArray(0, np.empty(0))
+
+    base = int(days.min())
+    rates = np.full(int(days.max()) - base + 1, np.nan)
+    rates[days - base] = values  # later duplicates win, like keep="last"
+    return RateArray(base, rates)
+
+
+def write_store(path: str | Path, rates: RateArray | pd.Series) -> None:
+    """Atomically write a rate file (header + raw float64 array)."""
+
+    arr = rates if isinstance(rates, RateArray) else from_series(rates)
+    with atomic_path(path) as tmp, open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_FILLED_MAGIC if arr.filled else _MAGIC, int(arr.base_day), len(arr)))
+        f.write(np.ascontiguousarray(arr.rates, dtype="<f8").tobytes())
+
+
+class PublishedRateConflict(ValueError):
+    """An append would change a published (non-NaN) day of a rate file."""
+
+
+def append_store(path: str | Path, rates: RateArray | pd.Series) -> None:
+    """Write `rates` into an existing rate file in place, growing it as needed.
+
+    Days before `rates.base_day` are left untouched, so a refresh only writes what
+    it fetched. The data lands before the header's day count is raised, so a
+    concurrent open_store sees either the old or the new length. `rates` must start
+    within the file's days or right after them; FXR1 files can't be appended to.
+
+    Open RateArrays map this file and cache per-array tables of its publications
+    (published_offsets, asof_offsets), so an append may only fill NaN days or
+    rewrite a published day with the same value. Anything else raises
+    PublishedRateConflict before writing; the caller must write_store a new file.
+    """
+
+    arr = rates if isinstance(rates, RateArray) else from_series(rates)
+    if arr.empty:
+        return
+    p = Path(path)
+    with open(p, "r+b") as f:
+        magic, base_day, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Not an appendable FX rate file: {p}")
+        offset = int(arr.base_day) - int(base_day)
+        if offset < 0 or offset > count:
+            raise ValueError(f"Rates from day {arr.base_day} don't continue {p} (days {base_day}..{base_day + count - 1})")
+        new = np.ascontiguousarray(arr.rates, dtype="<f8")
+        overlap = min(len(new), count - offset)
+        f.seek(_HEADER.size + offset * 8)
+        old = np.frombuffer(f.read(overlap * 8), dtype="<f8")
+        changed = ~np.isnan(old) & (new[:overlap] != old)
+        if changed.any():
+            day = int(base_day) + offset + int(np.argmax(changed))
+            raise PublishedRateConflict(f"Appending to {p} would change the published rate of day {day}")
+        f.seek(_HEADER.size + offset * 8)
+        f.write(new.tobytes())
+        f.flush()
+        if offset + len(arr) > count:
+            f.seek(_COUNT_OFFSET)
+            f.write(_COUNT.pack(offset + len(arr)))
+
+
+def open_store(path: str | Path) -> RateArray:
+    """Memory-map a rate file read-only (zero-copy)."""
+
+    return open_store_stat(path)[0]
+
+
+def open_store_stat(path: str | Path) -> tuple[RateArray, os.stat_result]:
+    """open_store plus the stat of the file actually mapped.
+
+    Header, data and stat all come from one open file, so a concurrent
+    write_store (an atomic rename) can't mix an old header with new data; the
+    mapping keeps the old file alive until it is dropped.
+    """
+
+    p = Path(path)
+    with open(p, "rb") as f:
+        st = os.fstat(f.fileno())
+        magic, base_day, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic not in (_MAGIC, _FILLED_MAGIC):
+            raise ValueError(f"Not an FX rate file: {p}")
+        filled = magic == _FILLED_MAGIC
+        if count == 0:
+            return RateArray(int(base_day), np.empty(0), filled), st
+        rates = np.memmap(f, dtype="<f8", mode="r", offset=_HEADER.size, shape=(int(count),))
+    return RateArray(int(base_day), rates, filled), st
+
+
+def import_csv(csv_path: str | Path, store_path: str | Path, filled: bool = False) -> RateArray:
+    """Convert a date,rate CSV into a rate file; returns the stored array.
+
+    Pass `filled` for the old cache CSVs, which hold a rate for every calendar day.
+    """
+
+    df = pd.read_csv(csv_path)
+    if df.empty or "date" not in df.columns or "rate" not in df.columns:
+        arr = RateArray(0, np.empty(0), filled)
+    else:
+        arr = from_series(pd.Series(df["rate"].to_numpy(), index=pd.to_datetime(df["date"], errors="coerce")))
+        arr = RateArray(arr.base_day, arr.rates, filled)
+    write_store(store_path, arr)
+    return arr
+
+
+def export_csv(store_path: str | Path, csv_path: str | Path) -> None:
+    """Write a rate file out as a date,rate CSV for inspection."""
+
+    s = open_store(store_path).to_series()
+    Path(csv_path).parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({"date": s.index.strftime("%Y-%m-%d"), "rate": s.to_numpy()}).to_csv(csv_path, index=False)
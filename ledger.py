@@ -0,0 +1,253 @@
+"""Append-only transaction ledger merged from every account-statement export.
+
+Layout (e.g. data/ledger/):
+- manifest.json: ingested exports (path -> size, mtime, sha256, rows added)
+- YYYY-MM.parquet: normalized rows whose completed_date falls in that month
+  (pickle instead of Parquet when no Parquet engine is installed)
+
+Rows are identified by a stable fingerprint of (dates, description, amount,
+currency, balance) plus an occurrence counter for genuinely identical rows within
+one export, so overlapping exports only add rows the ledger hasn't seen.
+
+PENDING rows are volatile (they settle with a new completed date/balance or
+disappear), so they are never merged: the pending rows of the newest ingested
+export replace whatever pending rows the ledger held.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import logging
+import re
+import threading
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from disk_store import read_json, write_json
+from statement_cache import file_sha256, frame_path, read_frame, write_frame
+
+logger = logging.getLogger(__name__)
+
+LEDGER_DIRNAME = "ledger"
+FINGERPRINT_COLUMNS: tuple[str, ...] = (
+    "started_date",
+    "completed_date",
+    "description",
+    "amount",
+    "currency",
+    "balance",
+)
+
+_MANIFEST_FILENAME = "manifest.json"
+_PARTITION_RE = re.compile(r"^(\d{4}-\d{2}|unknown)\.(parquet|pkl)$")
+_UNKNOWN_MONTH = "unknown"
+
+_ledger_lock = threading.Lock()
+
+
+def row_fingerprints(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Return (fingerprint uint64, occurrence int64) per row of a normalized frame.
+
+    Values are canonicalized first (datetimes to ns, missing text to "") so the
+    result doesn't depend on how the CSV was parsed (engine, dtypes); categorical
+    and string columns hash like their plain str values.
+    """
+
+    parts: dict[str, object] = {}
+    for c in FINGERPRINT_COLUMNS:
+        col = df[c] if c in df.columns else pd.Series(np.nan, index=df.index)
+        if c.endswith("_date"):
+            if not pd.api.types.is_datetime64_any_dtype(col.dtype):
+                col = pd.to_datetime(col, errors="coerce")
+            dt = col.astype("datetime64[ns]")
+            parts[c] = dt.to_numpy().view("int64")
+        elif c in ("amount", "balance"):
+            parts[c] = pd.to_numeric(col, errors="coerce").to_numpy(dtype="float64")
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            # Hashes of a categorical equal those of its values; avoids materializing strings.
+            if col.isna().any():
+                if "" not in col.cat.categories:
+                    col = col.cat.add_categories([""])
+                col = col.fillna("")
+            parts[c] = col.array
+        elif isinstance(col.dtype, pd.StringDtype):
+            parts[c] = col.fillna("").array
+        else:
+            obj = col.astype("object")
+            parts[c] = obj.where(obj.notna(), "").astype(str).to_numpy(dtype=object)
+
+    fp = pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy(dtype="uint64")
+    occurrence = pd.Series(fp).groupby(fp).cumcount().to_numpy(dtype="int64")
+    return fp, occurrence
+
+
+def _month_keys(df: pd.DataFrame) -> pd.Series:
+    if "completed_date" not in df.columns:
+        return pd.Series(_UNKNOWN_MONTH, index=df.index)
+    dt = pd.to_datetime(df["completed_date"], errors="coerce")
+    return dt.dt.strftime("%Y-%m").fillna(_UNKNOWN_MONTH)
+
+
+def _is_pending(df: pd.DataFrame) -> pd.Series:
+    if "state" not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df["state"].astype(str).str.strip().str.upper().eq("PENDING")
+
+
+def _read_manifest(ledger_dir: Path) -> dict[str, object]:
+    return read_json(ledger_dir / _MANIFEST_FILENAME, "ledger manifest")
+
+
+def _write_manifest(ledger_dir: Path, manifest: dict[str, object]) -> None:
+    write_json(ledger_dir / _MANIFEST_FILENAME, manifest)
+
+
+def _partitions(ledger_dir: Path) -> dict[str, Path]:
+    out: dict[str, Path] = {}
+    if not ledger_dir.exists():
+        return out
+    for p in ledger_dir.iterdir():
+        m = _PARTITION_RE.match(p.name)
+        if m:
+            out[m.group(1)] = p
+    return out
+
+
+def _read_partition(path: Path | None) -> pd.DataFrame:
+    if path is None or not path.exists():
+        return pd.DataFrame()
+    return read_frame(path)
+
+
+def ledger_version(ledger_dir: str | Path) -> float:
+    """A float that changes whenever an ingest changes the ledger."""
+
+    try:
+        return (Path(ledger_dir) / _MANIFEST_FILENAME).stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def is_ingested(csv_path: str | Path, ledger_dir: str | Path) -> bool:
+    """True if the manifest records `csv_path` as ingested with its current size+mtime."""
+
+    src = Path(csv_path)
+    try:
+        st = src.stat()
+    except OSError:
+        return False
+    with _ledger_lock:
+        exports = _read_manifest(Path(ledger_dir)).get("exports", {})
+    entry = exports.get(str(src.resolve())) if isinstance(exports, dict) else None
+    return isinstance(entry, dict) and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime
+
+
+def ingest_statement(
+    csv_path: str | Path,
+    ledger_dir: str | Path,
+    parse: Callable[[str], pd.DataFrame],
+) -> int:
+    """Merge one export into the ledger; returns the number of settled rows added.
+
+    `parse` turns the CSV into the normalized frame (e.g. load_normalized_statement).
+    Exports already ingested (same size+mtime, or same content) are skipped without parsing.
+    """
+
+    base = Path(ledger_dir)
+    src = Path(csv_path)
+    key = str(src.resolve())
+    st = src.stat()
+
+    with _ledger_lock:
+        manifest = _read_manifest(base)
+        exports: dict[str, dict[str, object]] = dict(manifest.get("exports", {}))  # type: ignore[arg-type]
+
+        entry = exports.get(key)
+        if entry is not None and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime:
+            return 0
+
+        digest = file_sha256(src)
+        if any(e.get("sha256") == digest for e in exports.values()):
+            exports[key] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest, "added": 0}
+            manifest["exports"] = exports
+            _write_manifest(base, manifest)
+            return 0
+
+        df = parse(str(src)).reset_index(drop=True)
+        fp, occurrence = row_fingerprints(df)
+        df["row_fingerprint"] = fp
+        df["row_occurrence"] = occurrence
+        df["ledger_month"] = _month_keys(df)
+        pending = _is_pending(df)
+
+        partitions = _partitions(base)
+        changed: dict[str, pd.DataFrame] = {}
+
+        # Pending rows: the newest export wins, older ones are dropped everywhere.
+        export_as_of = pd.to_datetime(df.get("started_date"), errors="coerce").max() if len(df) else pd.NaT
+        ledger_as_of = pd.to_datetime(manifest.get("pending_as_of"), errors="coerce")
+        replace_pending = pd.isna(ledger_as_of) or (pd.notna(export_as_of) and export_as_of >= ledger_as_of)
+        if replace_pending:
+            for month in manifest.get("pending_months", []):  # type: ignore[union-attr]
+                part = _read_partition(partitions.get(str(month)))
+                if not part.empty:
+                    changed[str(month)] = part[~_is_pending(part)]
+
+        added = 0
+        for month, rows in df[~pending].groupby("ledger_month", sort=False):
+            existing = changed.get(month)
+            if existing is None:
+                existing = _read_partition(partitions.get(month))
+            if not existing.empty:
+                seen = pd.MultiIndex.from_arrays(
+                    [existing["row_fingerprint"].to_numpy(), existing["row_occurrence"].to_numpy()]
+                )
+                keys = pd.MultiIndex.from_arrays(
+                    [rows["row_fingerprint"].to_numpy(), rows["row_occurrence"].to_numpy()]
+                )
+                rows = rows[~keys.isin(seen)]
+            if rows.empty and month not in changed:
+                continue
+            added += len(rows)
+            changed[month] = pd.concat([existing, rows], ignore_index=True, sort=False)
+
+        if replace_pending:
+            for month, rows in df[pending].groupby("ledger_month", sort=False):
+                existing = changed.get(month)
+                if existing is None:
+                    existing = _read_partition(partitions.get(month))
+                changed[month] = pd.concat([existing, rows], ignore_index=True, sort=False)
+            manifest["pending_months"] = sorted(set(df.loc[pending, "ledger_month"].tolist()))
+            manifest["pending_as_of"] = None if pd.isna(export_as_of) else str(export_as_of)
+
+        for month, part in changed.items():
+            if "started_date" in part.columns:
+                part = part.sort_values("started_date", kind="stable")
+            target = partitions.get(month) or frame_path(base, month)
+            write_frame(part.drop(columns=["ledger_month"], errors="ignore").reset_index(drop=True), target)
+
+        exports[key] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest, "added": added}
+        manifest["exports"] = exports
+        _write_manifest(base, manifest)
+
+    logger.info(f"Ledger: ingested {src.name}, {added} new settled rows")
+    return added
+
+
+def read_ledger(ledger_dir: str | Path) -> pd.DataFrame:
+    """All ledger rows (oldest first), including row_fingerprint/row_occurrence."""
+
+    base = Path(ledger_dir)
+    with _ledger_lock:
+        parts = [read_frame(p) for _month, p in sorted(_partitions(base).items())]
+
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame()
+
+    df = pd.concat(parts, ignore_index=True, sort=False)
+    if "started_date" in df.columns:
+        df = df.sort_values("started_date", kind="stable").reset_index(drop=True)
+    return df
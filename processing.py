@@ -11,14 +11,18 @@ This module mirrors the notebook pipeline in 01_visualize_df.ipynb:
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import date as Date
 from pathlib import Path
 import calendar
 import csv
 from datetime import datetime
+import hashlib
 import logging
 import re
+import threading
+import time
 import unicodedata
 from uuid import uuid4
 from typing import Dict, Iterable, List, Optional, Tuple
@@ -26,13 +30,50 @@ from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 
+from categorization import (
+    CATEGORY_CACHE_FILENAME,
+    CategorizationStats,
+    CategoryDiskCache,
+    DescriptionLRU,
+    KeywordMatcher,
+    diff_rules,
+)
 import fx_cache
+import ledger
+import statement_cache
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_EXPENSE_CATEGORY = "Other"
 EXPENSE_CATEGORY_MAP_PATH = Path(__file__).with_name("expense_categories.yml")
 
+# classify_type keyword rules (literal, case-insensitive substrings)
+INCOME_KEYWORDS: tuple[str, ...] = ("BETTERAI LLC", "paypal")
+REFUND_KEYWORDS: tuple[str, ...] = ("refund",)
+
+# Bump when normalize_revolut_df/classify_type output changes; invalidates cached statements.
+# 3: statements keep every export column (Product and any column Revolut adds).
+# 4: statements carry ledger row_fingerprint/row_occurrence.
+STATEMENT_PIPELINE_VERSION = 4
+
+# Revolut account-statement export schema (see load_revolut_csv)
+REVOLUT_DATE_COLUMNS: tuple[str, ...] = ("Started Date", "Completed Date")
+REVOLUT_NUMERIC_COLUMNS: tuple[str, ...] = ("Amount", "Fee", "Balance")
+REVOLUT_CATEGORICAL_COLUMNS: tuple[str, ...] = ("Type", "Product", "Currency", "State")
+REVOLUT_COLUMNS: tuple[str, ...] = (
+    "Type",
+    "Product",
+    "Started Date",
+    "Completed Date",
+    "Description",
+    "Amount",
+    "Fee",
+    "Currency",
+    "State",
+    "Balance",
+)
+REVOLUT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 MANUAL_EXPENSES_FILENAME = "manual_expenses.csv"
 MANUAL_EXTERNAL_SUFFIX = "-External"
 
@@ -40,6 +81,9 @@ MANUAL_EXTERNAL_SUFFIX = "-External"
 _expense_config_cache: dict[Path, tuple[float, dict[str, str], dict[int, float]]] = {}
 
 
+_month_names_compact: dict[str, int] = {}
+
+
 def _month_key_to_number(key: str) -> int | None:
     k = normalize_text(key)
     if not k:
@@ -48,13 +92,15 @@ def _month_key_to_number(key: str) -> int | None:
     # Accept "January", "jan", etc (case/space insensitive via normalize_text)
     k_compact = k.replace(" ", "")
 
-    for i in range(1, 13):
-        full = normalize_text(calendar.month_name[i]).replace(" ", "")
-        abbr = normalize_text(calendar.month_abbr[i]).replace(" ", "")
-        if k_compact == full or (abbr and k_compact == abbr):
-            return i
+    if not _month_names_compact:
+        for i in range(1, 13):
+            full = normalize_text(calendar.month_name[i]).replace(" ", "")
+            abbr = normalize_text(calendar.month_abbr[i]).replace(" ", "")
+            _month_names_compact[full] = i
+            if abbr:
+                _month_names_compact.setdefault(abbr, i)
 
-    return None
+    return _month_names_compact.get(k_compact)
 
 
 def _to_float_maybe(value: object) -> float | None:
@@ -73,12 +119,29 @@ def _to_float_maybe(value: object) -> float | None:
     return None
 
 
-def find_latest_account_statement_csv(search_dir: str = "/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents") -> str:
-    """Pick the most recent Revolut export CSV containing 'account-statement'.
+_STATEMENT_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
 
-    Preference order:
-    1) Newest date found in filename (typically the end date in Revolut exports)
-    2) Newest file modified time as a fallback
+
+def _statement_sort_key(p: Path):
+    parsed = []
+    for d in _STATEMENT_DATE_RE.findall(p.name):
+        try:
+            parsed.append(Date.fromisoformat(d))
+        except ValueError:
+            continue
+    end_date = parsed[-1] if parsed else None
+    start_date = parsed[0] if parsed else None
+    mtime = p.stat().st_mtime
+    # None-safe sorting: use very old date when missing
+    end_dt = end_date or pd.Timestamp("1900-01-01").date()
+    start_dt = start_date or pd.Timestamp("1900-01-01").date()
+    return (end_dt, start_dt, mtime)
+
+
+def list_account_statement_csvs(search_dir: str | Path) -> list[str]:
+    """All Revolut export CSVs containing 'account-statement', oldest first.
+
+    Ordering is the one `find_latest_account_statement_csv` picks the newest from.
     """
 
     base = Path(search_dir)
@@ -86,35 +149,34 @@ def find_latest_account_statement_csv(search_dir: str = "/Users/mehdiordikhani/L
         raise FileNotFoundError(f"Folder not found: {base}")
 
     candidates = [p for p in base.glob("*.csv") if "account-statement" in p.name]
-    if not candidates:
-        raise FileNotFoundError(f"No CSV files containing 'account-statement' in {base}")
+    return [str(p.as_posix()) for p in sorted(candidates, key=_statement_sort_key)]
+
 
-    date_re = re.compile(r"\d{4}-\d{2}-\d{2}")
+def find_latest_account_statement_csv(search_dir: str = "/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents") -> str:
+    """Pick the most recent Revolut export CSV containing 'account-statement'.
 
-    def sort_key(p: Path):
-        dates = date_re.findall(p.name)
-        parsed = [pd.to_datetime(d, errors="coerce").date() for d in dates]
-        parsed = [d for d in parsed if d is not None and not pd.isna(d)]
-        end_date = parsed[-1] if parsed else None
-        start_date = parsed[0] if parsed else None
-        mtime = p.stat().st_mtime
-        # None-safe sorting: use very old date when missing
-        end_dt = end_date or pd.Timestamp("1900-01-01").date()
-        start_dt = start_date or pd.Timestamp("1900-01-01").date()
-        return (end_dt, start_dt, mtime)
+    Preference order:
+    1) Newest date found in filename (typically the end date in Revolut exports)
+    2) Newest file modified time as a fallback
+    """
 
-    best = sorted(candidates, key=sort_key, reverse=True)[0]
-    return str(best.as_posix())
+    candidates = list_account_statement_csvs(search_dir)
+    if not candidates:
+        raise FileNotFoundError(f"No CSV files containing 'account-statement' in {Path(search_dir)}")
+    return candidates[-1]
 
 
 def cleanup_outdated_account_statement_csvs(
     search_dir: str = "data",
     keep_path: str | None = None,
     prefix: str = "account-statement",
+    ledger_dir: str | Path | None = None,
 ) -> list[str]:
     """Remove older account-statement CSVs from search_dir.
 
     Only deletes files inside search_dir whose names start with `prefix` and end with `.csv`.
+    With `ledger_dir`, only exports the ledger manifest records as ingested in their
+    current form are deleted; any other export (e.g. one whose ingest failed) is kept.
     Returns a list of deleted file paths.
     """
 
@@ -142,6 +204,10 @@ def cleanup_outdated_account_statement_csvs(
                 if str(p) == keep_path:
                     continue
 
+        if ledger_dir is not None and not ledger.is_ingested(p, ledger_dir):
+            logger.warning(f"Keeping {p}: not in the ledger yet")
+            continue
+
         try:
             p.unlink()
             deleted.append(str(p.as_posix()))
@@ -158,9 +224,79 @@ def to_snake(name: str) -> str:
     return name.strip("_").lower()
 
 
-def load_revolut_csv(csv_path: str) -> pd.DataFrame:
-    """Load exactly one Revolut export CSV."""
-    return pd.read_csv(csv_path)
+def _pyarrow_csv_available() -> bool:
+    try:
+        import pyarrow  # type: ignore  # noqa: F401
+
+        return True
+    except Exception:
+        return False
+
+
+def _parse_revolut_datetimes(values: pd.Series) -> pd.Series:
+    """Parse with the fixed export format; fall back to inference only for odd rows."""
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, format=REVOLUT_DATETIME_FORMAT, errors="coerce")
+    odd = parsed.isna() & values.notna()
+    if bool(odd.any()):
+        parsed.loc[odd] = pd.to_datetime(values[odd].astype(str), errors="coerce", format="mixed")
+    return parsed
+
+
+def load_revolut_csv(
+    csv_path: str,
+    usecols: Iterable[str] | None = REVOLUT_COLUMNS,
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """Load exactly one Revolut export CSV with the known account-statement schema.
+
+    - Only `usecols` are read (None reads everything); unknown/missing columns are fine.
+    - Amount/Fee/Balance are read as float64, Started/Completed Date with the fixed
+      export format (odd rows fall back to format inference), and Type/Currency/State
+      become categoricals.
+    - engine=None uses pyarrow's CSV reader when installed, else pandas' C parser.
+
+    Column names are returned as in the file, so this stays a drop-in for plain
+    `pd.read_csv` in front of `normalize_revolut_df`.
+    """
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if usecols is not None:
+        wanted = {str(c).strip() for c in usecols}
+        cols = [c for c in header if str(c).strip() in wanted]
+    else:
+        cols = list(header)
+
+    by_name = {str(c).strip(): c for c in cols}
+    # Dates are left to the engine: pyarrow parses ISO timestamps natively, the C
+    # parser yields strings, and _parse_revolut_datetimes handles both.
+    dtypes: dict[str, str] = {by_name[c]: "float64" for c in REVOLUT_NUMERIC_COLUMNS if c in by_name}
+    dtypes.update({by_name[c]: "category" for c in REVOLUT_CATEGORICAL_COLUMNS if c in by_name})
+
+    if engine is None:
+        engine = "pyarrow" if _pyarrow_csv_available() else "c"
+
+    try:
+        df = pd.read_csv(csv_path, usecols=cols, dtype=dtypes, engine=engine)
+    except (ValueError, TypeError) as e:
+        # Stray text in a numeric column: read untyped and coerce like normalize_revolut_df.
+        logger.debug(f"Typed read of {csv_path} failed ({e}); falling back to untyped read")
+        df = pd.read_csv(csv_path, usecols=cols)
+        for c in REVOLUT_NUMERIC_COLUMNS:
+            if c in by_name:
+                df[by_name[c]] = pd.to_numeric(df[by_name[c]], errors="coerce").astype("float64")
+
+    for c in REVOLUT_DATE_COLUMNS:
+        if c in by_name:
+            df[by_name[c]] = _parse_revolut_datetimes(df[by_name[c]])
+
+    for c in REVOLUT_CATEGORICAL_COLUMNS:
+        if c in by_name and not isinstance(df[by_name[c]].dtype, pd.CategoricalDtype):
+            df[by_name[c]] = df[by_name[c]].astype("category")
+
+    return df
 
 
 def normalize_revolut_df(raw: pd.DataFrame) -> pd.DataFrame:
@@ -197,8 +333,57 @@ def normalize_revolut_df(raw: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def classify_type(frame: pd.DataFrame) -> pd.Series:
-    """Return high-level transaction type: expense/income/refund/NA."""
+def _keyword_regex(keywords: Iterable[str]) -> re.Pattern[str] | None:
+    """One case-insensitive alternation matching any of the literal keywords."""
+
+    kws = [str(k) for k in keywords if str(k)]
+    if not kws:
+        return None
+    return re.compile("|".join(re.escape(k) for k in kws), re.IGNORECASE)
+
+
+def _contains_any(values: pd.Series, pattern: re.Pattern[str]) -> np.ndarray:
+    """Like `values.astype(str).str.contains(pattern)`, evaluated once per distinct value."""
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        hits = np.fromiter(
+            (pattern.search(str(c)) is not None for c in values.cat.categories),
+            dtype=bool,
+            count=len(values.cat.categories),
+        )
+        codes = values.cat.codes.to_numpy()
+        # Missing (code -1) stringifies to "nan", which never matches a keyword; guard anyway.
+        nan_hit = pattern.search("nan") is not None
+        return np.where(codes >= 0, hits[codes], nan_hit)
+
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object), use_na_sentinel=False)
+    hits = np.fromiter(
+        (pattern.search(str(v)) is not None for v in uniques), dtype=bool, count=len(uniques)
+    )
+    return hits[codes]
+
+
+def _is_text_column(col: pd.Series) -> bool:
+    dtype = col.dtype
+    return isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def classify_type(
+    frame: pd.DataFrame,
+    income_keywords: Iterable[str] = INCOME_KEYWORDS,
+    refund_keywords: Iterable[str] = REFUND_KEYWORDS,
+    text_columns: Iterable[str] | None = None,
+) -> pd.Series:
+    """Return high-level transaction type: expense/income/refund/NA.
+
+    - expense: sub_type is "Card Payment"
+    - income: description contains any `income_keywords` (overrides expense)
+    - refund: any text column contains any `refund_keywords` (overrides everything)
+
+    Keywords are literal, case-insensitive substrings. Refund detection only scans
+    text-bearing columns (object/string/categorical, or `text_columns` if given):
+    numbers and dates can never contain a keyword, so stringifying them is wasted work.
+    """
     out = pd.Series(pd.NA, index=frame.index, dtype="object")
 
     sub_type = (
@@ -206,27 +391,100 @@ def classify_type(frame: pd.DataFrame) -> pd.Series:
         .astype(str)
         .str.strip()
     )
-    desc = frame.get("description", pd.Series("", index=frame.index, dtype="object")).astype(
-        str
-    )
 
     # Expense rule
     out.loc[sub_type.eq("Card Payment")] = "expense"
 
     # Income rules (override expense if both ever match)
-    is_income = desc.str.contains("BETTERAI LLC", case=False, na=False) | desc.str.contains(
-        "paypal", case=False, na=False
-    )
-    out.loc[is_income] = "income"
+    income_re = _keyword_regex(income_keywords)
+    if income_re is not None and "description" in frame.columns:
+        out.loc[_contains_any(frame["description"], income_re)] = "income"
+
+    # Refund rule: if ANY text column contains a refund keyword, mark as refund (overrides everything).
+    refund_re = _keyword_regex(refund_keywords)
+    if refund_re is not None:
+        cols = (
+            [c for c in text_columns if c in frame.columns]
+            if text_columns is not None
+            else [c for c in frame.columns if _is_text_column(frame[c])]
+        )
+        is_refund = np.zeros(len(frame), dtype=bool)
+        for c in cols:
+            is_refund |= _contains_any(frame[c], refund_re)
+        out.loc[is_refund] = "refund"
+
+    return out
+
+
+def _statement_pipeline_tag() -> str:
+    raw = repr((STATEMENT_PIPELINE_VERSION, INCOME_KEYWORDS, REFUND_KEYWORDS))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
 
-    # Refund rule: if ANY column contains 'refund' (case-insensitive), mark as refund (overrides everything).
-    has_refund = frame.astype(str).apply(
-        lambda col: col.str.contains("refund", case=False, na=False)
+def _parse_statement(csv_path: str) -> pd.DataFrame:
+    # Every column is kept: parsed statements end up in the ledger, which has to
+    # preserve the full row even after the export itself is deleted.
+    df = normalize_revolut_df(load_revolut_csv(csv_path, usecols=None))
+    df["type"] = classify_type(df)
+    # Hashed once per export (then cached), so incremental builds get row keys for free.
+    df["row_fingerprint"], df["row_occurrence"] = ledger.row_fingerprints(df)
+    return df
+
+
+def load_normalized_statement(csv_path: str, cache_dir: str | Path | None = "data") -> pd.DataFrame:
+    """Load + normalize + classify one statement, reusing the parsed result when cached.
+
+    The parsed frame is cached under `cache_dir`/statement_cache keyed by the CSV's
+    content (see statement_cache.py), so restarts and manual-expense invalidations
+    skip CSV text parsing. Pass cache_dir=None to always parse.
+    """
+
+    if cache_dir is None:
+        return _parse_statement(csv_path)
+    return statement_cache.load_or_build(
+        csv_path,
+        Path(cache_dir) / statement_cache.STATEMENT_CACHE_DIRNAME,
+        _parse_statement,
+        pipeline=_statement_pipeline_tag(),
     )
-    is_refund = has_refund.any(axis=1)
-    out.loc[is_refund] = "refund"
 
-    return out
+
+def ingest_account_statements(
+    search_dir: str | Path,
+    ledger_dir: str | Path,
+    cache_dir: str | Path | None = "data",
+) -> int:
+    """Merge every export in `search_dir` into the ledger (oldest first); returns rows added.
+
+    Exports the ledger has already seen are skipped without parsing, so this is cheap
+    to call on every run and must happen before old exports are cleaned up (pass the
+    same `ledger_dir` to cleanup_outdated_account_statement_csvs so an export whose
+    ingest failed here is kept).
+    """
+
+    added = 0
+    for csv_path in list_account_statement_csvs(search_dir):
+        try:
+            added += ledger.ingest_statement(
+                csv_path, ledger_dir, lambda p: load_normalized_statement(p, cache_dir=cache_dir)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to ingest {csv_path} into ledger: {e}")
+    return added
+
+
+def load_ledger_statement(ledger_dir: str | Path) -> pd.DataFrame:
+    """All ledger rows, re-classified so keyword changes apply to already ingested rows."""
+
+    df = ledger.read_ledger(ledger_dir)
+    if df.empty:
+        return df
+    df["type"] = classify_type(df.drop(columns=["type"], errors="ignore"))
+    return df
+
+
+_DASHES_RE = re.compile(r"[\u2010\u2011\u2012\u2013\u2014\u2212]")
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
 def normalize_text(value: object) -> str:
@@ -235,11 +493,47 @@ def normalize_text(value: object) -> str:
     if isinstance(value, float) and pd.isna(value):
         return ""
     text = unicodedata.normalize("NFKC", str(value)).casefold()
-    text = re.sub(r"[\u2010\u2011\u2012\u2013\u2014\u2212]", "-", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _DASHES_RE.sub("-", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
     return text
 
 
+def normalize_text_series(values: pd.Series) -> pd.Series:
+    """Vectorized `normalize_text`: identical output, element by element.
+
+    Strings are factorized first, so repeated descriptions are normalized once.
+    Pure-ASCII values skip NFKC and dash folding (both are no-ops there) and
+    casefold == lower. Non-string values go through `normalize_text` itself so
+    odd inputs (None, NaN, pd.NA, numbers) keep their exact scalar behavior.
+    """
+
+    arr = values.to_numpy(dtype=object)
+    out = np.empty(len(arr), dtype=object)
+
+    is_str = np.fromiter((isinstance(v, str) for v in arr), dtype=bool, count=len(arr))
+    if not is_str.all():
+        out[~is_str] = [normalize_text(v) for v in arr[~is_str]]
+
+    if is_str.any():
+        codes, uniques = pd.factorize(arr[is_str])
+        uniques = np.asarray(uniques, dtype=object)
+
+        ascii_mask = np.fromiter((v.isascii() for v in uniques), dtype=bool, count=len(uniques))
+        folded = np.empty(len(uniques), dtype=object)
+        if ascii_mask.any():
+            folded[ascii_mask] = pd.Series(uniques[ascii_mask], dtype="object").str.lower().to_numpy()
+        if not ascii_mask.all():
+            other = pd.Series(uniques[~ascii_mask], dtype="object").str.normalize("NFKC").str.casefold()
+            folded[~ascii_mask] = other.str.replace(_DASHES_RE, "-", regex=True).to_numpy()
+
+        # str.split() splits on exactly the characters `\s` matches (str.isspace),
+        # so this equals _WHITESPACE_RE.sub(" ", text).strip().
+        collapsed = np.asarray([" ".join(v.split()) for v in folded], dtype=object)
+        out[is_str] = collapsed[codes]
+
+    return pd.Series(out, index=values.index, dtype="object")
+
+
 def normalize_keyword(value: object) -> str:
     """Normalize a keyword used for substring rules.
 
@@ -260,9 +554,9 @@ def normalize_keyword(value: object) -> str:
         return ""
 
     text = unicodedata.normalize("NFKC", str(value)).casefold()
-    text = re.sub(r"[\u2010\u2011\u2012\u2013\u2014\u2212]", "-", text)
+    text = _DASHES_RE.sub("-", text)
     # Collapse internal whitespace, but keep any intentional leading/trailing spaces.
-    text = re.sub(r"\s+", " ", text)
+    text = _WHITESPACE_RE.sub(" ", text)
     return text
 
 
@@ -415,6 +709,25 @@ def load_expense_category_map(path: str | Path | None = None) -> list[tuple[str,
     return compiled
 
 
+_category_matcher_cache: dict[Path, tuple[list[tuple[str, str]], KeywordMatcher]] = {}
+
+
+def load_expense_category_matcher(path: str | Path | None = None) -> KeywordMatcher:
+    """Return a KeywordMatcher for the compiled category rules (rebuilt when the file changes)."""
+
+    p = Path(path) if path is not None else EXPENSE_CATEGORY_MAP_PATH
+    compiled = load_expense_category_map(p)
+
+    # `compiled` is the same list object until the rules file mtime changes.
+    cached = _category_matcher_cache.get(p)
+    if cached is not None and cached[0] is compiled:
+        return cached[1]
+
+    matcher = KeywordMatcher(compiled)
+    _category_matcher_cache[p] = (compiled, matcher)
+    return matcher
+
+
 def load_monthly_limits(path: str | Path | None = None) -> dict[int, float]:
     """Load monthly expense limits (DKK) keyed by month number (1-12)."""
 
@@ -432,37 +745,123 @@ def load_monthly_limits(path: str | Path | None = None) -> dict[int, float]:
     return dict(monthly_limits)
 
 
+_description_category_lru = DescriptionLRU(maxsize=50_000)
+_last_categorization_stats: CategorizationStats | None = None
+_match_seconds_per_description = 0.0
+
+
+def last_categorization_stats() -> CategorizationStats | None:
+    """Stats of the most recent `categorize_expenses` call in this process."""
+
+    return _last_categorization_stats
+
+
+def _category_disk_cache(cache_dir: str | Path) -> CategoryDiskCache:
+    return CategoryDiskCache.for_path(Path(cache_dir) / CATEGORY_CACHE_FILENAME)
+
+
+def _categorize_descriptions(
+    descriptions: pd.Series,
+    cache_dir: str | Path | None = None,
+) -> tuple[np.ndarray, np.ndarray, CategorizationStats]:
+    """Categorize a description column, matching each distinct value only once.
+
+    Returns (categories, matched_keywords, stats) aligned with `descriptions`.
+    Lookup order per distinct value: in-memory LRU, then the on-disk cache under
+    `cache_dir` (if given), then the keyword matcher. Both caches are keyed by the
+    rules content hash, so a rules change never serves stale categories.
+    """
+
+    global _match_seconds_per_description
+
+    t0 = time.perf_counter()
+    matcher = load_expense_category_matcher()
+
+    codes, uniques = pd.factorize(descriptions, use_na_sentinel=False)
+    uniques = list(uniques)
+
+    categories = np.empty(len(uniques), dtype=object)
+    keywords = np.empty(len(uniques), dtype=object)
+    cache_hits = 0
+
+    missing: list[int] = []
+    for i, description in enumerate(uniques):
+        hit = (
+            _description_category_lru.get((matcher.rules_hash, description))
+            if isinstance(description, str)
+            else None
+        )
+        if hit is not None:
+            cache_hits += 1
+            categories[i], keywords[i] = hit
+        else:
+            missing.append(i)
+
+    normalized = normalize_text_series(pd.Series([uniques[i] for i in missing], dtype="object"))
+    pending: dict[int, str] = dict(zip(missing, normalized.tolist()))
+
+    disk = _category_disk_cache(cache_dir) if cache_dir is not None and pending else None
+    on_disk = disk.get_many(matcher.rules_hash, pending.values()) if disk is not None else {}
+
+    matched = 0
+    match_seconds = 0.0
+    new_entries: dict[str, tuple[str, str | None]] = {}
+    for i, text in pending.items():
+        hit = on_disk.get(text)
+        if hit is None:
+            m0 = time.perf_counter()
+            rule = matcher.match(text)
+            hit = (rule[1], rule[0]) if rule is not None else (DEFAULT_EXPENSE_CATEGORY, None)
+            match_seconds += time.perf_counter() - m0
+            matched += 1
+            new_entries[text] = hit
+        if isinstance(uniques[i], str):
+            _description_category_lru.put((matcher.rules_hash, uniques[i]), hit)
+        categories[i], keywords[i] = hit
+
+    if disk is not None:
+        disk.put_many(matcher.rules_hash, new_entries)
+
+    if matched:
+        _match_seconds_per_description = match_seconds / matched
+
+    rows = len(descriptions)
+    stats = CategorizationStats(
+        rows=rows,
+        unique_descriptions=len(uniques),
+        cache_hits=cache_hits,
+        matched=matched,
+        disk_hits=len(pending) - matched,
+        elapsed_seconds=time.perf_counter() - t0,
+        estimated_saved_seconds=_match_seconds_per_description * (rows - matched),
+    )
+    return categories[codes], keywords[codes], stats
+
+
 def explain_expense_category(description: object) -> tuple[str, str | None]:
     """Return (category, matched_keyword) for a description.
 
     Intended for debugging/trust-building when a classification looks wrong.
     """
 
-    text = normalize_text(description)
-    text_compact = text.replace(" ", "")
-    compiled = load_expense_category_map()
+    categories, keywords, _stats = _categorize_descriptions(
+        pd.Series([description], dtype="object")
+    )
+    return categories[0], keywords[0]
+
 
-    for keyword, category in compiled:
-        if _matches_keyword(keyword, text, text_compact):
-            return category, keyword
+def categorize_expenses(df: pd.DataFrame, cache_dir: str | Path | None = "data") -> pd.DataFrame:
+    """Fill `category` for expense rows that don't have one yet.
 
-    return DEFAULT_EXPENSE_CATEGORY, None
+    Known descriptions are served from the persistent cache under `cache_dir`
+    (pass None to disable it); only never-seen descriptions are matched.
+    """
 
+    global _last_categorization_stats
 
-def categorize_expenses(df: pd.DataFrame) -> pd.DataFrame:
     if "type" not in df.columns:
         raise ValueError("Missing required column: type")
 
-    compiled = load_expense_category_map()
-
-    def category_from_description(description: object) -> str:
-        text = normalize_text(description)
-        text_compact = text.replace(" ", "")
-        for keyword, category in compiled:
-            if _matches_keyword(keyword, text, text_compact):
-                return category
-        return DEFAULT_EXPENSE_CATEGORY
-
     out = df.copy()
     is_expense = out["type"].astype(str).str.casefold().eq("expense")
 
@@ -471,8 +870,18 @@ def categorize_expenses(df: pd.DataFrame) -> pd.DataFrame:
 
     if "description" in out.columns:
         to_fill = is_expense & out["category"].isna()
-        out.loc[to_fill, "category"] = out.loc[to_fill, "description"].apply(
-            category_from_description
+        categories, keywords, stats = _categorize_descriptions(
+            out.loc[to_fill, "description"], cache_dir=cache_dir
+        )
+        out.loc[to_fill, "category"] = categories
+        # Matched rule keyword, kept so rule edits can be applied incrementally.
+        if "category_keyword" not in out.columns:
+            out["category_keyword"] = pd.Series(pd.NA, index=out.index, dtype="object")
+        out.loc[to_fill, "category_keyword"] = keywords
+        _last_categorization_stats = stats
+        logger.debug(
+            f"Categorized {stats.rows} rows via {stats.unique_descriptions} distinct descriptions "
+            f"(dedup {stats.dedup_ratio:.1f}x, {stats.cache_hits} in memory, {stats.disk_hits} on disk) in {stats.elapsed_seconds:.3f}s"
         )
 
     return out
@@ -626,9 +1035,10 @@ def fx_rate_on_date(
     from_ccy: str,
     to_ccy: str = "DKK",
     max_backtrack_days: int = 10,
-    _cache: Dict[Tuple[str, str, str], Tuple[Optional[float], Optional[pd.Timestamp]]] = {},
+    _cache: Optional[Dict[Tuple[str, str, str], Tuple[Optional[float], Optional[pd.Timestamp]]]] = None,
+    data_dir: str | Path | None = "data",
 ) -> Tuple[Optional[float], Optional[pd.Timestamp]]:
-    """Backwards-compatible wrapper around fx_cache.fx_rate_on_date."""
+    """Backwards-compatible wrapper around fx_cache.fx_rate_on_date (persistent cache included)."""
 
     return fx_cache.fx_rate_on_date(
         date=date,
@@ -636,6 +1046,7 @@ def fx_rate_on_date(
         to_ccy=to_ccy,
         max_backtrack_days=max_backtrack_days,
         _cache=_cache,
+        data_dir=data_dir,
     )
 
 
@@ -645,14 +1056,27 @@ def convert_to_dkk(
     fx_cache_currencies: Iterable[str] = fx_cache.FX_CACHE_CURRENCIES,
     fx_cache_start_date: Date = fx_cache.FX_CACHE_START_DATE,
     to_ccy: str = fx_cache.FX_CACHE_TO_CCY,
+    fx_max_workers: int | None = None,
+    fx_on_demand_cache: bool = True,
+    fx_offline: bool = False,
+    fx_max_staleness_days: int = fx_cache.FX_MAX_STALENESS_DAYS,
 ) -> pd.DataFrame:
     """Add amount_dkk + conversion_rate for income/expense/refund rows with completed_date.
 
     Fast path:
-    - Uses local FX cache CSVs for USD/EUR/GBP->DKK (stored under fx_data_dir)
+    - Uses the local memory-mapped FX cache for USD/EUR/GBP->DKK (stored under fx_data_dir),
+      first extending those files back (one request) if rows predate their start.
+      Each date takes the latest published rate at or before it, if at most
+      `fx_max_staleness_days` old (vectorized as-of lookup).
 
     Fallback path:
-    - For other currencies, uses the per-date frankfurter endpoint with backtracking.
+    - For other currencies, one range request per currency covering all its dates
+      (kept as an on-demand cache file under fx_data_dir unless fx_on_demand_cache=False).
+    - If that fails, the per-date frankfurter endpoint with backtracking, resolving all
+      (date, currency) pairs concurrently on up to `fx_max_workers` threads.
+
+    With `fx_offline`, no network call is made and missing cache files aren't
+    downloaded: only rates already on disk are used, other rows keep amount_dkk = NA.
     """
 
     out = df.copy()
@@ -684,7 +1108,7 @@ def convert_to_dkk(
 
     # Ensure required local cache files exist (first run blocks until created).
     fx_cache_set = {str(c).upper().strip() for c in fx_cache_currencies}
-    if fx_cache_set:
+    if fx_cache_set and not fx_offline:
         fx_cache.ensure_fx_cache_files(
             data_dir=fx_data_dir,
             currencies=fx_cache_set,
@@ -693,32 +1117,69 @@ def convert_to_dkk(
         )
 
     cached_need = need & ccy.isin(list(fx_cache_set))
+    if bool(cached_need.any()) and not fx_offline:
+        # Dates before a cache file's start: extend the file back once, then serve locally.
+        earliest = dt[cached_need].groupby(ccy[cached_need]).min()
+        fx_cache.backfill_fx_cache_files(earliest.to_dict(), data_dir=fx_data_dir, to_ccy=to_ccy)
     if bool(cached_need.any()):
         for from_ccy in fx_cache_set:
             idx = cached_need & ccy.eq(from_ccy)
             if not bool(idx.any()):
                 continue
 
-            s = fx_cache.load_fx_cache_series(from_ccy, data_dir=fx_data_dir, to_ccy=to_ccy)
-            if s.empty:
-                continue
-
-            aligned = s.reindex(dt[idx])
-            rate.loc[idx] = aligned.to_numpy(dtype="float")
+            # A missing/empty cache file (offline startup) leaves NaN, never the 1.0 default.
+            rates = fx_cache.load_fx_rates(from_ccy, data_dir=fx_data_dir, to_ccy=to_ccy)
+            rate.loc[idx] = rates.rates_asof(dt[idx], fx_max_staleness_days)
 
-    # Fallback for non-cached currencies
+    # Fallback for non-cached currencies: one range request per currency...
     api_need = need & ~ccy.isin(list(fx_cache_set))
+    if fx_offline and bool(api_need.any()):
+        # No range fetch: use on-demand cache files where they cover the dates.
+        for from_ccy in sorted(set(ccy[api_need].tolist())):
+            idx = api_need & ccy.eq(from_ccy)
+            rate.loc[idx] = fx_cache.rates_for(
+                dt[idx], from_ccy, data_dir=fx_data_dir, to_ccy=to_ccy, max_staleness_days=fx_max_staleness_days
+            )
+            api_need = api_need & ~(idx & rate.notna())
+    elif bool(api_need.any()):
+        api_ccys = sorted(set(ccy[api_need].tolist()))
+
+        def range_rates(from_ccy: str) -> tuple[pd.Series, np.ndarray | None]:
+            idx = api_need & ccy.eq(from_ccy)
+            found = fx_cache.fx_rates_for_range(
+                dt[idx],
+                from_ccy,
+                to_ccy,
+                data_dir=fx_data_dir,
+                persist=fx_on_demand_cache,
+                max_staleness_days=fx_max_staleness_days,
+            )
+            return idx, found
+
+        workers = max(1, min(len(api_ccys), fx_max_workers or fx_cache.FX_FALLBACK_MAX_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fx-range") as pool:
+            for idx, found in pool.map(range_rates, api_ccys):
+                if found is not None:
+                    rate.loc[idx] = found
+                    api_need = api_need & ~idx
+
+    # ...and per-date lookups for currencies whose range fetch failed.
     if bool(api_need.any()):
         pairs = pd.DataFrame({"dt": dt[api_need], "ccy": ccy[api_need]}).drop_duplicates()
 
-        pair_to_rate: Dict[Tuple[object, str], Optional[float]] = {}
-        for row in pairs.itertuples(index=False):
-            fx, _used = fx_rate_on_date(row.dt, row.ccy, to_ccy)
-            pair_to_rate[(row.dt.date(), row.ccy)] = fx
+        # Resolved concurrently (bounded pool, per-host rate limit); see fx_cache.fx_rates_on_dates.
+        pair_to_rate: Dict[Tuple[object, str], Optional[float]] = fx_cache.fx_rates_on_dates(
+            zip(pairs["dt"], pairs["ccy"]),
+            to_ccy,
+            max_workers=fx_max_workers,
+            data_dir=fx_data_dir,
+            offline=fx_offline,
+        )
 
-        rate.loc[api_need] = [
-            pair_to_rate.get((d.date(), c), np.nan) for d, c in zip(dt[api_need], ccy[api_need])
-        ]
+        # Unresolved pairs map to None; as float64 they become NaN.
+        rate.loc[api_need] = np.array(
+            [pair_to_rate.get((d.date(), c)) for d, c in zip(dt[api_need], ccy[api_need])], dtype="float64"
+        )
 
     out.loc[mask, "conversion_rate"] = rate
     out.loc[mask, "amount_dkk"] = amt * rate
@@ -726,76 +1187,449 @@ def convert_to_dkk(
     return out
 
 
+def missing_fx_rates(df: pd.DataFrame, to_ccy: str = fx_cache.FX_CACHE_TO_CCY) -> dict[str, list[Date]]:
+    """Dates per currency of rows convert_to_dkk left without a rate (e.g. with
+    fx_offline), for FxCacheBackgroundUpdater.request."""
+
+    cols = ["type", "amount_net", "currency", "completed_date", "conversion_rate"]
+    if df.empty or any(c not in df.columns for c in cols):
+        return {}
+
+    mask = (
+        df["type"].isin(["income", "expense", "refund"])
+        & df["amount_net"].notna()
+        & df["currency"].notna()
+        & df["completed_date"].notna()
+        & pd.to_numeric(df["conversion_rate"], errors="coerce").isna()
+    )
+    if not mask.any():
+        return {}
+
+    ccy = df.loc[mask, "currency"].astype(str).str.upper().str.strip()
+    dt = pd.to_datetime(df.loc[mask, "completed_date"], errors="coerce").dt.normalize()
+    keep = ccy.ne(to_ccy) & dt.notna()
+    pairs = pd.DataFrame({"ccy": ccy[keep], "dt": dt[keep]}).drop_duplicates()
+    return {
+        str(c): sorted(d.date() for d in group["dt"])
+        for c, group in pairs.groupby("ccy", sort=True)
+    }
+
+
 @dataclass(frozen=True)
 class PreparedData:
     df: pd.DataFrame
     totals_by_month: pd.DataFrame
     spend_by_month_category: pd.DataFrame
     other_expenses: pd.DataFrame
+    # Compiled category rules `df` was categorized with (see recategorize_prepared).
+    category_rules: tuple[tuple[str, str], ...] = ()
+    # Incremental builds only: one key per statement row (the first rows of `df`, manual
+    # rows follow) and the FX cache version `amount_dkk` was computed with.
+    row_keys: np.ndarray | None = None
+    # Incremental builds only: completed_date month code per `df` row (see _month_codes).
+    row_months: np.ndarray | None = None
+    fx_version: float = 0.0
+    # Converted with fx_offline (rates on disk only); an online build reconverts everything.
+    fx_offline: bool = False
 
 
-def prepare_data_for_plotting(csv_path: str, manual_data_dir: str | Path = "data") -> PreparedData:
-    """End-to-end prep used by Streamlit plotting."""
-
-    raw = load_revolut_csv(csv_path)
-    df = normalize_revolut_df(raw)
-    df["type"] = classify_type(df)
-
-    manual = load_manual_expenses(manual_data_dir)
-    if not manual.empty:
-        df = pd.concat([df, manual], ignore_index=True, sort=False)
-
-    df = categorize_expenses(df)
-    df = convert_to_dkk(df)
+def _plot_base(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows with a completed_date and a DKK amount, plus a `month` column."""
 
     base = df.copy()
     base = base[base["completed_date"].notna()].copy() if "completed_date" in base.columns else base
     base["amount_dkk"] = pd.to_numeric(base.get("amount_dkk"), errors="coerce")
     base = base[base["amount_dkk"].notna()].copy()
+    if not base.empty and "completed_date" in base.columns:
+        base["month"] = base["completed_date"].dt.to_period("M").astype(str)
+    return base
 
+
+def _totals_by_month(base: pd.DataFrame) -> pd.DataFrame:
     if base.empty or "completed_date" not in base.columns:
-        totals = pd.DataFrame(columns=["expense", "income", "refund"])
-        by_month_cat = pd.DataFrame(columns=["month", "category", "spend_dkk"])
-    else:
-        base["month"] = base["completed_date"].dt.to_period("M").astype(str)
+        return pd.DataFrame(columns=["expense", "income", "refund"])
+
+    types = ["expense", "income", "refund"]
+    totals = (
+        base[base["type"].isin(types)]
+        .assign(value_dkk=lambda x: x["amount_dkk"].abs())
+        .groupby(["month", "type"])["value_dkk"]
+        .sum()
+        .unstack(fill_value=0.0)
+    )
+    for t in types:
+        if t not in totals.columns:
+            totals[t] = 0.0
+    return totals
 
-        types = ["expense", "income", "refund"]
-        totals = (
-            base[base["type"].isin(types)]
-            .assign(value_dkk=lambda x: x["amount_dkk"].abs())
-            .groupby(["month", "type"])["value_dkk"]
-            .sum()
-            .unstack(fill_value=0.0)
-        )
-        for t in types:
-            if t not in totals.columns:
-                totals[t] = 0.0
 
-        exp = base[base["type"].astype(str).str.casefold().eq("expense")].copy()
-        exp = exp[exp.get("category").notna()].copy() if "category" in exp.columns else exp.iloc[0:0]
-        by_month_cat = (
-            exp.assign(spend_dkk=lambda x: x["amount_dkk"].abs())
-            .groupby(["month", "category"])["spend_dkk"]
-            .sum()
-            .reset_index()
-        )
+def _spend_by_month_category(base: pd.DataFrame) -> pd.DataFrame:
+    if base.empty or "completed_date" not in base.columns:
+        return pd.DataFrame(columns=["month", "category", "spend_dkk"])
+
+    exp = base[base["type"].astype(str).str.casefold().eq("expense")].copy()
+    exp = exp[exp.get("category").notna()].copy() if "category" in exp.columns else exp.iloc[0:0]
+    return (
+        exp.assign(spend_dkk=lambda x: x["amount_dkk"].abs())
+        .groupby(["month", "category"])["spend_dkk"]
+        .sum()
+        .reset_index()
+    )
+
+
+def _sort_other_expenses(other_df: pd.DataFrame) -> pd.DataFrame:
+    sort_cols = [c for c in ["spend_dkk", "completed_date"] if c in other_df.columns]
+    if other_df.empty or not sort_cols:
+        return other_df
+    return other_df.sort_values(sort_cols, ascending=[False] + [True] * (len(sort_cols) - 1))
+
 
+def _other_expenses(df: pd.DataFrame) -> pd.DataFrame:
     other_df = df.copy()
     if "type" in other_df.columns:
         other_df = other_df[other_df["type"].astype(str).str.casefold().eq("expense")].copy()
     if "category" in other_df.columns:
         other_df = other_df[other_df["category"].astype(str).eq("Other")].copy()
 
-    if not other_df.empty:
+    if not other_df.empty or "amount_dkk" in other_df.columns:  # same columns when nothing is left
         other_df["amount_dkk"] = pd.to_numeric(other_df.get("amount_dkk"), errors="coerce")
         other_df["spend_dkk"] = other_df["amount_dkk"].abs()
-        sort_cols = [c for c in ["spend_dkk", "completed_date"] if c in other_df.columns]
-        if sort_cols:
-            other_df = other_df.sort_values(sort_cols, ascending=[False] + [True] * (len(sort_cols) - 1))
+    return _sort_other_expenses(other_df)
+
+
+def _rows_in_months(df: pd.DataFrame, months: Iterable[str]) -> pd.Series:
+    """Boolean mask of rows whose completed_date falls in any of `months` ("YYYY-MM")."""
+
+    mask = pd.Series(False, index=df.index)
+    if "completed_date" not in df.columns:
+        return mask
+    dt = df["completed_date"]
+    for m in months:
+        period = pd.Period(m, freq="M")
+        mask |= (dt >= period.start_time) & (dt < (period + 1).start_time)
+    return mask
+
+
+# Last incremental build per (ledger_dir, manual_data_dir), the base for the next one.
+# Shared by every Streamlit session/thread in the process, hence the lock.
+_last_prepared: dict[tuple[str, str], PreparedData] = {}
+_last_prepared_lock = threading.Lock()
+
+
+def _statement_row_keys(df: pd.DataFrame) -> np.ndarray:
+    """One uint64 per row that identifies it across exports (fingerprint + occurrence).
+
+    Parsed statements and ledger rows carry row_fingerprint/row_occurrence already,
+    so this is a cheap array op rather than re-hashing the history.
+    """
+
+    if {"row_fingerprint", "row_occurrence"}.issubset(df.columns) and df["row_fingerprint"].dtype == np.uint64:
+        fp = df["row_fingerprint"].to_numpy()
+        occurrence = df["row_occurrence"].to_numpy(dtype="int64")
+    else:
+        fp, occurrence = ledger.row_fingerprints(df)
+    return fp ^ (occurrence.astype("uint64") * np.uint64(0x9E3779B97F4A7C15))
+
+
+_NO_MONTH = np.iinfo(np.int64).min  # NaT as a datetime64[M] int
+
+
+def _month_codes(df: pd.DataFrame) -> np.ndarray:
+    """completed_date month per row as int64 months since 1970 (_NO_MONTH when missing)."""
 
+    if "completed_date" not in df.columns:
+        return np.full(len(df), _NO_MONTH, dtype=np.int64)
+    dt = pd.to_datetime(df["completed_date"], errors="coerce")
+    return dt.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]").view("int64")
+
+
+def _prepare_full(
+    statement: pd.DataFrame,
+    manual: pd.DataFrame,
+    manual_data_dir: str | Path,
+    row_keys: np.ndarray | None = None,
+    fx_offline: bool = False,
+) -> PreparedData:
+    df = statement
+    if not manual.empty:
+        df = pd.concat([df, manual], ignore_index=True, sort=False)
+
+    category_rules = load_expense_category_matcher().rules
+    df = categorize_expenses(df, cache_dir=manual_data_dir)
+    df = convert_to_dkk(df, fx_data_dir=manual_data_dir, fx_offline=fx_offline)
+
+    base = _plot_base(df)
+    incremental = row_keys is not None
     return PreparedData(
+        df=df,
+        totals_by_month=_totals_by_month(base),
+        spend_by_month_category=_spend_by_month_category(base),
+        other_expenses=_other_expenses(df),
+        category_rules=category_rules,
+        row_keys=row_keys,
+        row_months=_month_codes(df) if incremental else None,
+        fx_version=fx_cache.fx_cache_version(data_dir=manual_data_dir) if incremental else 0.0,
+        fx_offline=fx_offline,
+    )
+
+
+def _prepare_incremental(
+    previous: PreparedData,
+    statement: pd.DataFrame,
+    manual: pd.DataFrame,
+    manual_data_dir: str | Path,
+    row_keys: np.ndarray,
+    fx_offline: bool = False,
+) -> PreparedData | None:
+    """Build on `previous` by processing only the statement rows after the overlap.
+
+    The overlap is the longest run of leading statement rows whose keys equal the
+    previous build's (a newer export repeats the older one and appends to it, and
+    the ledger is ordered by started_date). Those rows, their categories, DKK amounts
+    and aggregate contributions are reused as-is; the rows after them plus the
+    manual rows (few, always re-processed) go through categorize/convert, and only
+    the months that gained or lost rows are re-aggregated.
+
+    Returns None when a full build is needed (no usable previous build, or most
+    rows are past the overlap).
+    """
+
+    prev_keys = previous.row_keys
+    prev_months = previous.row_months
+    prev_df = previous.df
+    if (
+        prev_keys is None
+        or prev_months is None
+        or len(prev_months) != len(prev_df)
+        or not isinstance(prev_df.index, pd.RangeIndex)
+        or prev_df.index.start != 0
+    ):
+        return None
+
+    n_prev_stmt = len(prev_keys)
+    n_common = min(n_prev_stmt, len(row_keys))
+    mismatch = np.flatnonzero(prev_keys[:n_common] != row_keys[:n_common])
+    overlap = int(mismatch[0]) if len(mismatch) else n_common
+    if overlap < len(row_keys) - overlap:
+        return None
+
+    if previous.category_rules != load_expense_category_matcher().rules:
+        previous = recategorize_prepared(previous, cache_dir=manual_data_dir)
+        prev_df = previous.df
+
+    # Only statement rows past the overlap + manual rows go through categorize/convert.
+    fresh = pd.concat([statement.iloc[overlap:], manual], ignore_index=True, sort=False)
+    if not fresh.empty:
+        fresh = convert_to_dkk(
+            categorize_expenses(fresh, cache_dir=manual_data_dir),
+            fx_data_dir=manual_data_dir,
+            fx_offline=fx_offline,
+        )
+    fresh.index = pd.RangeIndex(overlap, overlap + len(fresh))
+    fresh_months = _month_codes(fresh)
+
+    # Statement rows first, then manual rows: the order a full build produces.
+    df = pd.concat([prev_df.iloc[:overlap], fresh], sort=False)
+    row_months = np.concatenate([prev_months[:overlap], fresh_months])
+
+    fx_after = fx_cache.fx_cache_version(data_dir=manual_data_dir)
+    if fx_after != previous.fx_version or fx_offline != previous.fx_offline:
+        # Rate files changed since the previous build, or while converting the new rows
+        # (e.g. newer rates appended): convert everything, rebuild the aggregates.
+        df = convert_to_dkk(df, fx_data_dir=manual_data_dir, fx_offline=fx_offline)
+        base = _plot_base(df)
+        return replace(
+            previous,
+            df=df,
+            totals_by_month=_totals_by_month(base),
+            spend_by_month_category=_spend_by_month_category(base),
+            other_expenses=_other_expenses(df),
+            row_keys=row_keys,
+            row_months=row_months,
+            fx_version=fx_after,
+            fx_offline=fx_offline,
+        )
+
+    # Aggregates: recompute only the months that gained or lost rows.
+    changed = np.unique(np.concatenate([prev_months[overlap:], fresh_months]))
+    changed = changed[changed != _NO_MONTH]
+    totals = previous.totals_by_month
+    by_month_cat = previous.spend_by_month_category
+    if len(changed):
+        months = {str(m) for m in changed.astype("datetime64[M]")}  # _plot_base's "YYYY-MM"
+        base = _plot_base(df.iloc[np.flatnonzero(np.isin(row_months, changed))])
+        patched_totals = _totals_by_month(base)
+        totals = pd.concat([totals.drop(index=list(months), errors="ignore"), patched_totals], sort=False)
+        totals = totals.reindex(columns=previous.totals_by_month.columns).fillna(0.0).sort_index()
+        patched = _spend_by_month_category(base)
+        by_month_cat = (
+            pd.concat([by_month_cat[~by_month_cat["month"].isin(months)], patched], ignore_index=True)
+            .sort_values(["month", "category"], kind="stable")
+            .reset_index(drop=True)
+        )
+
+    # other_expenses is indexed by df position; reused rows keep theirs.
+    prev_other = previous.other_expenses
+    other_df = _sort_other_expenses(
+        pd.concat([prev_other[prev_other.index < overlap], _other_expenses(fresh)], sort=False)
+    )
+
+    return replace(
+        previous,
         df=df,
         totals_by_month=totals,
         spend_by_month_category=by_month_cat,
         other_expenses=other_df,
+        row_keys=row_keys,
+        row_months=row_months,
+        fx_version=fx_after,
+    )
+
+
+def prepare_data_for_plotting(
+    csv_path: str,
+    manual_data_dir: str | Path = "data",
+    ledger_dir: str | Path | None = None,
+    incremental: bool = False,
+    fx_offline: bool = False,
+) -> PreparedData:
+    """End-to-end prep used by Streamlit plotting.
+
+    `manual_data_dir` is the data folder: manual expenses, the statement and
+    categorization caches, and the FX rate files used for conversion.
+
+    With `ledger_dir`, `csv_path` is merged into the ledger and the full ledger
+    history is used instead of just that one export.
+
+    With `incremental`, the result of the previous incremental call (same
+    ledger_dir/manual_data_dir) is reused: only statement rows after the part it
+    shares with that build are categorized and converted, and only the months
+    that gained or lost rows are re-aggregated.
+
+    With `fx_offline`, amounts are converted from rates already on disk only (see
+    convert_to_dkk), so the result is available without waiting on the FX API.
+    """
+
+    if ledger_dir is None:
+        df = load_normalized_statement(csv_path, cache_dir=manual_data_dir)
+    else:
+        ledger.ingest_statement(csv_path, ledger_dir, lambda p: load_normalized_statement(p, cache_dir=manual_data_dir))
+        df = load_ledger_statement(ledger_dir)
+    df = df.reset_index(drop=True)
+
+    manual = load_manual_expenses(manual_data_dir)
+    if not incremental:
+        return _prepare_full(df, manual, manual_data_dir, fx_offline=fx_offline)
+
+    state_key = (str(ledger_dir or ""), str(manual_data_dir))
+    row_keys = _statement_row_keys(df)
+    with _last_prepared_lock:
+        previous = _last_prepared.get(state_key)
+    prepared = (
+        _prepare_incremental(previous, df, manual, manual_data_dir, row_keys, fx_offline=fx_offline)
+        if previous is not None
+        else None
+    )
+    if prepared is None:
+        prepared = _prepare_full(df, manual, manual_data_dir, row_keys=row_keys, fx_offline=fx_offline)
+    with _last_prepared_lock:
+        _last_prepared[state_key] = prepared
+    return prepared
+
+
+def _rule_categorized_mask(df: pd.DataFrame) -> pd.Series:
+    """Rows whose category came from the keyword rules (expenses that aren't manual entries)."""
+
+    mask = df["type"].astype(str).str.casefold().eq("expense")
+    if "source" in df.columns:
+        mask &= df["source"].astype(str).ne("manual")
+    return mask
+
+
+def recategorize_prepared(prepared: PreparedData, cache_dir: str | Path | None = "data") -> PreparedData:
+    """Bring `prepared` up to date with the current category rules without a rebuild.
+
+    Diffs the rules `prepared` was built with against the current ones and only
+    re-matches descriptions whose winning rule could have changed: those matched
+    by a removed/retargeted keyword, or matched by an added one. The `category`
+    column, `spend_by_month_category` (for the touched months) and
+    `other_expenses` are patched; CSV loading and FX conversion are not repeated.
+    """
+
+    matcher = load_expense_category_matcher()
+    if prepared.category_rules == matcher.rules:
+        return prepared
+
+    df = prepared.df
+    if df.empty or not {"type", "description"}.issubset(df.columns):
+        return replace(prepared, category_rules=matcher.rules)
+
+    diff = diff_rules(prepared.category_rules, matcher.rules)
+    rule_rows = _rule_categorized_mask(df)
+    current_keywords = (
+        df["category_keyword"] if "category_keyword" in df.columns else pd.Series(pd.NA, index=df.index)
+    )
+
+    codes, uniques = pd.factorize(df.loc[rule_rows, "description"], use_na_sentinel=False)
+    _, first_pos = np.unique(codes, return_index=True)
+    first_keywords = current_keywords[rule_rows].to_numpy()[first_pos]
+
+    kws = [None if pd.isna(k) else str(k) for k in first_keywords]
+    changed = [diff.keyword_changed(k) for k in kws]
+    to_scan = [code for code, k in enumerate(kws) if not changed[code] and diff.may_be_outranked(k)]
+    scanned = normalize_text_series(pd.Series([uniques[code] for code in to_scan], dtype="object"))
+
+    affected_codes = [code for code, c in enumerate(changed) if c]
+    affected_codes += [code for code, text in zip(to_scan, scanned.tolist()) if diff.added_matches(text)]
+    affected = rule_rows.copy()
+    affected.loc[rule_rows] = np.isin(codes, affected_codes)
+
+    if not bool(affected.any()):
+        return replace(prepared, category_rules=matcher.rules)
+
+    categories, keywords, _stats = _categorize_descriptions(
+        df.loc[affected, "description"], cache_dir=cache_dir
+    )
+    old_categories = df.loc[affected, "category"].astype("object")
+    changed_idx = old_categories.index[old_categories.to_numpy() != categories]
+
+    # Shallow copy: only the two patched columns get new arrays.
+    out = df.copy(deep=False)
+    category = out["category"].astype("object").copy()
+    category.loc[affected] = categories
+    keyword = current_keywords.astype("object").copy()
+    keyword.loc[affected] = keywords
+    out["category"] = category
+    out["category_keyword"] = keyword
+
+    if len(changed_idx) == 0:
+        return replace(prepared, df=out, category_rules=matcher.rules)
+
+    # Spend by category: recompute only the months that contain a changed row.
+    months = set(
+        out.loc[changed_idx, "completed_date"].dropna().dt.to_period("M").astype(str).tolist()
+    ) if "completed_date" in out.columns else set()
+    by_month_cat = prepared.spend_by_month_category
+    if months:
+        patched = _spend_by_month_category(_plot_base(out[_rows_in_months(out, months)]))
+        by_month_cat = (
+            pd.concat([by_month_cat[~by_month_cat["month"].isin(months)], patched], ignore_index=True)
+            .sort_values(["month", "category"], kind="stable")
+            .reset_index(drop=True)
+        )
+
+    other_df = prepared.other_expenses
+    other_df = _sort_other_expenses(
+        pd.concat(
+            [other_df.drop(index=changed_idx, errors="ignore"), _other_expenses(out.loc[changed_idx])],
+            sort=False,
+        )
+    )
+
+    return replace(
+        prepared,
+        df=out,
+        spend_by_month_category=by_month_cat,
+        other_expenses=other_df,
+        category_rules=matcher.rules,
     )
@@ -0,0 +1,167 @@
+"""On-disk cache of parsed account statements.
+
+Layout (under e.g. data/statement_cache/):
+- index.json: source path -> {size, mtime, sha256, file}
+- <sha256[:32]>-<pipeline>.parquet: the parsed frame for one statement's content
+
+`size`+`mtime` is the fast check; the content hash confirms a statement that was
+touched or moved, so the same export is never parsed twice. `pipeline` is a short
+tag supplied by the caller that changes whenever the parsing code/rules change.
+
+Parquet needs pyarrow (or fastparquet); without one, frames are stored as pickles.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import hashlib
+import logging
+import threading
+from typing import Callable
+
+import pandas as pd
+
+from disk_store import atomic_path, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_CACHE_DIRNAME = "statement_cache"
+_INDEX_FILENAME = "index.json"
+
+_index_lock = threading.Lock()
+
+
+def _parquet_available() -> bool:
+    for mod in ("pyarrow", "fastparquet"):
+        try:
+            __import__(mod)
+            return True
+        except Exception:
+            continue
+    return False
+
+
+_FRAME_SUFFIX = ".parquet" if _parquet_available() else ".pkl"
+
+
+def write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Atomically write a frame as Parquet (or pickle when no Parquet engine is installed)."""
+
+    with atomic_path(path) as tmp:
+        if path.suffix == ".parquet":
+            df.to_parquet(tmp, index=True)
+        else:
+            df.to_pickle(tmp)
+
+
+def read_frame(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def frame_path(directory: Path, stem: str) -> Path:
+    return directory / f"{stem}{_FRAME_SUFFIX}"
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_index(cache_dir: Path) -> dict[str, dict[str, object]]:
+    return read_json(cache_dir / _INDEX_FILENAME, "statement cache index")
+
+
+def _write_index(cache_dir: Path, index: dict[str, dict[str, object]]) -> None:
+    write_json(cache_dir / _INDEX_FILENAME, index)
+
+
+def _evict(cache_dir: Path, index: dict[str, dict[str, object]]) -> list[str]:
+    """Drop index entries whose source is gone and delete unreferenced frame files."""
+
+    removed = [src for src in index if not Path(src).exists()]
+    for src in removed:
+        index.pop(src, None)
+
+    referenced = {str(e.get("file")) for e in index.values()}
+    for p in cache_dir.glob("*"):
+        if p.name == _INDEX_FILENAME or p.name in referenced or p.suffix == ".tmp":
+            continue
+        if p.suffix in (".parquet", ".pkl"):
+            try:
+                p.unlink()
+            except Exception as e:
+                logger.warning(f"Failed to delete stale statement cache file {p}: {e}")
+    return removed
+
+
+def evict_missing_statements(cache_dir: str | Path) -> list[str]:
+    """Forget cached statements whose source CSV no longer exists; returns their paths."""
+
+    base = Path(cache_dir)
+    with _index_lock:
+        index = _read_index(base)
+        removed = _evict(base, index)
+        if removed:
+            _write_index(base, index)
+    return removed
+
+
+def load_or_build(
+    source_path: str | Path,
+    cache_dir: str | Path,
+    build: Callable[[str], pd.DataFrame],
+    pipeline: str,
+) -> pd.DataFrame:
+    """Return build(source_path), reusing the cached result for identical content."""
+
+    base = Path(cache_dir)
+    src = Path(source_path)
+    key = str(src.resolve())
+    st = src.stat()
+
+    with _index_lock:
+        entry = _read_index(base).get(key)
+
+    if entry is not None and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime:
+        cached = base / str(entry.get("file"))
+        if str(entry.get("file", "")).endswith(f"-{pipeline}{_FRAME_SUFFIX}") and cached.exists():
+            try:
+                return read_frame(cached)
+            except Exception as e:
+                logger.warning(f"Rebuilding unreadable statement cache file {cached}: {e}")
+
+    digest = file_sha256(src)
+    target = frame_path(base, f"{digest[:32]}-{pipeline}")
+
+    df: pd.DataFrame | None = None
+    if target.exists():
+        try:
+            df = read_frame(target)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable statement cache file {target}: {e}")
+
+    if df is None:
+        df = build(str(source_path))
+        try:
+            write_frame(df, target)
+        except Exception as e:
+            logger.warning(f"Failed to write statement cache file {target}: {e}")
+            return df
+
+    with _index_lock:
+        index = _read_index(base)
+        index[key] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha256": digest,
+            "file": target.name,
+        }
+        _evict(base, index)
+        _write_index(base, index)
+
+    return df
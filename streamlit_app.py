@@ -5,19 +5,29 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
-from fx_cache import FxCacheBackgroundUpdater, ensure_fx_cache_files, fx_cache_version
-from fx_cache import FX_CACHE_TO_CCY, load_fx_cache_series
+from fx_cache import FxCacheBackgroundUpdater, fx_breaker_state
+from fx_cache import FX_CACHE_TO_CCY, FX_REFRESH_INTERVAL_SECONDS, load_fx_cache_series, rates_for_pairs
+from fx_store import STORE_SUFFIX
 import invest_processing as inv
+from ledger import LEDGER_DIRNAME, ledger_version
+from statement_cache import STATEMENT_CACHE_DIRNAME, evict_missing_statements
 from processing import (
+    EXPENSE_CATEGORY_MAP_PATH,
     PreparedData,
     append_manual_expense,
     cleanup_outdated_account_statement_csvs,
     find_latest_account_statement_csv,
+    ingest_account_statements,
     load_expense_category_map,
     load_manual_expenses,
     load_monthly_limits,
+    missing_fx_rates,
     prepare_data_for_plotting,
+    recategorize_prepared,
 )
+from watcher import InputWatcher
+
+STATEMENTS_DIR = "/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents"
 
 
 def fmt_dkk(x: float) -> str:
@@ -25,38 +35,82 @@ def fmt_dkk(x: float) -> str:
 
 
 @st.cache_data(show_spinner=True)
-def load_prepared(csv_path: str, fx_version: float, manual_version: float) -> PreparedData:
-    # manual_version exists purely to invalidate the cache when manual_expenses.csv changes
-    _ = manual_version
-    return prepare_data_for_plotting(csv_path, manual_data_dir="data")
+def load_prepared(
+    csv_path: str, fx_version: int, manual_version: int, ledger_version: float, fx_offline: bool = False
+) -> PreparedData:
+    # manual_version/ledger_version exist purely to invalidate the cache when
+    # manual_expenses.csv changes or an export is merged into the ledger
+    _ = manual_version, ledger_version
+    # incremental: a newer export only runs the pipeline over rows the last build didn't have
+    return prepare_data_for_plotting(
+        csv_path,
+        manual_data_dir="data",
+        ledger_dir=f"data/{LEDGER_DIRNAME}",
+        incremental=True,
+        fx_offline=fx_offline,
+    )
 
 
-def manual_expenses_version(data_dir: str = "data") -> float:
-    try:
-        import os
+@st.cache_data(show_spinner=False)
+def load_categorized(
+    csv_path: str,
+    fx_version: int,
+    manual_version: int,
+    ledger_version: float,
+    rules_version: int,
+    fx_offline: bool = False,
+) -> PreparedData:
+    # rules_version only invalidates this cache; the expensive load_prepared result is
+    # reused and patched for the keywords that changed in expense_categories.yml.
+    _ = rules_version
+    return recategorize_prepared(
+        load_prepared(csv_path, fx_version, manual_version, ledger_version, fx_offline), cache_dir="data"
+    )
 
-        p = os.path.join(data_dir, "manual_expenses.csv")
-        return os.path.getmtime(p) if os.path.exists(p) else 0.0
-    except Exception:
-        return 0.0
 
+@st.cache_resource
+def input_watcher() -> InputWatcher:
+    # Versions of everything the views depend on, kept current by a background thread,
+    # so a rerun reads them from memory instead of globbing/stat-ing the (large,
+    # iCloud-synced) statement folder and the data files every time.
+    watcher = InputWatcher()
+    watcher.watch_dir("statements", STATEMENTS_DIR, pattern="*.csv")
+    watcher.watch_dir("fx", "data", pattern=f"fx_*{STORE_SUFFIX}")
+    watcher.watch_file("manual", "data/manual_expenses.csv")
+    watcher.watch_file("rules", EXPENSE_CATEGORY_MAP_PATH)
+    return watcher.start()
 
-def file_mtime(path: str) -> float:
-    try:
-        import os
 
-        return os.path.getmtime(path) if os.path.exists(path) else 0.0
-    except Exception:
-        return 0.0
+@st.cache_data(show_spinner=False)
+def sync_account_statements(statements_version: int) -> tuple[str, float]:
+    # Runs once per change of the statement folder: picks the newest export, merges every
+    # export into the ledger first (so history survives the cleanup), then deletes the
+    # older exports the ledger recorded as ingested; one whose ingest failed stays for
+    # the next run. Returns the newest export and the resulting ledger version.
+    _ = statements_version
+    csv_path = find_latest_account_statement_csv(STATEMENTS_DIR)
+    ingest_account_statements(STATEMENTS_DIR, ledger_dir=f"data/{LEDGER_DIRNAME}", cache_dir="data")
+    deleted = cleanup_outdated_account_statement_csvs(
+        STATEMENTS_DIR, keep_path=csv_path, ledger_dir=f"data/{LEDGER_DIRNAME}"
+    )
+    if deleted:
+        evict_missing_statements(f"data/{STATEMENT_CACHE_DIRNAME}")
+    return csv_path, ledger_version(f"data/{LEDGER_DIRNAME}")
+
+
+@st.cache_data(show_spinner=False)
+def latest_consolidated_statement(statements_version: int) -> str:
+    _ = statements_version
+    return inv.find_latest_consolidated_statement_csv(STATEMENTS_DIR)
 
 
 @st.cache_data(show_spinner=True)
 def load_investment_summary(
     account_csv_path: str,
     consolidated_csv_path: str,
-    fx_version: float,
-    account_version: float,
-    consolidated_version: float,
+    fx_version: int,
+    account_version: int,
+    consolidated_version: int,
 ) -> dict[str, object]:
     _ = (fx_version, account_version, consolidated_version)
 
@@ -106,33 +160,14 @@ def load_investment_summary(
         fx_detail["currency"] = fx_detail["to_currency"].astype(str).str.upper().str.strip()
         fx_detail["dkk_exchanged"] = pd.to_numeric(fx_detail["from_amount"], errors="coerce")
 
-        def rate_on(day: pd.Timestamp, from_ccy: str) -> float | None:
-            s = load_fx_cache_series(from_ccy, data_dir="data", to_ccy=FX_CACHE_TO_CCY)
-            if s.empty or pd.isna(day):
-                return None
-            v = s.get(pd.Timestamp(day).normalize())
-            try:
-                return float(v) if v is not None and not pd.isna(v) else None
-            except Exception:
-                return None
-
-        # Cache today's rates per currency
-        today_rates: dict[str, float | None] = {}
-        for c in sorted(set(fx_detail["currency"].dropna().unique().tolist())):
-            today_rates[c] = rate_on(today, c)
-
-        rate_at_exchange: list[float | None] = []
-        rate_at_today: list[float | None] = []
-        for _idx, row in fx_detail.iterrows():
-            ccy = str(row.get("currency") or "").upper().strip()
-            day = row.get("completed_day")
-            r0 = rate_on(pd.Timestamp(day) if day is not None else pd.NaT, ccy)
-            r1 = today_rates.get(ccy)
-            rate_at_exchange.append(r0)
-            rate_at_today.append(r1)
-
-        fx_detail["fx_rate_dkk_per_ccy_at_exchange_day"] = rate_at_exchange
-        fx_detail["fx_rate_dkk_per_ccy_today"] = rate_at_today
+        # One vectorized lookup per valuation date (exchange day, today) for all rows.
+        currencies = fx_detail["currency"].to_numpy()
+        fx_detail["fx_rate_dkk_per_ccy_at_exchange_day"] = rates_for_pairs(
+            fx_detail["completed_day"], currencies, data_dir="data", to_ccy=FX_CACHE_TO_CCY
+        )
+        fx_detail["fx_rate_dkk_per_ccy_today"] = rates_for_pairs(
+            pd.Series(today, index=fx_detail.index), currencies, data_dir="data", to_ccy=FX_CACHE_TO_CCY
+        )
 
         # Estimate foreign bought using FX at the exchange day:
         #   foreign_bought_est = dkk_exchanged / (dkk_per_ccy)
@@ -187,8 +222,44 @@ def category_options() -> list[str]:
 
 @st.cache_resource
 def fx_background_updater() -> FxCacheBackgroundUpdater:
-    # One updater per Streamlit session.
-    return FxCacheBackgroundUpdater(data_dir="data").start()
+    # One updater per server; it downloads missing cache files first (so the first render
+    # never waits on the FX API), then keeps every pair fresh on a schedule.
+    return FxCacheBackgroundUpdater(
+        data_dir="data", initialize=True, interval_seconds=FX_REFRESH_INTERVAL_SECONDS
+    ).start()
+
+
+def fx_updater_marker(updater: FxCacheBackgroundUpdater) -> tuple[bool, int]:
+    return updater.done.is_set(), updater.generation
+
+
+@st.fragment(run_every=3)
+def fx_refresh_panel(updater: FxCacheBackgroundUpdater) -> None:
+    # Polls the background FX work: a full rerun redraws the views once new rates land.
+    if fx_updater_marker(updater) != st.session_state.get("_fx_rendered_marker"):
+        st.rerun()
+
+    with st.expander("FX cache status"):
+        now = pd.Timestamp.now(tz="UTC")
+        rows = [
+            {
+                "pair": f"{s.from_ccy}/{s.to_ccy}",
+                "state": s.state,
+                "last success": (
+                    pd.Timestamp(s.last_success, unit="s", tz="UTC").strftime("%Y-%m-%d %H:%M UTC")
+                    if s.last_success
+                    else ""
+                ),
+                "latency (ms)": round(s.latency_seconds * 1000) if s.latency_seconds is not None else None,
+                "KiB": round(s.bytes_transferred / 1024, 1),
+                "error": s.error or "",
+            }
+            for s in updater.status()
+        ]
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        if updater.next_run_at:
+            minutes = max(0.0, (pd.Timestamp(updater.next_run_at, unit="s", tz="UTC") - now).total_seconds() / 60)
+            st.caption(f"Next refresh in {minutes:.0f} min (runs so far: {updater.runs})")
 
 
 def plot_month(spend_by_month_category: pd.DataFrame, totals_by_month: pd.DataFrame, month: str):
@@ -498,37 +569,55 @@ def main():
 
     st.title("Revolut statement")
 
+    watcher = input_watcher()
+    statements_version = watcher.version("statements")
     try:
-        csv_path = find_latest_account_statement_csv("/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents")
+        csv_path, ledger_ver = sync_account_statements(statements_version)
     except Exception as e:
         st.error(str(e))
         return
 
-    # Keep workspace tidy: delete older account-statement CSVs.
-    cleanup_outdated_account_statement_csvs("/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents", keep_path=csv_path)
-
     st.caption(f"CSV: {csv_path}")
 
-    # FX cache: first run will download and build local CSVs (USD/EUR/GBP->DKK) which can take a bit.
-    with st.spinner("Preparing FX cache (first run may take a bit)…"):
-        ensure_fx_cache_files(data_dir="data")
+    # FX cache: downloaded, refreshed and extended by the background updater. Renders
+    # convert from rates already on disk only (DKK rows are always complete) and
+    # never fetch or wait on the cache lock: rows still missing a rate are queued on
+    # the updater, and the panel reruns the app whenever it lands new rates.
+    updater = fx_background_updater()
+    marker = fx_updater_marker(updater)
+    if marker != st.session_state.get("_fx_rendered_marker"):
+        watcher.refresh("fx")  # the updater just wrote; don't wait for the watcher thread
+    st.session_state["_fx_rendered_marker"] = marker
+    if not updater.initialized.is_set():
+        st.caption("Downloading FX rates in the background; foreign-currency amounts will fill in shortly.")
+    fx_refresh_panel(updater)
 
-    fx_version = fx_cache_version(data_dir="data")
-    manual_version = manual_expenses_version(data_dir="data")
+    fx_version = watcher.version("fx")
+    manual_version = watcher.version("manual")
 
-    # Background refresh: updates cache to today's date without blocking the UI.
-    updater = fx_background_updater()
     if updater.error:
         st.caption(f"FX cache update warning: {updater.error}")
-
-    if updater.done.is_set() and updater.updated and not st.session_state.get("_fx_cache_rerun_done"):
-        st.session_state["_fx_cache_rerun_done"] = True
-        st.rerun()
+    breaker = fx_breaker_state()
+    if breaker.state == "open":
+        st.caption(
+            f"FX API unavailable after {breaker.consecutive_failures} failed requests "
+            f"(retrying in {breaker.retry_in_seconds:.0f}s): {breaker.last_error}"
+        )
+    elif breaker.state == "half_open":
+        st.caption("FX API: checking whether the service is back…")
 
     tabs = st.tabs(["Expenses", "Investment"])
 
     with tabs[0]:
-        prepared = load_prepared(csv_path, fx_version, manual_version)
+        prepared = load_categorized(
+            csv_path,
+            fx_version,
+            manual_version,
+            ledger_ver,
+            watcher.version("rules"),
+            fx_offline=True,
+        )
+        updater.request(missing_fx_rates(prepared.df))
 
         # Display max transaction date
         if not prepared.df.empty and "completed_date" in prepared.df.columns:
@@ -709,13 +798,14 @@ def main():
                         category=(str(cat).strip() or None),
                     )
                     st.session_state["_manual_expense_last_status"] = "success"
+                    input_watcher().refresh("manual")
                     st.rerun()
 
     with tabs[1]:
         st.subheader("Investment")
 
         try:
-            consolidated_csv_path = inv.find_latest_consolidated_statement_csv("/Users/mehdiordikhani/Library/Mobile Documents/com~apple~Numbers/Documents")
+            consolidated_csv_path = latest_consolidated_statement(statements_version)
         except Exception as e:
             st.error(f"Missing consolidated statement CSV: {e}")
             return
@@ -727,8 +817,8 @@ def main():
             account_csv_path=csv_path,
             consolidated_csv_path=consolidated_csv_path,
             fx_version=fx_version,
-            account_version=file_mtime(csv_path),
-            consolidated_version=file_mtime(consolidated_csv_path),
+            account_version=statements_version,
+            consolidated_version=statements_version,
         )
 
         summary_df = summary_data.get("summary")
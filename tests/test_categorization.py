@@ -0,0 +1,81 @@
+import random
+
+import pandas as pd
+import pytest
+
+import processing as proc
+from categorization import KeywordMatcher
+
+
+def _loop_match(rules: list[tuple[str, str]], text: str) -> tuple[str, str] | None:
+    """The per-rule loop KeywordMatcher replaces."""
+
+    text_compact = text.replace(" ", "")
+    for keyword, category in rules:
+        if proc._matches_keyword(keyword, text, text_compact):
+            return keyword, category
+    return None
+
+
+def _random_keyword(rng: random.Random) -> str:
+    # Small alphabet so keywords overlap and share prefixes/suffixes.
+    core = "".join(rng.choice("abc d") for _ in range(rng.randint(1, 5)))
+    roll = rng.random()
+    if roll < 0.2:
+        core = " " + core
+    elif roll < 0.4:
+        core = core + " "
+    elif roll < 0.5:
+        core = " " + core + " "
+    return proc.normalize_keyword(core)
+
+
+@pytest.mark.parametrize("n_rules", [3, 8, 40, 200])
+@pytest.mark.parametrize("seed", range(5))
+def test_keyword_matcher_matches_rule_loop(n_rules: int, seed: int) -> None:
+    rng = random.Random(seed * 1000 + n_rules)
+    rules = [(_random_keyword(rng), f"cat{i % 7}") for i in range(n_rules)]
+    rules.sort(key=lambda r: (len(r[0]), r[0]), reverse=True)
+    matcher = KeywordMatcher(rules)
+
+    for _ in range(500):
+        text = proc.normalize_text("".join(rng.choice("abcd  e") for _ in range(rng.randint(0, 20))))
+        assert matcher.match(text) == _loop_match(rules, text), text
+
+
+def test_keyword_matcher_respects_boundary_spaces() -> None:
+    rules = [("bar ", "Bars"), ("leba ra", "Phone")]
+    matcher = KeywordMatcher(rules)
+
+    assert matcher.match("lebara mobile") == ("leba ra", "Phone")  # compact form only
+    assert matcher.match("the bar nørrebro") == ("bar ", "Bars")
+    assert matcher.match("the barnørrebro") is None
+
+
+_SPECIALS = [
+    " ", "  ", "\t", "\n", "\x1c", "\xa0", " ", "–", "−", "‑",
+    "Ａ", "ß", "ﬁ", "İ", "Σ", "é", "é", "Æ", "ø", "Å", "①", "™", "😀",
+]
+
+
+def _random_text(rng: random.Random) -> object:
+    if rng.random() < 0.05:
+        return rng.choice([None, float("nan"), pd.NA, 5, 3.25, pd.NaT])
+    ascii_only = rng.random() < 0.7
+    parts = []
+    for _ in range(rng.randint(0, 24)):
+        if not ascii_only and rng.random() < 0.3:
+            parts.append(rng.choice(_SPECIALS))
+        else:
+            parts.append(rng.choice("abcXYZ 019-*/&  "))
+    return "".join(parts)
+
+
+def test_normalize_text_series_matches_scalar() -> None:
+    rng = random.Random(5)
+    values = pd.Series([_random_text(rng) for _ in range(20_000)], dtype="object")
+
+    got = proc.normalize_text_series(values)
+
+    assert got.index.equals(values.index)
+    assert got.tolist() == [proc.normalize_text(v) for v in values]
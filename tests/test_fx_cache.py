@@ -0,0 +1,391 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date as Date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fx_cache
+import fx_store
+from fx_providers import FrankfurterProvider, FxProviderUnavailable, FxStandInServer, SyntheticFxProvider
+
+
+@pytest.fixture
+def stand_in():
+    """A slow local Frankfurter stand-in that every FX fetch goes to."""
+
+    fx_cache._fx_rate_cache.clear()
+    fx_cache._fx_failed_lookups.clear()
+    fx_cache._fx_breaker.reset()
+    with FxStandInServer(SyntheticFxProvider(), latency=0.2) as server:
+        fx_cache.set_fx_provider(FrankfurterProvider(server.url))
+        try:
+            yield server
+        finally:
+            fx_cache.set_fx_provider(None)
+            fx_cache._fx_rate_cache.clear()
+
+
+class _Clock:
+    """Stands in for fx_cache's `time` module: monotonic() and time() only move on advance()."""
+
+    def __init__(self) -> None:
+        self.now = time.monotonic()
+        self.wall = time.time()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.wall
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+        self.wall += seconds
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    fake = _Clock()
+    monkeypatch.setattr(fx_cache, "time", fake)
+    return fake
+
+
+def _hammer(threads: int, fn) -> list[object]:
+    barrier = threading.Barrier(threads)
+    results: list[object] = [None] * threads
+
+    def worker(i: int) -> None:
+        barrier.wait()
+        results[i] = fn()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return results
+
+
+def _store_bytes(data_dir: Path) -> dict[str, bytes]:
+    return {p.name: p.read_bytes() for p in sorted(data_dir.glob(f"*{fx_store.STORE_SUFFIX}"))}
+
+
+def test_concurrent_lookups_share_one_request(stand_in: FxStandInServer) -> None:
+    day = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+
+    results = _hammer(32, lambda: fx_cache.fx_rate_on_date(day, "SEK", data_dir=None))
+
+    assert stand_in.requests == 1
+    assert len(set(results)) == 1
+    assert results[0][0] is not None
+
+
+def test_concurrent_cold_cache_downloads_once(stand_in: FxStandInServer, tmp_path: Path) -> None:
+    _hammer(16, lambda: fx_cache.ensure_fx_cache_files(data_dir=tmp_path))
+
+    assert stand_in.requests == 1
+    assert len(_store_bytes(tmp_path)) == len(fx_cache.FX_CACHE_CURRENCIES)
+
+
+def _ensure_in_process(url: str, data_dir: str, barrier) -> None:
+    fx_cache.set_fx_provider(FrankfurterProvider(url))
+    barrier.wait()
+    fx_cache.ensure_fx_cache_files(data_dir=data_dir)
+
+
+def test_concurrent_processes_download_once(stand_in: FxStandInServer, tmp_path: Path) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(4)
+    procs = [ctx.Process(target=_ensure_in_process, args=(stand_in.url, str(tmp_path), barrier)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    for p in procs:
+        p.join(timeout=60)
+
+    assert [p.exitcode for p in procs] == [0, 0, 0]
+    assert stand_in.requests == 1
+    assert len(_store_bytes(tmp_path)) == len(fx_cache.FX_CACHE_CURRENCIES)
+
+
+def test_rate_limiter_bursts_then_holds_the_sustained_rate(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(fx_cache, "FX_MAX_REQUESTS_PER_SECOND", 20.0)
+    monkeypatch.setattr(fx_cache, "FX_REQUEST_BURST", 4)
+    limiter = fx_cache._HostRateLimiter()
+    sent: list[float] = []
+
+    def request() -> None:
+        limiter.wait("http://fx.test/2024-01-02")
+        sent.append(time.monotonic())
+
+    start = time.monotonic()
+    _hammer(12, request)
+    sent.sort()
+    assert sent[3] - start < 0.04  # the burst goes out without waiting
+    assert sent[-1] - start >= (12 - 4) / 20.0 - 0.01  # the rest at 20/s
+    limiter.wait("http://other.test/")  # hosts have their own bucket
+    assert time.monotonic() - sent[-1] < 0.04
+
+
+def test_offline_render_queues_missing_rates_on_the_updater(stand_in: FxStandInServer, tmp_path: Path) -> None:
+    import processing as proc
+
+    df = pd.DataFrame(
+        {
+            "type": ["expense", "expense", "income"],
+            "amount_net": [-100.0, -50.0, 10.0],
+            "currency": ["SEK", "SEK", "DKK"],
+            "completed_date": pd.to_datetime(["2024-03-04", "2024-03-11", "2024-03-11"]),
+        }
+    )
+    updater = fx_cache.FxCacheBackgroundUpdater(data_dir=tmp_path, currencies=(), interval_seconds=3600).start()
+    try:
+        assert updater.done.wait(10)
+        before = stand_in.requests
+        first = proc.convert_to_dkk(df, fx_data_dir=tmp_path, fx_cache_currencies=(), fx_offline=True)
+        assert stand_in.requests == before  # rendering never fetches
+        missing = proc.missing_fx_rates(first)
+        assert missing == {"SEK": [pd.Timestamp("2024-03-04").date(), pd.Timestamp("2024-03-11").date()]}
+
+        generation = updater.generation
+        updater.request(missing)
+        deadline = time.monotonic() + 10
+        while updater.generation == generation and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert updater.generation > generation, updater.error
+
+        before = stand_in.requests
+        second = proc.convert_to_dkk(df, fx_data_dir=tmp_path, fx_cache_currencies=(), fx_offline=True)
+        assert stand_in.requests == before
+        assert proc.missing_fx_rates(second) == {}
+        assert second["amount_dkk"].notna().all()
+
+        updater.request(missing)  # already fetched this run: not queued again
+        assert not updater._pending
+    finally:
+        updater.stop()
+
+
+def test_append_never_changes_a_published_day_under_mapped_readers(tmp_path: Path) -> None:
+    days = pd.date_range("2024-01-01", periods=4, freq="D")
+    path = tmp_path / "fx_USD_DKK.f64"
+    fx_store.write_store(path, pd.Series([7.0, float("nan"), 7.2, float("nan")], index=days))
+    reader = fx_store.open_store(path)
+    asof_before = reader.asof_offsets.copy()
+
+    # Same value on a published day, a NaN day filled, and two new days: fine in place.
+    fx_store.append_store(path, pd.Series([7.2, 7.3, 7.4, 7.5], index=pd.date_range("2024-01-03", periods=4)))
+    assert fx_store.open_store(path).to_series().iloc[-1] == 7.5
+
+    with pytest.raises(fx_store.PublishedRateConflict):
+        fx_store.append_store(path, pd.Series([6.9], index=days[:1]))
+    assert fx_store.open_store(path).to_series().iloc[0] == 7.0
+
+    # Through the cache, a revised publication is written to a new file instead.
+    fx_cache._write_fx_cache_file(tmp_path, "USD", "DKK", pd.Series([6.9], index=days[:1]), append=True)
+    assert np.array_equal(reader.asof_offsets, asof_before)
+    assert reader.rates[0] == 7.0
+    revised = fx_cache.load_fx_rates("USD", data_dir=tmp_path).to_series()
+    assert revised.iloc[0] == 6.9 and revised.iloc[-1] == 7.5
+
+
+def test_unreadable_recorded_rates_fail_lookups_not_the_import(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    missing = tmp_path / "missing.json"
+    env = {**os.environ, "FX_RECORDED_RATES": str(missing)}
+    subprocess.run([sys.executable, "-c", "import processing, fx_cache"], cwd=Path(fx_cache.__file__).parent, env=env, check=True)
+
+    monkeypatch.setattr(fx_cache, "FX_RECORDED_RATES", str(missing))
+    monkeypatch.setattr(fx_cache, "_fx_provider", None)
+    monkeypatch.setattr(fx_cache, "_fx_provider_resolved", False)
+    provider = fx_cache.get_fx_provider()
+    assert "Can't load recorded FX rates" in caplog.text
+    with pytest.raises(FxProviderUnavailable):
+        provider.fetch_on_date(pd.Timestamp("2024-01-02").date(), "USD", "DKK", timeout=1)
+    assert fx_cache.get_fx_provider() is provider  # logged once, not on every lookup
+
+
+def _lookup(day: pd.Timestamp) -> tuple[object, object]:
+    return fx_cache.fx_rate_on_date(day, "SEK", data_dir=None, max_backtrack_days=0)
+
+
+def test_circuit_breaker_opens_probes_and_closes(
+    stand_in: FxStandInServer, clock: _Clock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(fx_cache, "FX_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(fx_cache, "_fx_breaker", fx_cache._CircuitBreaker())
+    monkeypatch.setattr(fx_cache, "_fx_failed_lookups", {})
+    stand_in.latency, stand_in.error_rate = 0.0, 1.0
+    days = pd.date_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=30), periods=8)
+
+    for day in days[:3]:
+        assert _lookup(day) == (None, None)
+    assert stand_in.requests == 3
+    assert fx_cache.fx_breaker_state().state == "open"
+    assert _lookup(days[3]) == (None, None)
+    assert stand_in.requests == 3  # open: rejected without a request
+
+    clock.advance(fx_cache.FX_BREAKER_RESET_SECONDS)
+    assert _lookup(days[4]) == (None, None)  # the half-open probe fails...
+    assert stand_in.requests == 4
+    assert fx_cache.fx_breaker_state().state == "open"  # ...and re-opens the breaker
+    assert _lookup(days[5]) == (None, None)
+    assert stand_in.requests == 4
+
+    clock.advance(fx_cache.FX_BREAKER_RESET_SECONDS)
+    stand_in.error_rate = 0.0
+    assert _lookup(days[6])[0] is not None
+    assert stand_in.requests == 5
+    state = fx_cache.fx_breaker_state()
+    assert (state.state, state.consecutive_failures) == ("closed", 0)
+
+
+def test_failed_lookup_is_not_retried_within_the_ttl(
+    stand_in: FxStandInServer, clock: _Clock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(fx_cache, "FX_BREAKER_FAILURE_THRESHOLD", 0)  # breaker off: only the TTL applies
+    monkeypatch.setattr(fx_cache, "_fx_failed_lookups", {})
+    stand_in.latency, stand_in.error_rate = 0.0, 1.0
+    day = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+
+    assert _lookup(day) == (None, None)
+    assert stand_in.requests == 1
+    stand_in.error_rate = 0.0
+    clock.advance(fx_cache.FX_FAILURE_TTL_SECONDS - 1)
+    assert _lookup(day) == (None, None)
+    assert stand_in.requests == 1
+    assert _lookup(day + pd.Timedelta(days=1))[0] is not None  # other pairs aren't held back
+    assert stand_in.requests == 2
+
+    clock.advance(1)
+    assert _lookup(day)[0] is not None
+    assert stand_in.requests == 3
+
+
+def test_backfill_extends_cache_files_once(stand_in: FxStandInServer, tmp_path: Path) -> None:
+    stand_in.latency = 0.0
+    fx_cache.ensure_fx_cache_files(data_dir=tmp_path)
+    gbp = (tmp_path / "fx_GBP_DKK.f64").read_bytes()
+    requests = stand_in.requests
+    earliest = {"USD": Date(2025, 9, 15), "EUR": Date(2025, 10, 1)}  # before FX_CACHE_START_DATE
+
+    assert fx_cache.backfill_fx_cache_files(earliest, data_dir=tmp_path)
+    assert stand_in.requests == requests + 1  # one range request for both
+    synthetic = SyntheticFxProvider()
+    for ccy, day in earliest.items():
+        rates = fx_cache.load_fx_rates(ccy, data_dir=tmp_path)
+        assert rates.published_dates()[0].date() <= day
+        assert rates.covered_dates()[1].date() >= pd.Timestamp.today().date()  # newer days kept
+        expected = synthetic.fetch_on_date(day, ccy, "DKK", timeout=1).rate
+        assert fx_cache.rates_for(pd.Series([pd.Timestamp(day)]), ccy, data_dir=tmp_path)[0] == pytest.approx(expected)
+    assert (tmp_path / "fx_GBP_DKK.f64").read_bytes() == gbp
+
+    assert not fx_cache.backfill_fx_cache_files(earliest, data_dir=tmp_path)  # already covered
+    assert stand_in.requests == requests + 1
+
+
+def _wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_updater_reports_status_and_reruns_after_the_next_publication(
+    stand_in: FxStandInServer, tmp_path: Path, clock: _Clock
+) -> None:
+    stand_in.latency = 0.0
+    today = pd.Timestamp.today().normalize()
+    publication = pd.Timestamp.combine(today.date(), fx_cache.FX_PUBLICATION_TIME_UTC).tz_localize("UTC")
+    clock.advance(publication.timestamp() + 600 - clock.time())  # ten minutes after today's rates
+    fx_cache.ensure_fx_cache_files(data_dir=tmp_path)
+    requests = stand_in.requests
+
+    updater = fx_cache.FxCacheBackgroundUpdater(
+        data_dir=tmp_path, interval_seconds=fx_cache.FX_REFRESH_INTERVAL_SECONDS, include_on_demand=False
+    )
+    assert {s.state for s in updater.status()} == {"pending"}
+    updater.start()
+    try:
+        assert updater.done.wait(10)
+        _wait_for(lambda: updater.runs == 1)
+        assert {s.state for s in updater.status()} == {"fresh"}  # refreshed since the publication
+        assert stand_in.requests == requests
+        assert updater.next_run_at == clock.time() + fx_cache.FX_REFRESH_INTERVAL_SECONDS
+
+        # The scheduled run before the next publication finds nothing to fetch.
+        clock.advance(fx_cache.FX_REFRESH_INTERVAL_SECONDS)
+        updater._wake.set()
+        _wait_for(lambda: updater.runs == 2)
+        assert stand_in.requests == requests and updater.generation == 0
+
+        clock.advance(publication.timestamp() + 86400 + 60 - clock.time())  # just after tomorrow's rates
+        assert updater.next_run_at <= clock.time()
+        updater._wake.set()
+        _wait_for(lambda: updater.runs == 3)
+        assert stand_in.requests == requests + 1  # one request for every pair
+        assert {s.state for s in updater.status()} == {"updated"}
+        assert all(s.last_success == clock.time() for s in updater.status())
+        assert updater.generation == 1
+
+        stand_in.fail_status = 503
+        clock.advance(86400)
+        updater._wake.set()
+        _wait_for(lambda: updater.runs == 4)
+        assert {s.state for s in updater.status()} == {"failed"}
+        assert updater.error and all(s.error for s in updater.status())
+    finally:
+        updater.stop()
+
+
+def test_rate_db_keeps_final_rates_and_expires_no_data_answers(
+    stand_in: FxStandInServer, tmp_path: Path, clock: _Clock
+) -> None:
+    stand_in.latency = 0.0
+    db = fx_cache.FxRateDiskCache(tmp_path / fx_cache.FX_RATE_DB_FILENAME)
+    today = pd.Timestamp.today().normalize()
+    old_saturday = today - pd.Timedelta(days=63 + (today.weekday() - 5) % 7)
+    next_saturday = today + pd.Timedelta(days=(5 - today.weekday()) % 7 or 7)
+
+    def lookup(day: pd.Timestamp, ccy: str = "SEK") -> tuple[object, object]:
+        fx_cache._fx_rate_cache.clear()
+        return fx_cache.fx_rate_on_date(day, ccy, data_dir=tmp_path)
+
+    def stored(day: pd.Timestamp, ccy: str = "SEK") -> object:
+        return db.get_many([(str(day.date()), ccy, "DKK")]).get((str(day.date()), ccy, "DKK"))
+
+    # A weekend answered with Friday's rate is final once later publications can't change it...
+    rate, used = lookup(old_saturday)
+    assert used == (old_saturday - pd.Timedelta(days=1)).date()
+    assert stored(old_saturday) == (rate, used)
+    # ...but not near today, where the day may still get its own (later) rate.
+    assert lookup(next_saturday)[1] != next_saturday.date()
+    assert stored(next_saturday) is None
+
+    # A restart answers from the database without a request.
+    requests = stand_in.requests
+    assert lookup(old_saturday) == (rate, used)
+    assert stand_in.requests == requests
+
+    # The API has no rate for XYZ: remembered as a negative entry until FX_NO_DATA_TTL_SECONDS pass.
+    assert lookup(old_saturday, "XYZ") == (None, None)
+    assert stored(old_saturday, "XYZ") == (None, None)
+    requests = stand_in.requests
+    assert lookup(old_saturday, "XYZ") == (None, None)
+    assert stand_in.requests == requests
+    clock.advance(fx_cache.FX_NO_DATA_TTL_SECONDS + 1)
+    assert stored(old_saturday, "XYZ") is None
+    assert stored(old_saturday) == (rate, used)  # rates don't expire
+    assert lookup(old_saturday, "XYZ") == (None, None)
+    assert stand_in.requests == requests + 1
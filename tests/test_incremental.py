@@ -0,0 +1,155 @@
+from pathlib import Path
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fx_cache
+import fx_store
+import processing as proc
+
+_COLUMNS = ["Type", "Product", "Started Date", "Completed Date", "Description", "Amount", "Fee", "Currency", "State", "Balance"]
+
+
+def _statement(rows: int, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    started = pd.Timestamp("2025-12-05") + pd.to_timedelta(np.sort(rng.integers(0, 80 * 86400, rows)), unit="s")
+    completed = started + pd.to_timedelta(rng.integers(0, 3 * 86400, rows), unit="s")
+    amount = -np.round(rng.gamma(2.0, 60.0, rows), 2)
+    return pd.DataFrame(
+        {
+            "Type": rng.choice(["Card Payment", "Transfer"], rows, p=[0.9, 0.1]),
+            "Product": "Current",
+            "Started Date": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "Completed Date": completed.strftime("%Y-%m-%d %H:%M:%S"),
+            "Description": rng.choice(["Netto", "Lidl", "Unknown shop", "Refund from Netto", "Bolt"], rows),
+            "Amount": amount,
+            "Fee": 0.0,
+            "Currency": rng.choice(["DKK", "EUR", "USD"], rows, p=[0.8, 0.15, 0.05]),
+            "State": "COMPLETED",
+            "Balance": np.round(10_000 + np.cumsum(amount), 2),
+        },
+        columns=_COLUMNS,
+    )
+
+
+def _with_pending(df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    df = df.copy()
+    df.loc[df.index[-rows:], "State"] = "PENDING"
+    df.loc[df.index[-rows:], ["Completed Date", "Balance"]] = np.nan
+    return df
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+    data = tmp_path / "data"
+    days = pd.date_range("2025-11-01", pd.Timestamp.today().normalize(), freq="D")
+    for i, ccy in enumerate(fx_cache.FX_CACHE_CURRENCIES):
+        rates = pd.Series(6.0 + i + 0.1 * np.sin(np.arange(len(days)) / 30.0), index=days)
+        fx_store.write_store(fx_cache._fx_cache_path(data, ccy), rates)
+    proc._last_prepared.clear()
+    yield data
+    proc._last_prepared.clear()
+
+
+def _assert_same(incr: proc.PreparedData, full: proc.PreparedData) -> None:
+    cols = [c for c in full.df.columns if c in incr.df.columns]
+    assert incr.df[cols].astype(str).equals(full.df[cols].astype(str))
+    a, b = incr.totals_by_month, full.totals_by_month[incr.totals_by_month.columns]
+    assert a.index.equals(b.index) and np.allclose(a.to_numpy(float), b.to_numpy(float))
+    a = incr.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+    b = full.spend_by_month_category.set_index(["month", "category"])["spend_dkk"]
+    assert a.index.equals(b.index) and np.allclose(a.to_numpy(), b.to_numpy())
+    assert incr.other_expenses.sort_index().astype(str).equals(full.other_expenses.sort_index().astype(str))
+
+
+@pytest.mark.parametrize("ledger", [False, True])
+def test_incremental_matches_full_build(tmp_path: Path, data_dir: Path, ledger: bool) -> None:
+    history = _statement(2_000)
+    exports = [
+        _with_pending(history.iloc[:1_500], 5),
+        _with_pending(history.iloc[:1_800], 5),  # the old pending rows settled
+        history,
+    ]
+    ledger_dir = data_dir / "ledger" if ledger else None
+    proc.append_manual_expense(data_dir=data_dir, completed_date=pd.Timestamp("2026-01-10").date(), description="Cash", amount_dkk=100.0)
+
+    for i, export in enumerate(exports):
+        csv_path = tmp_path / f"account-statement-{i}.csv"
+        export.to_csv(csv_path, index=False)
+        if i == 2:
+            proc.append_manual_expense(data_dir=data_dir, completed_date=pd.Timestamp("2026-02-01").date(), description="Taxi", amount_dkk=80.0)
+        incr = proc.prepare_data_for_plotting(str(csv_path), data_dir, ledger_dir=ledger_dir, incremental=True)
+        full = proc.prepare_data_for_plotting(str(csv_path), data_dir, ledger_dir=ledger_dir)
+        _assert_same(incr, full)
+
+
+def test_incremental_reconverts_when_an_fx_file_changes(tmp_path: Path, data_dir: Path) -> None:
+    history = _statement(1_000)
+    old_csv, new_csv = tmp_path / "account-statement-old.csv", tmp_path / "account-statement-new.csv"
+    history.iloc[:900].to_csv(old_csv, index=False)
+    history.to_csv(new_csv, index=False)
+
+    proc.prepare_data_for_plotting(str(old_csv), data_dir, incremental=True)
+    days = pd.date_range("2025-11-01", pd.Timestamp.today().normalize(), freq="D")
+    fx_store.write_store(fx_cache._fx_cache_path(data_dir, "EUR"), pd.Series(9.0, index=days))
+
+    incr = proc.prepare_data_for_plotting(str(new_csv), data_dir, incremental=True)
+    _assert_same(incr, proc.prepare_data_for_plotting(str(new_csv), data_dir))
+
+
+def _write_rules(path: Path, rules: list[tuple[str, str]]) -> None:
+    path.write_text("".join(f'"{k}": "{c}"\n' for k, c in rules), encoding="utf-8")
+    bump = path.stat().st_mtime + 10 + len(rules)  # a new mtime even within one clock tick
+    os.utime(path, (bump, bump))
+
+
+_RULE_POOL = [
+    ("Netto", "Food"), ("netto", "Drinks"), ("Lidl", "Groceries"), ("lidl", "Food"),
+    ("Bolt", "Transport"), ("shop", "Shopping"), ("Unknown", "Misc"), ("from netto", "Refunds"),
+    ("net", "Other stuff"), ("o", "Letters"),
+]
+
+
+def _edits(seed: int) -> list[list[tuple[str, str]]]:
+    rng = random.Random(seed)
+    rules = rng.sample(_RULE_POOL, 5)
+    out = [list(rules)]
+    for _ in range(4):
+        roll = rng.random()
+        if roll < 0.35 and len(rules) > 1:
+            rules.pop(rng.randrange(len(rules)))
+        elif roll < 0.7:
+            rules.insert(rng.randrange(len(rules) + 1), rng.choice(_RULE_POOL))
+        else:
+            i = rng.randrange(len(rules))
+            rules[i] = (rules[i][0], rng.choice(["Food", "Drinks", "Misc"]))
+        out.append(list(rules))
+    return out
+
+
+@pytest.mark.parametrize(
+    "edits",
+    [[[("Coffee", "Food"), ("coffee", "Drinks")], [("coffee", "Drinks")]]]
+    + [_edits(seed) for seed in range(5)],
+)
+def test_recategorize_matches_full_build(
+    tmp_path: Path, data_dir: Path, monkeypatch: pytest.MonkeyPatch, edits: list[list[tuple[str, str]]]
+) -> None:
+    rules_path = tmp_path / "expense_categories.yml"
+    monkeypatch.setattr(proc, "EXPENSE_CATEGORY_MAP_PATH", rules_path)
+    history = _statement(600)
+    history["Description"] = np.where(
+        np.arange(len(history)) % 7 == 0, "Coffee at Netto", history["Description"].to_numpy()
+    )
+    csv_path = tmp_path / "account-statement.csv"
+    history.to_csv(csv_path, index=False)
+
+    _write_rules(rules_path, edits[0])
+    patched = proc.prepare_data_for_plotting(str(csv_path), data_dir)
+    for rules in edits[1:]:
+        _write_rules(rules_path, rules)
+        patched = proc.recategorize_prepared(patched, cache_dir=None)
+        _assert_same(patched, proc.prepare_data_for_plotting(str(csv_path), data_dir))
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import pandas as pd
+
+import processing as proc
+
+_HEADER = "Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance\n"
+
+
+def _write_export(path: Path, rows: list[str]) -> Path:
+    path.write_text(_HEADER + "".join(r + "\n" for r in rows), encoding="utf-8")
+    return path
+
+
+def test_cleanup_keeps_exports_the_ledger_did_not_ingest(tmp_path: Path, monkeypatch) -> None:
+    statements = tmp_path / "statements"
+    statements.mkdir()
+    ledger_dir = tmp_path / "data" / "ledger"
+    old = _write_export(
+        statements / "account-statement_2025-01-01_2025-01-31.csv",
+        ["Card Payment,Current,2025-01-02 10:00:00,2025-01-03 10:00:00,Netto,-10.5,0,DKK,COMPLETED,100"],
+    )
+    broken = _write_export(
+        statements / "account-statement_2025-01-01_2025-02-28.csv",
+        ["Card Payment,Current,2025-02-02 10:00:00,2025-02-03 10:00:00,Netto,-11,0,DKK,COMPLETED,89"],
+    )
+    newest = _write_export(
+        statements / "account-statement_2025-01-01_2025-03-31.csv",
+        ["Card Payment,Savings,2025-03-02 10:00:00,2025-03-03 10:00:00,Netto,-12,0,DKK,COMPLETED,77"],
+    )
+
+    parse = proc._parse_statement
+
+    def failing_parse(csv_path: str) -> pd.DataFrame:
+        if Path(csv_path).name == broken.name:
+            raise ValueError("corrupt export")
+        return parse(csv_path)
+
+    monkeypatch.setattr(proc, "_parse_statement", failing_parse)
+    proc.ingest_account_statements(statements, ledger_dir, cache_dir=None)
+    deleted = proc.cleanup_outdated_account_statement_csvs(
+        str(statements), keep_path=str(newest), ledger_dir=ledger_dir
+    )
+
+    assert deleted == [old.as_posix()]
+    assert broken.exists() and newest.exists()
+
+    history = proc.load_ledger_statement(ledger_dir)
+    assert sorted(history["product"].astype(str)) == ["Current", "Savings"]
@@ -0,0 +1,46 @@
+import time
+from pathlib import Path
+
+import pytest
+
+import watcher
+from watcher import InputWatcher
+
+
+def _wait_for_version(w: InputWatcher, name: str, version: int, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while w.version(name) < version:
+        assert time.monotonic() < deadline, f"{name} stayed at version {w.version(name)}"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("backend", ["inotify", "polling"])
+def test_dir_version_bumps_on_matching_changes_only(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, backend: str
+) -> None:
+    if backend == "polling":
+        monkeypatch.setattr(watcher, "_open_inotify", lambda: None)
+    w = InputWatcher(poll_interval_seconds=0.05)
+    w.watch_dir("statements", tmp_path, pattern="*.csv")
+    w.start()
+    try:
+        if backend == "inotify" and w.backend != "inotify":
+            pytest.skip("inotify not available here")
+        assert w.backend == backend
+        assert w.version("statements") == 0
+
+        csv = tmp_path / "account-statement.csv"
+        csv.write_text("a,b\n", encoding="utf-8")
+        _wait_for_version(w, "statements", 1)
+
+        csv.write_text("a,b\n1,2\n", encoding="utf-8")
+        _wait_for_version(w, "statements", 2)
+
+        csv.unlink()
+        _wait_for_version(w, "statements", 3)
+
+        (tmp_path / "notes.txt").write_text("not a statement", encoding="utf-8")
+        time.sleep(0.3)
+        assert w.version("statements") == 3
+    finally:
+        w.stop()
@@ -0,0 +1,290 @@
+"""Version counters for the app's input files, bumped when they change on disk.
+
+Each watched input (a single file, or the files matching a pattern in one folder)
+has an int version that only ever goes up. A background thread keeps them current:
+on Linux it waits on inotify (through libc, no extra package); elsewhere, or for a
+folder that doesn't exist yet, it polls every few seconds. Either way an input is
+only bumped after its stat signature (name, mtime, size of every matching file)
+actually changed, so reading a version is a dict lookup and costs no I/O.
+
+Versions start at 0 per process, which is all the in-memory Streamlit caches keyed
+by them need.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WATCH_POLL_INTERVAL_SECONDS = 2.0
+WATCH_RESCAN_SECONDS = 60.0  # safety-net full check when inotify is used (iCloud/FUSE may drop events)
+WATCH_DEBOUNCE_SECONDS = 0.05
+
+# <sys/inotify.h>
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_MASK = (
+    _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+_IN_EVENT = struct.Struct("iIII")
+
+
+@dataclass(frozen=True)
+class WatchedInput:
+    """One versioned input: `path` itself, or the files in folder `path` matching `pattern`."""
+
+    name: str
+    path: Path
+    pattern: str | None = None
+
+    @property
+    def folder(self) -> Path:
+        return self.path if self.pattern is not None else self.path.parent
+
+    def matches(self, filename: str) -> bool:
+        if self.pattern is None:
+            return filename == self.path.name
+        return fnmatch.fnmatchcase(filename, self.pattern)
+
+    def signature(self) -> object:
+        """Stat snapshot that differs whenever the input changed (None when missing)."""
+
+        if self.pattern is None:
+            try:
+                st = self.path.stat()
+            except OSError:
+                return None
+            return st.st_mtime_ns, st.st_size, st.st_ino
+
+        items = []
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if not fnmatch.fnmatchcase(entry.name, self.pattern):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    items.append((entry.name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            return None
+        return frozenset(items)
+
+
+class _Inotify:
+    """Minimal non-blocking inotify instance via libc."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, folder: Path) -> int:
+        wd = self._add(self.fd, os.fsencode(str(folder)), _IN_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(folder))
+        return wd
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """(wd, mask, filename) for every queued event."""
+
+        events: list[tuple[int, int, str]] = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos + _IN_EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _IN_EVENT.unpack_from(buf, pos)
+                pos += _IN_EVENT.size
+                name = os.fsdecode(buf[pos : pos + length].rstrip(b"\0"))
+                pos += length
+                events.append((wd, mask, name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _open_inotify() -> _Inotify | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify()
+    except (OSError, AttributeError) as e:
+        logger.warning(f"inotify unavailable, polling inputs instead: {e}")
+        return None
+
+
+class InputWatcher:
+    """Keeps a monotonically increasing version per watched input.
+
+    Register inputs with `watch_file`/`watch_dir`, then `start()`. `version(name)`
+    only reads memory. `refresh()` re-checks inputs synchronously, for callers that
+    just wrote one and want the next read to see it without waiting for the thread.
+    """
+
+    def __init__(
+        self,
+        poll_interval_seconds: float = WATCH_POLL_INTERVAL_SECONDS,
+        use_inotify: bool = True,
+    ) -> None:
+        self.poll_interval_seconds = poll_interval_seconds
+        self._use_inotify = use_inotify
+        self._inputs: dict[str, WatchedInput] = {}
+        self._signatures: dict[str, object] = {}
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._inotify: _Inotify | None = None
+        self._watch_folders: dict[int, Path] = {}  # inotify wd -> folder
+        self.checks = 0  # signature computations, for benchmarks
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def watch_file(self, name: str, path: str | Path) -> None:
+        self._add(WatchedInput(name, Path(path)))
+
+    def watch_dir(self, name: str, path: str | Path, pattern: str = "*") -> None:
+        self._add(WatchedInput(name, Path(path), pattern))
+
+    def _add(self, watched: WatchedInput) -> None:
+        with self._lock:
+            if watched.name in self._inputs:
+                raise ValueError(f"Input already watched: {watched.name}")
+            self._inputs[watched.name] = watched
+            self._signatures[watched.name] = watched.signature()
+            self._versions[watched.name] = 0
+        if self._inotify is not None:
+            self._attach_missing()
+
+    def version(self, name: str) -> int:
+        return self._versions[name]
+
+    def versions(self) -> dict[str, int]:
+        return dict(self._versions)
+
+    def refresh(self, *names: str) -> None:
+        for name in names or tuple(self._inputs):
+            self._check(name)
+
+    def _check(self, name: str) -> None:
+        watched = self._inputs[name]
+        sig = watched.signature()
+        self.checks += 1
+        with self._lock:
+            if sig != self._signatures[name]:
+                self._signatures[name] = sig
+                self._versions[name] += 1
+
+    def start(self) -> "InputWatcher":
+        if self._thread is not None:
+            return self
+        if self._use_inotify:
+            self._inotify = _open_inotify()
+            if self._inotify is not None:
+                self._attach_missing()
+        self._thread = threading.Thread(target=self._run, name="input-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _unwatched(self) -> list[str]:
+        watched = set(self._watch_folders.values())
+        return [name for name, w in self._inputs.items() if w.folder not in watched]
+
+    def _attach_missing(self) -> set[str]:
+        """Add inotify watches for folders that lack one; returns the inputs on them.
+
+        Those inputs weren't covered by events until now (e.g. the folder didn't
+        exist), so the caller re-checks them.
+        """
+
+        assert self._inotify is not None
+        pending = self._unwatched()
+        for folder in {self._inputs[name].folder for name in pending}:
+            try:
+                self._watch_folders[self._inotify.add_watch(folder)] = folder
+            except OSError:
+                continue  # missing for now; polled until it appears
+        return set(pending)
+
+    def _drain_events(self) -> set[str]:
+        assert self._inotify is not None
+        dirty: set[str] = set()
+        for wd, mask, filename in self._inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                dirty.update(self._inputs)
+                continue
+            folder = self._watch_folders.get(wd)
+            if folder is None:
+                continue
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                # The folder itself went away: its inputs fall back to polling.
+                self._watch_folders.pop(wd, None)
+                dirty.update(n for n, w in self._inputs.items() if w.folder == folder)
+                continue
+            dirty.update(n for n, w in self._inputs.items() if w.folder == folder and w.matches(filename))
+        return dirty
+
+    def _run(self) -> None:
+        next_rescan = time.monotonic() + WATCH_RESCAN_SECONDS
+        try:
+            while not self._stop.is_set():
+                if self._inotify is None:
+                    self._stop.wait(self.poll_interval_seconds)
+                    dirty = set(self._inputs)
+                else:
+                    ready, _, _ = select.select([self._inotify.fd], [], [], self.poll_interval_seconds)
+                    dirty = set()
+                    if ready:
+                        self._stop.wait(WATCH_DEBOUNCE_SECONDS)  # let a burst of writes settle
+                        dirty |= self._drain_events()
+                    dirty |= self._attach_missing()
+                    if time.monotonic() >= next_rescan:
+                        dirty = set(self._inputs)
+                        next_rescan = time.monotonic() + WATCH_RESCAN_SECONDS
+                for name in dirty:
+                    try:
+                        self._check(name)
+                    except Exception as e:
+                        logger.warning(f"Input watcher failed to check {name}: {e}")
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()